@@ -1,6 +1,6 @@
 # app/config.py
 import os
-from pydantic import BaseModel
+from pydantic import BaseModel, model_validator
 from pathlib import Path
 from dotenv import load_dotenv
 
@@ -10,23 +10,106 @@ for p in [Path(__file__).resolve().parents[2] / ".env",
     if p.exists():
         load_dotenv(p, override=False)
 
+# limites abaixo dos quais a subida falha em vez de rodar com um valor sem sentido
+_MINIMUMS = {
+    "llm_max_concurrency": 1,
+    "llm_max_queue": 1,
+    "chat_batch_concurrency": 1,
+    "chat_batch_max_questions": 1,
+    "qa_batch_concurrency": 1,
+    "qa_batch_max_cases": 1,
+}
+_POSITIVE = ("llm_chat_deadline_s", "llm_qa_deadline_s", "llm_batch_deadline_s")  # prazo 0 = já vencido
+
 class Settings(BaseModel):
     # LLM / Embeddings
     use_lm_studio: bool = os.getenv("USE_LM_STUDIO", "false").lower() == "true"
     openai_base_url: str = os.getenv("OPENAI_BASE_URL", "")
     openai_api_key: str = os.getenv("OPENAI_API_KEY", "")
     model_name: str = os.getenv("OPENAI_MODEL", "qwen2.5-7b-instruct")
+    # vários servidores OpenAI-compatíveis (separados por vírgula); tem precedência sobre OPENAI_BASE_URL
+    openai_base_urls: list[str] = [u for u in os.getenv("OPENAI_BASE_URLS", "").split(",") if u.strip()]
+    llm_timeout_s: float = float(os.getenv("LLM_TIMEOUT_S", "120"))
+    llm_pool_max_connections: int = int(os.getenv("LLM_POOL_MAX_CONNECTIONS", "32"))
+    llm_max_attempts: int = int(os.getenv("LLM_MAX_ATTEMPTS", "3"))
+    llm_circuit_failures: int = int(os.getenv("LLM_CIRCUIT_FAILURES", "3"))
+    llm_circuit_cooldown_s: float = float(os.getenv("LLM_CIRCUIT_COOLDOWN_S", "30"))
+    llm_health_interval_s: float = float(os.getenv("LLM_HEALTH_INTERVAL_S", "10"))
 
     embeddings_backend: str = os.getenv("EMBEDDINGS_BACKEND", "huggingface")
     embeddings_model: str = os.getenv(
         "EMBEDDINGS_MODEL",
         "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2"
     )
+    # Embeddings de perguntas (services/query_embedder.py): micro-batching + cache LRU
+    query_embed_window_ms: float = float(os.getenv("QUERY_EMBED_WINDOW_MS", "3"))  # 0 = sem batching
+    query_embed_max_batch: int = int(os.getenv("QUERY_EMBED_MAX_BATCH", "32"))
+    query_embed_cache_size: int = int(os.getenv("QUERY_EMBED_CACHE_SIZE", "2048"))  # 0 = sem cache
 
     # RAG
     persist_dir: str = os.getenv("PERSIST_DIR", "app/data/vectorstore")
+    # Profundidade da recuperação no chat (services/relevance.py): fixed (sempre top_k) | adaptive (opt-in)
+    retrieval_mode: str = os.getenv("RETRIEVAL_MODE", "fixed").lower()
+    retrieval_min_k: int = int(os.getenv("RETRIEVAL_MIN_K", "1"))
+    retrieval_max_k: int = int(os.getenv("RETRIEVAL_MAX_K", "6"))
+    retrieval_min_score: float = float(os.getenv("RETRIEVAL_MIN_SCORE", "0.25"))  # cosseno; abaixo disso não conta
+    retrieval_rel_threshold: float = float(os.getenv("RETRIEVAL_REL_THRESHOLD", "0.8"))  # x melhor similaridade
+    retrieval_gap: float = float(os.getenv("RETRIEVAL_GAP", "0.1"))  # 0 = sem corte por degrau
+    retrieval_context_chars: int = int(os.getenv("RETRIEVAL_CONTEXT_CHARS", "6000"))  # 0 = sem orçamento
+    retrieval_not_found_answer: str = os.getenv(
+        "RETRIEVAL_NOT_FOUND_ANSWER",
+        "Não encontrei essa informação nos documentos indexados.",
+    )
+    # Vários workers (services/index_store.py): índice em gerações, mapeado em memória
+    index_mmap: bool = os.getenv("INDEX_MMAP", "true").lower() == "true"
+    index_reload_check_s: float = float(os.getenv("INDEX_RELOAD_CHECK_S", "1"))
+    index_keep_generations: int = int(os.getenv("INDEX_KEEP_GENERATIONS", "2"))
+    # Compressão dos vetores (services/quantization.py): flat | fp16 | sq8 | pq
+    index_storage: str = os.getenv("INDEX_STORAGE", "flat").lower()
+    index_pq_m: int = int(os.getenv("INDEX_PQ_M", "0"))  # bytes por vetor no PQ; 0 = dim/8
+    index_rerank: bool = os.getenv("INDEX_RERANK", "true").lower() == "true"
+    index_rerank_factor: int = int(os.getenv("INDEX_RERANK_FACTOR", "4"))
+    # Snapshot importado na subida quando ainda não há índice (caminho ou URL https; services/snapshot.py).
+    # O docstore é um pickle: só origem confiável
+    index_snapshot: str = os.getenv("INDEX_SNAPSHOT", "")
+    # Segmento delta (services/segments.py): documentos novos buscáveis sem rebuild; compacta ao passar de um limite
+    index_delta_max_vectors: int = int(os.getenv("INDEX_DELTA_MAX_VECTORS", "5000"))  # 0 = sem limite por tamanho
+    index_delta_max_age_s: float = float(os.getenv("INDEX_DELTA_MAX_AGE_S", "900"))  # 0 = sem limite por idade
+    # Watcher da pasta local (services/docs_watcher.py): arquivos novos/alterados/apagados entram pelo delta
+    docs_watch: bool = os.getenv("DOCS_WATCH", "false").lower() == "true"
+    docs_watch_backend: str = os.getenv("DOCS_WATCH_BACKEND", "auto").lower()  # auto | watchfiles | poll
+    docs_watch_poll_s: float = float(os.getenv("DOCS_WATCH_POLL_S", "2"))
+    docs_watch_debounce_ms: float = float(os.getenv("DOCS_WATCH_DEBOUNCE_MS", "1000"))  # silêncio que fecha a rajada
+    docs_watch_max_delay_s: float = float(os.getenv("DOCS_WATCH_MAX_DELAY_S", "10"))  # com escrita contínua
+    # Ingestão em streaming (services/ingest_pipeline.py): filas limitadas entre fetch, split e embeddings
+    ingest_queue_docs: int = int(os.getenv("INGEST_QUEUE_DOCS", "64"))
+    ingest_queue_batches: int = int(os.getenv("INGEST_QUEUE_BATCHES", "2"))
+    ingest_embed_batch: int = int(os.getenv("INGEST_EMBED_BATCH", "64"))  # chunks por chamada de embeddings
+    # Quase duplicados na ingestão (services/dedup.py): MinHash + LSH
+    dedup_enabled: bool = os.getenv("DEDUP_ENABLED", "true").lower() == "true"
+    dedup_threshold: float = float(os.getenv("DEDUP_THRESHOLD", "0.85"))  # Jaccard estimado
+    dedup_num_perm: int = int(os.getenv("DEDUP_NUM_PERM", "128"))
+    dedup_bands: int = int(os.getenv("DEDUP_BANDS", "16"))
+    dedup_shingle: int = int(os.getenv("DEDUP_SHINGLE", "3"))  # palavras por shingle
+    # Coleções (services/collections_config.py): índices abertos ficam num LRU com este orçamento
+    collections_memory_mb: int = int(os.getenv("COLLECTIONS_MEMORY_MB", "1024"))
     docs_dir: str = os.getenv("DOCS_DIR", "app/data/docs")
 
+    # Prompts (services/prompts_loader.py)
+    prompts_dir: str = os.getenv("PROMPTS_DIR", "app/data/prompts")
+    prompt_reload_check_s: float = float(os.getenv("PROMPT_RELOAD_CHECK_S", "2"))
+
+    # Chat em lote (/api/chat/batch)
+    chat_batch_concurrency: int = int(os.getenv("CHAT_BATCH_CONCURRENCY", "4"))
+    chat_batch_max_questions: int = int(os.getenv("CHAT_BATCH_MAX_QUESTIONS", "200"))
+
+    # Controle de admissão do LLM (services/scheduler.py)
+    llm_max_concurrency: int = int(os.getenv("LLM_MAX_CONCURRENCY", "2"))
+    llm_max_queue: int = int(os.getenv("LLM_MAX_QUEUE", "32"))
+    llm_chat_deadline_s: float = float(os.getenv("LLM_CHAT_DEADLINE_S", "60"))
+    llm_qa_deadline_s: float = float(os.getenv("LLM_QA_DEADLINE_S", "180"))
+    llm_batch_deadline_s: float = float(os.getenv("LLM_BATCH_DEADLINE_S", "600"))
+
     # CORS
     cors_origins: list[str] = os.getenv(
         "CORS_ORIGINS",
@@ -36,8 +119,49 @@ class Settings(BaseModel):
     # === QA (NOVO) ===
     upload_dir: str = os.getenv("UPLOAD_DIR", "app/data/uploads")
     reports_dir: str = os.getenv("REPORTS_DIR", "app/data/reports")
+    reports_catalog: str = os.getenv("REPORTS_CATALOG", "")  # default: <reports_dir>/catalog.db
+    qa_batch_concurrency: int = int(os.getenv("QA_BATCH_CONCURRENCY", "2"))
+    qa_batch_max_cases: int = int(os.getenv("QA_BATCH_MAX_CASES", "200"))
 
-    upload_dir: str = os.getenv("UPLOAD_DIR", "app/data/uploads")
-    reports_dir: str = os.getenv("REPORTS_DIR", "app/data/reports")
+    # Políticas de QA por área (services/policies.py)
+    qa_policies_dir: str = os.getenv("QA_POLICIES_DIR", "app/data/qa/policies")
+    policy_reload_check_s: float = float(os.getenv("POLICY_RELOAD_CHECK_S", "2"))
+    policy_blend: float = float(os.getenv("POLICY_BLEND", "0.3"))  # peso dos critérios na busca
+
+    # Uploads em streaming (services/uploads.py)
+    upload_chunk_kb: int = int(os.getenv("UPLOAD_CHUNK_KB", "1024"))
+    upload_max_file_mb: int = int(os.getenv("UPLOAD_MAX_FILE_MB", "50"))
+    upload_max_request_mb: int = int(os.getenv("UPLOAD_MAX_REQUEST_MB", "200"))
+
+    # Extração de texto das evidências (services/extraction.py)
+    extract_workers: int = int(os.getenv("EXTRACT_WORKERS", "-1"))  # -1 = nº de CPUs, 0 = sem pool
+    extract_cache_dir: str = os.getenv("EXTRACT_CACHE_DIR", "app/data/cache/extract")
+
+    # Conector de URLs (services/http_cache.py): requests condicionais + politeness por host
+    http_cache_dir: str = os.getenv("HTTP_CACHE_DIR", "app/data/cache/http")
+    urls_timeout_s: float = float(os.getenv("URLS_TIMEOUT_S", "20"))
+    urls_host_delay_s: float = float(os.getenv("URLS_HOST_DELAY_S", "1"))  # intervalo mínimo por host
+    urls_max_pages_per_host: int = int(os.getenv("URLS_MAX_PAGES_PER_HOST", "500"))
+    urls_respect_robots: bool = os.getenv("URLS_RESPECT_ROBOTS", "true").lower() == "true"
+
+    # Warm-up (services/warmup.py): passos rodam em paralelo, em segundo plano, na subida
+    warmup_on_startup: bool = os.getenv("WARMUP_ON_STARTUP", "true").lower() == "true"
+    warmup_steps: list[str] = os.getenv("WARMUP_STEPS", "imports,prompts,embeddings,index,llm").split(",")
+    warmup_retry_s: float = float(os.getenv("WARMUP_RETRY_S", "5"))  # 1ª nova tentativa de passo que falhou; 0 = não tenta
+    warmup_retry_max_s: float = float(os.getenv("WARMUP_RETRY_MAX_S", "120"))  # teto do backoff (dobra a cada falha)
+
+    # Profiling sob demanda (services/profiler.py): endpoints só com ADMIN_TOKEN (header X-Admin-Token)
+    admin_token: str = os.getenv("ADMIN_TOKEN", "")
+    profile_max_seconds: float = float(os.getenv("PROFILE_MAX_SECONDS", "300"))
+    profile_sample_interval_ms: float = float(os.getenv("PROFILE_SAMPLE_INTERVAL_MS", "10"))
+    profile_keep: int = int(os.getenv("PROFILE_KEEP", "5"))  # sessões de CPU / snapshots guardados
+
+    @model_validator(mode="after")
+    def _check_limits(self):
+        errors = [f"{n.upper()}={getattr(self, n)} (mínimo {low})" for n, low in _MINIMUMS.items() if getattr(self, n) < low]
+        errors += [f"{n.upper()}={getattr(self, n)} (precisa ser > 0)" for n in _POSITIVE if getattr(self, n) <= 0]
+        if errors:
+            raise ValueError("configuração inválida: " + ", ".join(errors))
+        return self
 
 settings = Settings()
@@ -1,10 +1,41 @@
-from fastapi import FastAPI
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 from .config import settings
-from .routers import health, ingest, chat, admin, upload,qa
+from .routers import health, ingest, chat, admin, upload,qa, profiling
+from .services.scheduler import Rejected
+from .services import docs_watcher, prompts_loader, warmup
+from .services.uploads import RequestSizeLimit
 
-app = FastAPI(title="BIA – Bemobi Internal Agent")
 
+@asynccontextmanager
+async def lifespan(_app: FastAPI):
+    # prompts lidos e validados uma vez na subida (depois, só recarga por mtime)
+    prompts_loader.load_all()
+    # dependências pesadas em segundo plano: /health responde já, /ready quando terminar
+    if settings.warmup_on_startup:
+        warmup.start()
+    # pasta local -> índice sem /api/ingest (um worker vigia; ver services/docs_watcher.py)
+    if settings.docs_watch:
+        docs_watcher.start()
+    yield
+    docs_watcher.stop()
+
+
+app = FastAPI(title="BIA – Bemobi Internal Agent", lifespan=lifespan)
+
+
+@app.exception_handler(Rejected)
+async def llm_rejected(_request: Request, exc: Rejected):
+    return JSONResponse(
+        status_code=exc.status_code,
+        content={"detail": exc.detail},
+        headers={"Retry-After": str(exc.retry_after)},
+    )
+
+# uploads acima do limite saem com 413 antes de o form ser lido (CORS fica por fora)
+app.add_middleware(RequestSizeLimit)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=settings.cors_origins,
@@ -18,4 +49,5 @@ app.include_router(ingest.router)
 app.include_router(chat.router)
 app.include_router(admin.router)
 app.include_router(upload.router)
-app.include_router(qa.router)
\ No newline at end of file
+app.include_router(qa.router)
+app.include_router(profiling.router)
\ No newline at end of file
@@ -1,21 +1,45 @@
-from pydantic import BaseModel
-from typing import Optional, List
+from pydantic import BaseModel, Field
+from typing import Any, Dict, Optional, List
 
 # === Ingest ===
 class IngestRequest(BaseModel):
     rebuild: bool = False
+    collection: Optional[str] = None  # default: "default"
 
 # === Chat ===
 class SourceDoc(BaseModel):
     source: str
     page: Optional[int] = None
+    collection: Optional[str] = None  # só no fan-out
 
 class ChatRequest(BaseModel):
     message: Optional[str] = None
     question: Optional[str] = None
     top_k: Optional[int] = 4
     return_sources: Optional[bool] = True
+    collection: Optional[str] = None          # default: "default"
+    collections: Optional[List[str]] = None   # fan-out: busca em várias e junta (ignora `collection`)
+    retrieval: Optional[str] = None           # adaptive | fixed (default: RETRIEVAL_MODE)
 
 class ChatResponse(BaseModel):
     answer: str
     sources: List[SourceDoc] = []
+    prompt_version: Optional[str] = None
+    retrieval: Optional[Dict[str, Any]] = None  # modo adaptive: k escolhido, critério, melhor similaridade
+
+class ChatBatchRequest(BaseModel):
+    questions: List[str]
+    top_k: Optional[int] = 4
+    return_sources: Optional[bool] = True
+    max_concurrency: Optional[int] = Field(None, ge=1)  # default e teto: CHAT_BATCH_CONCURRENCY
+    collection: Optional[str] = None
+
+# === QA ===
+class QABatchCase(BaseModel):
+    case_title: str
+    area: Optional[str] = None
+    files: List[str] = []  # filenames enviados em 'files'
+
+class QABatchManifest(BaseModel):
+    cases: List[QABatchCase]
+    max_concurrency: Optional[int] = Field(None, ge=1)  # default e teto: QA_BATCH_CONCURRENCY
@@ -1,14 +1,67 @@
-from fastapi import APIRouter, HTTPException
-from ..services import connectors
+import os
+import shutil
+import tempfile
+import uuid
+from pathlib import Path
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import FileResponse, PlainTextResponse
+from starlette.background import BackgroundTask
+from ..services import connectors, metrics, collections_config, snapshot, docs_watcher
+from ..services.uploads import save_stream
+from ..services.scheduler import get_scheduler
+from ..services import prompts_loader
 from ..services.state import get_stats
-from ..services.rag import build_or_load_vectorstore
+from ..services.rag import build_or_load_vectorstore, index_info, open_collections, memory_report, compact
 from ..models import IngestRequest
+from .deps import require_admin
 
 router = APIRouter()
 
 @router.get("/api/admin/stats")
 def stats():
-    return get_stats()
+    """Contadores de uso + memória (RSS do worker e tamanho de cada índice aberto)."""
+    return {**get_stats(), "memory": memory_report()}
+
+@router.get("/api/admin/index")
+def get_index(collection: Optional[str] = None):
+    """Geração do índice carregada por este worker x a publicada no PERSIST_DIR."""
+    return index_info(collection)
+
+@router.post("/api/admin/compact", dependencies=[Depends(require_admin)])
+def post_compact(collection: Optional[str] = None):
+    """Junta o segmento delta ao principal agora (sem esperar INDEX_DELTA_MAX_VECTORS/AGE_S)."""
+    try:
+        return compact(collection)
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=str(e.args[0]))
+
+@router.get("/api/admin/watch")
+def get_watch():
+    """Watcher da pasta local neste worker: pastas, backend, última atualização (só o dono do lock vigia)."""
+    return docs_watcher.status()
+
+@router.get("/api/admin/metrics")
+def get_metrics(format: str = "json"):
+    """
+    Métricas em memória do processo (ex.: llm_queue_wait_ms por tipo de pedido).
+    format=prometheus devolve no formato texto do Prometheus.
+    """
+    if format == "prometheus":
+        return PlainTextResponse(metrics.prometheus_text())
+    from ..services.llm import endpoints_snapshot
+
+    return {
+        "scheduler": get_scheduler().snapshot(),
+        "llm_endpoints": endpoints_snapshot(),
+        **metrics.snapshot(),
+    }
+
+@router.get("/api/admin/prompts")
+def get_prompts():
+    """Templates carregados, com versão e variáveis (e erro, se a última edição foi recusada)."""
+    return {"version": prompts_loader.prompts_version(), "prompts": prompts_loader.list_prompts()}
 
 @router.get("/api/connectors")
 def get_connectors():
@@ -22,12 +75,61 @@ def put_connector(name: str, patch: dict):
     except ValueError as e:
         raise HTTPException(status_code=404, detail=str(e))
 
+@router.get("/api/collections")
+def get_collections():
+    """Coleções configuradas e as que estão abertas (LRU) neste worker."""
+    return {"collections": collections_config.list_collections(), **open_collections()}
+
+@router.put("/api/collections/{name}", dependencies=[Depends(require_admin)])
+def put_collection(name: str, patch: dict):
+    """Cria/altera uma coleção (persist_dir, docs_dir, connectors, chunk_size, chunk_overlap)."""
+    try:
+        return {"ok": True, "collection": collections_config.update_collection(name, patch)}
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
 @router.post("/api/admin/sync")
 def sync(req: IngestRequest):
     """
-    Faz ingestão usando TANTO a pasta local quanto conectores habilitados.
+    Faz ingestão usando TANTO a pasta local quanto conectores habilitados da coleção.
     Se req.rebuild=True, recria o índice do zero.
     """
-    extra_docs = connectors.collect_documents()
-    vs, meta = build_or_load_vectorstore(rebuild=req.rebuild, extra_docs=extra_docs)
-    return {"ok": True, "vectors": meta.get("vectors"), "sources": meta.get("sources")}
+    try:
+        cfg = collections_config.get_collection(req.collection)
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=str(e.args[0]))
+    vs, meta = build_or_load_vectorstore(rebuild=req.rebuild, collection=cfg["name"])
+    return {"ok": True, "collection": cfg["name"], "vectors": meta.get("vectors"), "sources": meta.get("sources")}
+
+@router.get("/api/admin/snapshot", dependencies=[Depends(require_admin)])
+def export_snapshot(collection: Optional[str] = None):
+    """Baixa o índice publicado da coleção como snapshot .tar.gz (manifest + checksums)."""
+    out = os.path.join(tempfile.gettempdir(), f"bia-snapshot-{uuid.uuid4().hex}.tar.gz")
+    try:
+        manifest = snapshot.export_snapshot(out, collection)
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=str(e.args[0]))
+    except snapshot.SnapshotError as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+    filename = f"{manifest['collection']}-gen{manifest['generation']}.tar.gz"
+    return FileResponse(
+        out, media_type="application/gzip", filename=filename,
+        headers={"X-Snapshot-SHA256": manifest["snapshot_sha256"]},
+        background=BackgroundTask(os.remove, out),
+    )
+
+@router.post("/api/admin/snapshot", dependencies=[Depends(require_admin)])
+async def import_snapshot(file: UploadFile = File(...), collection: Optional[str] = None):
+    """
+    Importa um snapshot (de GET /api/admin/snapshot ou scripts/snapshot.py) como nova
+    geração da coleção; os workers trocam de índice em até INDEX_RELOAD_CHECK_S.
+    """
+    tmp_dir = Path(tempfile.mkdtemp(prefix="bia-snapshot-"))
+    try:
+        saved = await run_in_threadpool(save_stream, file.file, tmp_dir, "snapshot.tar.gz", None, 0)
+        result = await run_in_threadpool(snapshot.import_snapshot, saved["path"], collection)
+    except snapshot.SnapshotError as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+    return {"ok": True, **result}
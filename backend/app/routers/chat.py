@@ -1,34 +1,95 @@
+import json
+import time
 from fastapi import APIRouter, HTTPException
-from ..models import ChatRequest, ChatResponse, SourceDoc
-from ..services.rag import build_or_load_vectorstore, make_qa_chain, make_retriever
+from fastapi.responses import StreamingResponse
+from ..config import settings
+from ..models import ChatRequest, ChatResponse, ChatBatchRequest, SourceDoc
+from ..services.rag import (
+    build_or_load_vectorstore, make_qa_chain, make_retriever, answer_batch, fanout_search, answer_with_docs,
+    adaptive_retrieve,
+)
 from ..services.state import inc
+from ..services.scheduler import llm_slot
+from ..services.prompts_loader import get_prompt
 
 router = APIRouter()
 
+
+def _sources_from_docs(docs) -> list:
+    srcs = []
+    seen = set()
+    for d in docs:
+        meta = d.metadata or {}
+        page = meta.get("page") or meta.get("page_number")
+        srcs.append(
+            SourceDoc(source=str(meta.get("source", "unknown")), page=page, collection=meta.get("collection"))
+        )
+        seen.add((srcs[-1].source, page))
+        # chunk canônico de quase duplicados (services/dedup.py): as outras origens também contam
+        for o in meta.get("duplicate_sources") or []:
+            key = (str(o.get("source", "unknown")), o.get("page"))
+            if key not in seen:
+                seen.add(key)
+                srcs.append(SourceDoc(source=key[0], page=key[1], collection=meta.get("collection")))
+    return srcs
+
+
 @router.post("/api/chat", response_model=ChatResponse)
 def chat(req: ChatRequest):
+    deadline = time.monotonic() + settings.llm_chat_deadline_s
     user_input = (req.message or req.question or "").strip()
     if not user_input:
         raise HTTPException(status_code=400, detail="message vazio")
 
-    vs, _meta = build_or_load_vectorstore(rebuild=False)
-    retriever = make_retriever(vs)
-    if req.top_k:
-        retriever.search_kwargs["k"] = req.top_k  # parametriza k
+    if req.collections:
+        # fan-out: busca em todas as coleções pedidas e responde sobre o resultado combinado
+        try:
+            docs = fanout_search(user_input, req.collections, k=req.top_k or 4)
+        except KeyError as e:
+            raise HTTPException(status_code=404, detail=str(e.args[0]))
+        with llm_slot("chat", deadline=deadline):
+            answer = answer_with_docs(user_input, docs)
+        if not req.return_sources:
+            docs = []
+    else:
+        try:
+            vs, _meta = build_or_load_vectorstore(rebuild=False, collection=req.collection)
+        except KeyError as e:
+            raise HTTPException(status_code=404, detail=str(e.args[0]))
+        mode = (req.retrieval or settings.retrieval_mode).lower()
+        if mode not in ("adaptive", "fixed"):
+            raise HTTPException(status_code=400, detail="retrieval deve ser adaptive ou fixed")
+        if mode == "adaptive":
+            # top_k explícito vira o teto; sem ele, RETRIEVAL_MAX_K
+            max_k = req.top_k if "top_k" in req.model_fields_set and req.top_k else settings.retrieval_max_k
+            docs, info = adaptive_retrieve(vs, user_input, max_k=max_k)
+            if docs:
+                with llm_slot("chat", deadline=deadline):
+                    answer = answer_with_docs(user_input, docs)
+            else:
+                answer = settings.retrieval_not_found_answer  # nada passou do piso: sem LLM
+            try:
+                inc("chats", 1)
+            except Exception:
+                pass
+            return ChatResponse(
+                answer=answer,
+                sources=_sources_from_docs(docs) if req.return_sources else [],
+                prompt_version=get_prompt("chat_answer.txt").version,
+                retrieval=info,
+            )
+        retriever = make_retriever(vs)
+        if req.top_k:
+            retriever.search_kwargs["k"] = req.top_k  # parametriza k
 
-    # pega fontes (API nova .invoke); só busca se caller quiser fontes
-    docs = retriever.invoke(user_input) if req.return_sources else []
+        # pega fontes (API nova .invoke); só busca se caller quiser fontes
+        docs = retriever.invoke(user_input) if req.return_sources else []
 
-    chain = make_qa_chain(vs)
-    answer = chain.invoke(user_input)
+        chain = make_qa_chain(vs)
+        with llm_slot("chat", deadline=deadline):
+            answer = chain.invoke(user_input)
 
-    srcs = []
-    for d in docs:
-        meta = d.metadata or {}
-        page = meta.get("page") or meta.get("page_number")
-        srcs.append(
-            SourceDoc(source=str(meta.get("source", "unknown")), page=page)
-        )
+    srcs = _sources_from_docs(docs)
 
     # telemetria básica
     try:
@@ -38,4 +99,44 @@ def chat(req: ChatRequest):
     except Exception:
         pass
 
-    return ChatResponse(answer=answer, sources=srcs)
+    return ChatResponse(answer=answer, sources=srcs, prompt_version=get_prompt("chat_answer.txt").version)
+
+
+@router.post("/api/chat/batch")
+def chat_batch(req: ChatBatchRequest):
+    """
+    Várias perguntas numa chamada. Responde em NDJSON (uma linha por pergunta,
+    na ordem em que terminam); a última linha é {"summary": {...}} com throughput_qps.
+    """
+    questions = [(q or "").strip() for q in req.questions]
+    if not questions:
+        raise HTTPException(status_code=400, detail="questions vazio")
+    empty = [i for i, q in enumerate(questions) if not q]
+    if empty:
+        raise HTTPException(status_code=400, detail=f"perguntas vazias nos índices {empty}")
+    if len(questions) > settings.chat_batch_max_questions:
+        raise HTTPException(
+            status_code=400,
+            detail=f"máximo de {settings.chat_batch_max_questions} perguntas por lote",
+        )
+    try:
+        build_or_load_vectorstore(rebuild=False, collection=req.collection)  # 404 antes de abrir o stream
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=str(e.args[0]))
+
+    def _ndjson():
+        answered = 0
+        for item in answer_batch(questions, top_k=req.top_k or 4, max_concurrency=req.max_concurrency,
+                                 collection=req.collection):
+            docs = item.pop("docs", None)
+            if docs is not None:
+                answered += 1
+                if req.return_sources:
+                    item["sources"] = [s.model_dump() for s in _sources_from_docs(docs)]
+            yield json.dumps(item, ensure_ascii=False) + "\n"
+        try:
+            inc("chats", answered)
+        except Exception:
+            pass
+
+    return StreamingResponse(_ndjson(), media_type="application/x-ndjson")
@@ -0,0 +1,15 @@
+import hmac
+from typing import Optional
+from fastapi import Header, HTTPException
+from ..config import settings
+
+
+def require_admin(x_admin_token: Optional[str] = Header(default=None)):
+    """
+    Endpoints de admin sensíveis (profiling, snapshots, compactação, coleções) só com
+    ADMIN_TOKEN configurado e enviado no header X-Admin-Token.
+    """
+    if not settings.admin_token:
+        raise HTTPException(status_code=403, detail="endpoint de admin desligado: defina ADMIN_TOKEN")
+    if not x_admin_token or not hmac.compare_digest(x_admin_token, settings.admin_token):
+        raise HTTPException(status_code=401, detail="X-Admin-Token inválido")
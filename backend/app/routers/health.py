@@ -1,7 +1,16 @@
 from fastapi import APIRouter
+from fastapi.responses import JSONResponse
+from ..services import warmup
 
 router = APIRouter()
 
 @router.get("/health")
 def health():
+    """Liveness: o processo está de pé (não depende do warm-up)."""
     return {"status": "ok"}
+
+@router.get("/ready")
+def ready():
+    """Readiness: 200 só depois do warm-up; antes disso, 503 com o estado atual."""
+    state = warmup.status()
+    return JSONResponse(status_code=200 if warmup.is_ready() else 503, content=state)
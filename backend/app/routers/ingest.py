@@ -1,7 +1,7 @@
-from fastapi import APIRouter
+from fastapi import APIRouter, HTTPException
 from ..models import IngestRequest
 from ..services.rag import build_or_load_vectorstore
-from ..services.connectors import collect_documents
+from ..services.collections_config import get_collection
 
 router = APIRouter()
 
@@ -13,13 +13,19 @@ def _faiss_count(vs):
 
 @router.post("/api/ingest")
 def ingest(req: IngestRequest):
-    # coleta docs de conectores habilitados (além da pasta local)
-    extra_docs = collect_documents()
-    vs, meta = build_or_load_vectorstore(rebuild=req.rebuild, extra_docs=extra_docs)
+    try:
+        cfg = get_collection(req.collection)
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=str(e.args[0]))
+    # no rebuild, os conectores habilitados da coleção (além da pasta local) são
+    # lidos em streaming pelo próprio build_or_load_vectorstore
+    vs, meta = build_or_load_vectorstore(rebuild=req.rebuild, collection=cfg["name"])
     total = _faiss_count(vs)
     return {
         "status": "ok",
+        "collection": cfg["name"],
         "rebuild": req.rebuild,
         "vectors": total,
         "sources": meta.get("sources"),
+        "dedup": meta.get("dedup"),
     }
@@ -0,0 +1,104 @@
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import PlainTextResponse
+from ..services import profiler
+from .deps import require_admin
+
+
+router = APIRouter(prefix="/api/admin/profile", dependencies=[Depends(require_admin)])
+
+
+def _cpu_or_404(sid: Optional[int]) -> profiler.CpuSession:
+    session = profiler.get_cpu(sid)
+    if session is None:
+        raise HTTPException(status_code=404, detail="nenhum profile de CPU" if sid is None else f"profile {sid} não existe")
+    return session
+
+
+@router.post("/cpu/start")
+def cpu_start(seconds: float = 30, interval_ms: Optional[float] = None):
+    """Começa a amostrar as pilhas de todas as threads por `seconds` (teto PROFILE_MAX_SECONDS)."""
+    try:
+        session = profiler.start_cpu(seconds, interval_ms)
+    except profiler.ProfilerBusy as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return {"id": session.id, "seconds": session.seconds, "interval_ms": session.interval_s * 1000}
+
+
+@router.post("/cpu/stop")
+def cpu_stop(id: Optional[int] = None):
+    """Para antes do prazo e devolve o resumo (top funções por amostras)."""
+    _cpu_or_404(id)
+    return profiler.stop_cpu(id).summary()
+
+
+@router.get("/cpu")
+def cpu_list():
+    return {"sessions": profiler.list_cpu()}
+
+
+@router.get("/cpu/{sid}")
+def cpu_summary(sid: int, top: int = 20, idle: bool = False):
+    """Resumo da sessão; idle=true inclui threads paradas em espera (lock, fila, select)."""
+    return _cpu_or_404(sid).summary(top=top, idle=idle)
+
+
+@router.get("/cpu/{sid}/folded")
+def cpu_folded(sid: int, idle: bool = True):
+    """Collapsed stacks (flamegraph.pl / speedscope). idle=false tira as threads só esperando."""
+    session = _cpu_or_404(sid)
+    return PlainTextResponse(
+        session.folded(idle=idle),
+        headers={"Content-Disposition": f'attachment; filename="cpu-{sid}.folded"'},
+    )
+
+
+@router.get("/memory")
+def memory_status():
+    return profiler.memory_status()
+
+
+@router.post("/memory/start")
+def memory_start(frames: int = 25):
+    """Liga o tracemalloc (custa memória e CPU enquanto ligado)."""
+    return profiler.start_memory(frames)
+
+
+@router.post("/memory/stop")
+def memory_stop():
+    return profiler.stop_memory()
+
+
+@router.post("/memory/snapshot")
+def memory_snapshot(top: int = 20):
+    try:
+        return profiler.take_snapshot(top)
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+
+@router.get("/memory/diff")
+def memory_diff(base: int, target: int, top: int = 20):
+    """O que cresceu (ou encolheu) entre dois snapshots, por linha de código."""
+    try:
+        return profiler.diff(base, target, top)
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=str(e.args[0]))
+
+
+@router.get("/memory/{sid}/folded")
+def memory_folded(sid: int):
+    """Collapsed stacks ponderadas por bytes (flamegraph de memória)."""
+    try:
+        text = profiler.memory_folded(sid)
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=str(e.args[0]))
+    return PlainTextResponse(text, headers={"Content-Disposition": f'attachment; filename="mem-{sid}.folded"'})
+
+
+@router.get("/threads")
+def threads(format: str = "text"):
+    """Pilha atual de cada thread do worker. format=json para estruturado."""
+    if format == "json":
+        return profiler.thread_dump()
+    return PlainTextResponse(profiler.thread_dump_text())
@@ -1,6 +1,8 @@
 # app/routers/qa.py
-from fastapi import APIRouter, UploadFile, File, Form, HTTPException
+from fastapi import APIRouter, UploadFile, File, Form, HTTPException, Request, Response, Query
 from fastapi.responses import FileResponse
+from fastapi.concurrency import run_in_threadpool
+from pydantic import ValidationError
 from typing import List, Optional
 from pathlib import Path
 import os
@@ -9,6 +11,10 @@ import uuid
 import json
 
 from ..services.qa_analyzer import analyze_evidence, publish_report
+from ..services.scheduler import Rejected
+from ..services import report_catalog, report_store, qa_batch, policies
+from ..services.uploads import save_stream, default_budget, UploadTooLarge, MB
+from ..models import QABatchManifest
 from ..config import settings
 
 router = APIRouter(prefix="/api/qa", tags=["qa"])
@@ -31,6 +37,7 @@ def _safe_name(name: str) -> str:
 
 @router.post("/analyze")
 async def analyze(
+    request: Request,
     case_title: str = Form(...),
     area: Optional[str] = Form(None),                  # ex.: 'pix'
     files: List[UploadFile] = File(default=[])         # field name: 'files'
@@ -39,17 +46,21 @@ async def analyze(
     UPLOADS_DIR.mkdir(parents=True, exist_ok=True)
     REPORTS_DIR.mkdir(parents=True, exist_ok=True)
 
-    # 2) Salvar evidências
+    # 2) Salvar evidências (em blocos, com limite por arquivo/requisição e dedupe por hash)
+    budget = default_budget()
+    declared = int(request.headers.get("content-length") or 0)
+    if budget.max_bytes and declared > budget.max_bytes:
+        raise HTTPException(status_code=413, detail=f"requisição excede o limite de {budget.max_bytes // MB} MB")
+
     saved_paths: List[str] = []
     try:
         for f in files:
             safe_filename = _safe_name(f.filename or "")
-            dest_path = UPLOADS_DIR / safe_filename
-            content = await f.read()
-            with open(dest_path, "wb") as out:
-                out.write(content)
-            # normaliza para "/" (evita "\" no Windows)
-            saved_paths.append(str(dest_path).replace("\\", "/"))
+            saved = await run_in_threadpool(save_stream, f.file, UPLOADS_DIR, safe_filename, budget)
+            # save_stream já normaliza para "/" (evita "\" no Windows)
+            saved_paths.append(saved["path"])
+    except UploadTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Falha ao salvar evidências: {e}")
 
@@ -57,9 +68,10 @@ async def analyze(
         # Permitir uso sem arquivos? Se não, lança erro:
         raise HTTPException(status_code=400, detail="Nenhum arquivo foi enviado.")
 
-    # 3) Rodar o analisador
+    # 3) Rodar o analisador (fora do event loop: pode esperar na fila do LLM)
     try:
-        report = analyze_evidence(
+        report = await run_in_threadpool(
+            analyze_evidence,
             case_title=case_title,
             evidence_paths=saved_paths,
             area=area,
@@ -67,87 +79,162 @@ async def analyze(
         # Espera-se que o serviço preencha ao menos:
         # { id, title, area, report_markdown_path, created_at, ... }
         return report
+    except Rejected:
+        raise  # vira 429/503 no handler do main
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Falha ao analisar: {e}")
 
 
+@router.post("/batch")
+async def analyze_batch(
+    request: Request,
+    manifest: str = Form(...),                         # JSON: {"cases": [...], "max_concurrency"?: n}
+    files: List[UploadFile] = File(default=[]),
+):
+    """
+    Vários casos num job só. O manifest lista os casos e, em cada um, os nomes
+    (filename) dos arquivos enviados em 'files' que servem de evidência:
+
+        {"cases": [{"case_title": "PIX - timeout", "area": "pix", "files": ["log1.txt", "tela.png"]}]}
+
+    Responde na hora com o job_id; o progresso por caso sai em GET /api/qa/batch/{job_id}.
+    """
+    try:
+        spec = json.loads(manifest)
+        if isinstance(spec, list):
+            spec = {"cases": spec}
+        spec = QABatchManifest.model_validate(spec)
+    except ValidationError as e:
+        errors = [f"{'.'.join(str(p) for p in err['loc'])}: {err['msg']}" for err in e.errors()]
+        raise HTTPException(status_code=400, detail=f"manifest inválido: {errors}")
+    except ValueError as e:  # JSON malformado
+        raise HTTPException(status_code=400, detail=f"manifest inválido: {e}")
+    cases_in = spec.cases
+    if not cases_in:
+        raise HTTPException(status_code=400, detail="manifest sem casos")
+    if len(cases_in) > settings.qa_batch_max_cases:
+        raise HTTPException(status_code=400, detail=f"máximo de {settings.qa_batch_max_cases} casos por lote")
+    # o manifest referencia os arquivos pelo nome: dois com o mesmo nome seriam ambíguos
+    names_sent = [f.filename for f in files]
+    dup = sorted({n for n in names_sent if names_sent.count(n) > 1})
+    if dup:
+        raise HTTPException(status_code=400, detail=f"arquivos com nome repetido: {dup}")
+
+    budget = default_budget()
+    declared = int(request.headers.get("content-length") or 0)
+    if budget.max_bytes and declared > budget.max_bytes:
+        raise HTTPException(status_code=413, detail=f"requisição excede o limite de {budget.max_bytes // MB} MB")
+
+    # salva cada arquivo uma vez; o manifest referencia pelo nome original
+    UPLOADS_DIR.mkdir(parents=True, exist_ok=True)
+    saved_by_name = {}
+    try:
+        for f in files:
+            saved = await run_in_threadpool(save_stream, f.file, UPLOADS_DIR, _safe_name(f.filename or ""), budget)
+            saved_by_name[f.filename] = saved["path"]
+    except UploadTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Falha ao salvar evidências: {e}")
+
+    cases = []
+    for i, c in enumerate(cases_in):
+        title = c.case_title.strip()
+        if not title:
+            raise HTTPException(status_code=400, detail=f"caso {i}: case_title vazio")
+        names = c.files
+        missing = [n for n in names if n not in saved_by_name]
+        if missing:
+            raise HTTPException(status_code=400, detail=f"caso {i}: arquivos não enviados: {missing}")
+        if not names:
+            raise HTTPException(status_code=400, detail=f"caso {i}: nenhuma evidência")
+        cases.append({
+            "case_title": title,
+            "area": c.area,
+            "evidence_paths": [saved_by_name[n] for n in names],
+        })
+
+    return qa_batch.submit(cases, max_concurrency=spec.max_concurrency)
+
+
+@router.get("/batch/{job_id}")
+def get_batch(job_id: str):
+    """Progresso do job: status geral, contagens e status/report_id por caso."""
+    job = qa_batch.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job não encontrado")
+    return job
+
+
 @router.get("/reports")
-def list_reports():
+def list_reports(
+    response: Response,
+    limit: int = Query(100, ge=1, le=1000),
+    offset: int = Query(0, ge=0),
+    area: Optional[str] = None,
+    q: Optional[str] = None,                  # busca em título / case_title
+    sort: str = "created_at",
+    order: str = "desc",
+):
     """
-    Varre '<reports_dir>/*.json' e retorna uma lista de metadados.
+    Lista metadados dos relatórios a partir do catálogo (SQLite), com paginação,
+    filtro e ordenação. O total que casa com o filtro vai no header X-Total-Count.
     """
-    if not REPORTS_DIR.exists():
-        return []
-
-    items = []
-    for fp in REPORTS_DIR.glob("*.json"):
-        try:
-            data = json.loads(fp.read_text(encoding="utf-8"))
-            items.append({
-                "id": data.get("id") or fp.stem,
-                "title": data.get("title"),
-                "area": data.get("area"),
-                "created_at": data.get("created_at"),
-                "report_json_path": str(fp).replace("\\", "/"),
-                "report_markdown_path": data.get("report_markdown_path"),
-            })
-        except Exception:
-            # ignora arquivos inválidos
-            pass
-
-    # ordena por data desc (se não houver, mantém no fim)
-    items.sort(key=lambda x: x.get("created_at") or "", reverse=True)
+    try:
+        items, total = report_catalog.list_reports(
+            limit=limit, offset=offset, area=area, q=q, sort=sort, order=order
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    response.headers["X-Total-Count"] = str(total)
     return items
 
 
 @router.get("/reports/{report_id}")
-def get_report(report_id: str):
+def get_report(report_id: str, include_blobs: bool = True):
     """
-    Retorna o JSON do relatório por ID (procura <id>.json no reports_dir).
+    Retorna o JSON do relatório por ID. Texto extraído e saída crua do LLM ficam
+    em blobs comprimidos e só são lidos com include_blobs=true (padrão).
     """
-    jpath = REPORTS_DIR / f"{report_id}.json"
-    if not jpath.exists():
-        raise HTTPException(status_code=404, detail="Relatório não encontrado")
-
     try:
-        data = json.loads(jpath.read_text(encoding="utf-8"))
-        return data
+        data = report_store.load_report(report_id, include_blobs=include_blobs)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Falha ao ler relatório: {e}")
+    if data is None:
+        raise HTTPException(status_code=404, detail="Relatório não encontrado")
+    return data
 
 
 @router.get("/report_md/{report_id}")
 def get_report_md(report_id: str):
     """
-    Retorna o arquivo Markdown do relatório.
-    Prioriza o caminho salvo no JSON; se não houver, tenta <reports_dir>/<id>.md.
+    Retorna o arquivo Markdown do relatório (caminho vem do catálogo;
+    se não houver, tenta <reports_dir>/<id>.md). Não abre o JSON.
     """
-    jpath = REPORTS_DIR / f"{report_id}.json"
-    if not jpath.exists():
-        raise HTTPException(status_code=404, detail="Relatório não encontrado")
-
     try:
-        data = json.loads(jpath.read_text(encoding="utf-8"))
-        md_path = data.get("report_markdown_path")
-        if md_path:
-            md_file = Path(md_path)
-            if not md_file.is_absolute():
-                md_file = (REPORTS_DIR / md_file.name)
-        else:
-            md_file = REPORTS_DIR / f"{report_id}.md"
-
-        if not md_file.exists():
-            raise HTTPException(status_code=404, detail="Markdown do relatório não encontrado")
-
-        return FileResponse(
-            path=str(md_file),
-            media_type="text/markdown",
-            filename=md_file.name
-        )
-    except HTTPException:
-        raise
+        md_file = report_store.markdown_file(report_id)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Falha ao servir Markdown: {e}")
+    if md_file is None:
+        raise HTTPException(status_code=404, detail="Markdown do relatório não encontrado")
+
+    return FileResponse(
+        path=str(md_file),
+        media_type="text/markdown",
+        filename=md_file.name
+    )
+
+
+@router.get("/policies")
+def list_policies():
+    """Políticas de QA carregadas (por área)."""
+    return policies.list_policies()
+
+
+@router.post("/policies/reload")
+def reload_policies():
+    """Força a releitura de app/data/qa/policies (normalmente é automática por mtime)."""
+    return {"ok": True, "policies": policies.reload_policies()}
 
 
 @router.post("/publish")
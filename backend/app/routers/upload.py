@@ -1,13 +1,14 @@
 # app/routers/upload.py
-from fastapi import APIRouter, UploadFile, File, Query, HTTPException
+from fastapi import APIRouter, UploadFile, File, Query, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
 from typing import List, Dict, Any
 from pathlib import Path
 import os
-import shutil
-import time
 
 from ..config import settings
-from ..services.rag import build_or_load_vectorstore
+from ..services.connectors import LOCAL_LOADERS
+from ..services.rag import build_or_load_vectorstore, add_documents, indexed_sources
+from ..services.uploads import save_stream, default_budget, UploadTooLarge, MB
 
 router = APIRouter()
 
@@ -20,12 +21,19 @@ def _sanitize_filename(name: str) -> str:
 
 @router.post("/api/upload")
 async def upload_files(
+    request: Request,
     files: List[UploadFile] = File(...),
-    reindex: bool = Query(False, description="Se true, reconstrói o índice após salvar os arquivos")
+    reindex: bool = Query(False, description="Se true, indexa os arquivos novos no segmento delta (buscáveis em segundos)"),
+    rebuild: bool = Query(False, description="Se true, reconstrói o índice inteiro após salvar os arquivos"),
 ):
     docs_dir = settings.docs_dir
     os.makedirs(docs_dir, exist_ok=True)
 
+    budget = default_budget()
+    declared = int(request.headers.get("content-length") or 0)
+    if budget.max_bytes and declared > budget.max_bytes:
+        raise HTTPException(status_code=413, detail=f"requisição excede o limite de {budget.max_bytes // MB} MB")
+
     saved: List[Dict[str, Any]] = []
 
     for f in files:
@@ -36,22 +44,36 @@ async def upload_files(
         if ext and ext not in ALLOWED_EXTS:
             raise HTTPException(status_code=400, detail=f"Extensão não suportada: {ext}")
 
-        # se já existir, cria um nome único
-        dst = Path(docs_dir) / fname
-        if dst.exists():
-            stem = dst.stem
-            unique = f"{stem}_{int(time.time())}{dst.suffix}"
-            dst = Path(docs_dir) / unique
-
-        # salva conteúdo
-        with dst.open("wb") as out:
-            shutil.copyfileobj(f.file, out)
+        # salva em blocos; mesmo nome + mesmo conteúdo não é regravado,
+        # mesmo nome + conteúdo diferente vira <nome>_<hash><ext>
+        try:
+            res = await run_in_threadpool(save_stream, f.file, Path(docs_dir), fname, budget)
+        except UploadTooLarge as e:
+            raise HTTPException(status_code=413, detail=str(e))
 
-        saved.append({"file": f.filename, "path": str(dst)})
+        saved.append({
+            "file": f.filename,
+            "path": res["path"],
+            "sha256": res["sha256"],
+            "size": res["size"],
+            "deduplicated": res["deduplicated"],
+        })
 
+    # .doc/.xls são aceitos (ficam salvos), mas nenhum loader da pasta local os lê
+    not_indexed = [s["path"] for s in saved if Path(s["path"]).suffix.lower() not in LOCAL_LOADERS]
+    if rebuild:
+        vs, meta = await run_in_threadpool(build_or_load_vectorstore, True)
+        return {"status": "ok", "saved": saved, "reindexed": True, "vectors": meta.get("vectors"),
+                "not_indexed": not_indexed}
     if reindex:
-        vs, meta = build_or_load_vectorstore(rebuild=True)
-        return {"status": "ok", "saved": saved, "reindexed": True, "vectors": meta.get("vectors")}
+        # idêntico a um já salvo (deduplicated) só pula se de fato já está no índice
+        # (pode ter sido salvo sem reindex, ou ter saído por um lote de remoção)
+        indexed = await run_in_threadpool(indexed_sources) if any(s["deduplicated"] for s in saved) else set()
+        paths = [s["path"] for s in saved if s["path"] not in not_indexed
+                 and not (s["deduplicated"] and s["path"].replace("\\", "/") in indexed)]
+        delta = await run_in_threadpool(add_documents, paths) if paths else None
+        return {"status": "ok", "saved": saved, "reindexed": True,
+                "vectors": delta["vectors"] if delta else None, "delta": delta, "not_indexed": not_indexed}
     else:
         # não reindexou — retorna apenas confirmação
         return {"status": "ok", "saved": saved, "reindexed": False}
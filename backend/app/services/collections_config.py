@@ -0,0 +1,97 @@
+# app/services/collections_config.py
+"""
+Coleções nomeadas (app/data/collections.json).
+
+Cada coleção tem o próprio índice FAISS (persist_dir), o próprio conjunto de
+conectores (nomes do connectors.json usados no rebuild), a própria pasta local
+(docs_dir, opcional) e a própria configuração de chunking:
+
+    {
+      "default": {},
+      "notion":  {"connectors": ["notion"], "chunk_size": 800, "chunk_overlap": 100},
+      "qa":      {"docs_dir": "app/data/qa/docs", "connectors": []}
+    }
+
+Campos omitidos usam os defaults abaixo. A coleção "default" é a de sempre
+(PERSIST_DIR + DOCS_DIR + todos os conectores habilitados); as demais ficam em
+<PERSIST_DIR>/collections/<nome>. A carga dos índices (lazy, LRU com orçamento
+de memória) fica em services/rag.py.
+"""
+import json
+import logging
+import os
+import re
+from typing import Any, Dict, List
+
+from ..config import settings
+
+logger = logging.getLogger("chronos.collections")
+
+CONFIG_PATH = os.path.join("app/data", "collections.json")
+DEFAULT = "default"
+_NAME_RE = re.compile(r"^[a-z0-9][a-z0-9_-]{0,63}$")
+
+_FIELDS = {"persist_dir", "docs_dir", "connectors", "chunk_size", "chunk_overlap", "description"}
+
+
+def _load() -> Dict[str, Any]:
+    if not os.path.exists(CONFIG_PATH):
+        return {DEFAULT: {}}
+    with open(CONFIG_PATH, "r", encoding="utf-8") as f:
+        cfg = json.load(f)
+    cfg.setdefault(DEFAULT, {})
+    return cfg
+
+
+def _save(cfg: Dict[str, Any]):
+    os.makedirs(os.path.dirname(CONFIG_PATH), exist_ok=True)
+    with open(CONFIG_PATH, "w", encoding="utf-8") as f:
+        json.dump(cfg, f, ensure_ascii=False, indent=2)
+    logger.info("[COLLECTIONS] saved %s", CONFIG_PATH)
+
+
+def _resolve(name: str, raw: Dict[str, Any]) -> Dict[str, Any]:
+    default = name == DEFAULT
+    return {
+        "name": name,
+        "description": raw.get("description", ""),
+        "persist_dir": raw.get("persist_dir")
+        or (settings.persist_dir if default else os.path.join(settings.persist_dir, "collections", name)),
+        # None = sem pasta local
+        "docs_dir": raw.get("docs_dir", settings.docs_dir if default else None),
+        # None = todos os conectores habilitados no connectors.json
+        "connectors": raw.get("connectors", None if default else []),
+        "chunk_size": int(raw.get("chunk_size", 1000)),
+        "chunk_overlap": int(raw.get("chunk_overlap", 150)),
+    }
+
+
+def get_collection(name: str = DEFAULT) -> Dict[str, Any]:
+    """Configuração resolvida da coleção; KeyError se não existir."""
+    name = name or DEFAULT
+    cfg = _load()
+    if name not in cfg:
+        raise KeyError(f"coleção '{name}' não encontrada")
+    return _resolve(name, cfg[name] or {})
+
+
+def list_collections() -> List[Dict[str, Any]]:
+    return [_resolve(n, raw or {}) for n, raw in sorted(_load().items())]
+
+
+def update_collection(name: str, patch: Dict[str, Any]) -> Dict[str, Any]:
+    """Cria ou altera uma coleção. ValueError para nome/campos inválidos."""
+    if not _NAME_RE.match(name or ""):
+        raise ValueError("nome inválido (use a-z, 0-9, '-' e '_')")
+    unknown = set(patch) - _FIELDS
+    if unknown:
+        raise ValueError(f"campos desconhecidos: {sorted(unknown)}")
+    if "connectors" in patch and patch["connectors"] is not None and not isinstance(patch["connectors"], list):
+        raise ValueError("'connectors' deve ser uma lista de nomes (ou null para todos)")
+    cfg = _load()
+    cfg.setdefault(name, {}).update(patch)
+    resolved = _resolve(name, cfg[name])
+    if resolved["chunk_size"] <= 0 or not 0 <= resolved["chunk_overlap"] < resolved["chunk_size"]:
+        raise ValueError("chunk_size deve ser > 0 e 0 <= chunk_overlap < chunk_size")
+    _save(cfg)
+    return resolved
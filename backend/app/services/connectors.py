@@ -1,13 +1,19 @@
 # app/services/connectors.py
-import os, json, logging
-from typing import Dict, Any, List
-from langchain_core.documents import Document
-from langchain_community.document_loaders import (
-    DirectoryLoader, TextLoader, PyPDFLoader, CSVLoader, WebBaseLoader,
-    NotionDBLoader, GoogleDriveLoader,
-)
-from langchain_community.document_loaders import Docx2txtLoader, UnstructuredExcelLoader
-from notion_client import Client as NotionClient
+from __future__ import annotations
+import os, json, logging, time
+from typing import TYPE_CHECKING, Dict, Any, Iterable, Iterator, List, Optional
+
+from . import metrics
+
+# loaders do langchain_community / notion_client são importados dentro de cada
+# conector: só quem ingere paga o import (e só dos conectores habilitados).
+#
+# Cada conector é um gerador de Document: devolve um documento por vez, à
+# medida que lê/baixa, em vez de montar a lista inteira. Quem consome
+# (iter_documents -> services/ingest_pipeline.py) controla o ritmo; uma pasta
+# grande do Drive ou um workspace do Notion não precisa caber em memória.
+if TYPE_CHECKING:
+    from langchain_core.documents import Document
 # --- logging ---------------------------------------------------------------
 LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
 logging.basicConfig(level=LOG_LEVEL)
@@ -19,7 +25,7 @@ CONFIG_PATH = os.path.join(CONFIG_DIR, "connectors.json")
 
 DEFAULT_CONFIG = {
     "local": {"enabled": True, "path": "app/data/docs"},
-    "urls":  {"enabled": False, "list": ["https://www.example.com"]},
+    "urls":  {"enabled": False, "list": ["https://www.example.com"], "sitemaps": []},
     "notion": {"enabled": False, "integration_token": "", "database_id": ""},
     "gdrive": {"enabled": False, "folder_id": "", "service_account_json": ""},
     "m365":   {"enabled": False, "site_id": "", "drive_id": "",
@@ -58,67 +64,102 @@ def update_connector(name: str, patch: Dict[str, Any]) -> Dict[str, Any]:
     return cfg[name]
 
 # ------------------------- Local ------------------------------------------
-def _iter_local_docs(path: str) -> List[Document]:
+def _normalize(d: Document, connector: str, default_source: str) -> Document:
+    src = d.metadata.get("source") or d.metadata.get("file_path") or d.metadata.get("url") or default_source
+    d.metadata["source"] = str(src).replace("\\", "/")
+    d.metadata.setdefault("connector", connector)
+    if "page" not in d.metadata and "page_number" in d.metadata:
+        d.metadata["page"] = d.metadata["page_number"]
+    return d
+
+# extensão -> (loader de langchain_community.document_loaders, kwargs).
+# Tabela única dos arquivos locais: rebuild da pasta, upload com reindex e
+# watcher (rag._iter_files, docs_watcher.scan) indexam exatamente o mesmo recorte.
+LOCAL_LOADERS: Dict[str, tuple] = {
+    ".md":   ("TextLoader", {"encoding": "utf-8", "autodetect_encoding": True}),
+    ".txt":  ("TextLoader", {"encoding": "utf-8", "autodetect_encoding": True}),
+    ".pdf":  ("PyPDFLoader", {}),
+    ".csv":  ("CSVLoader", {"encoding": "utf-8"}),
+    ".docx": ("Docx2txtLoader", {}),
+    ".xlsx": ("UnstructuredExcelLoader", {"mode": "elements"}),
+}
+
+def local_loader(path: str):
+    """Loader de um arquivo avulso conforme LOCAL_LOADERS; None se a extensão não é indexada."""
+    spec = LOCAL_LOADERS.get(os.path.splitext(path)[1].lower())
+    if spec is None:
+        return None
+    from langchain_community import document_loaders
+
+    name, kwargs = spec
+    return getattr(document_loaders, name)(path, **kwargs)
+
+def _iter_local_docs(path: str) -> Iterator[Document]:
     if not path or not os.path.exists(path):
         logger.warning("[LOCAL] path not found: %s", path)
-        return []
-
-    docs: List[Document] = []
-    patterns = [
-        ("**/*.md",   TextLoader, {"encoding": "utf-8", "autodetect_encoding": True}),
-        ("**/*.txt",  TextLoader, {"encoding": "utf-8", "autodetect_encoding": True}),
-        ("**/*.pdf",  PyPDFLoader, {}),
-        ("**/*.csv",  CSVLoader, {}),
-        ("**/*.docx", Docx2txtLoader, {}),
-        ("**/*.xlsx", UnstructuredExcelLoader, {"mode": "elements"}),
-    ]
-    total_before = 0
-    for pattern, loader_cls, loader_kwargs in patterns:
+        return
+    from langchain_community import document_loaders
+
+    total = 0
+    for ext, (loader_name, loader_kwargs) in LOCAL_LOADERS.items():
+        pattern, loader_cls = f"**/*{ext}", getattr(document_loaders, loader_name)
+        n = 0
         try:
-            loader = DirectoryLoader(
+            loader = document_loaders.DirectoryLoader(
                 path, glob=pattern, loader_cls=loader_cls,
-                loader_kwargs=loader_kwargs, show_progress=True,
-                use_multithreading=True
+                loader_kwargs=loader_kwargs, silent_errors=True,
             )
-            loaded = loader.load()
-            docs.extend(loaded)
-            logger.info("[LOCAL] pattern=%s -> %d docs", pattern, len(loaded))
-            total_before += len(loaded)
+            # lazy_load: um arquivo por vez
+            for d in loader.lazy_load():
+                n += 1
+                yield _normalize(d, "local", "local")
         except Exception as e:
             logger.exception("[LOCAL] fail pattern=%s: %s", pattern, e)
+        logger.info("[LOCAL] pattern=%s -> %d docs", pattern, n)
+        total += n
 
-    for d in docs:
-        src = d.metadata.get("source") or d.metadata.get("file_path") or "local"
-        d.metadata["source"] = str(src).replace("\\", "/")
-        d.metadata.setdefault("connector", "local")
-        if "page" not in d.metadata and "page_number" in d.metadata:
-            d.metadata["page"] = d.metadata["page_number"]
-
-    logger.info("[LOCAL] total docs: %d", len(docs))
-    return docs
+    logger.info("[LOCAL] total docs: %d", total)
 
 # ------------------------- URLs -------------------------------------------
-def _iter_url_docs(urls: List[str]) -> List[Document]:
-    urls = [u for u in (urls or []) if isinstance(u, str) and u.strip()]
-    if not urls:
-        return []
-    user_agent = os.getenv("USER_AGENT", "chronos-bemobi/0.1 (+https://bemobi.com)")
-    header_template = {"User-Agent": user_agent}
+def _iter_url_docs(urls: List[str], sitemaps: Optional[List[str]] = None) -> Iterator[Document]:
+    """
+    Páginas da lista + as dos sitemaps, via cache HTTP condicional
+    (services/http_cache.py): página que não mudou volta do cache sem ser
+    baixada de novo nem parseada.
+    """
+    urls = [u.strip() for u in (urls or []) if isinstance(u, str) and u.strip()]
+    sitemaps = [u.strip() for u in (sitemaps or []) if isinstance(u, str) and u.strip()]
+    if not urls and not sitemaps:
+        return
+    from langchain_core.documents import Document
+    from .http_cache import UrlFetcher
 
+    user_agent = os.getenv("USER_AGENT", "chronos-bemobi/0.1 (+https://bemobi.com)")
+    fetcher = UrlFetcher(user_agent)
+    seen = set()
+    n = 0
     try:
-        loader = WebBaseLoader(urls, header_template=header_template)
-        docs = loader.load()
-        for d in docs:
-            d.metadata.setdefault("connector", "urls")
-            src = d.metadata.get("source") or d.metadata.get("url") or "url"
-            d.metadata["source"] = str(src)
-            if "page" not in d.metadata and "page_number" in d.metadata:
-                d.metadata["page"] = d.metadata["page_number"]
-        logger.info("[URLS] fetched urls=%d -> %d docs", len(urls), len(docs))
-        return docs
+        def _all_urls() -> Iterator[str]:
+            yield from urls
+            for sm in sitemaps:
+                yield from fetcher.sitemap_urls(sm)
+
+        for url in _all_urls():
+            if url in seen:
+                continue
+            seen.add(url)
+            entry = fetcher.page(url)
+            if not entry or not (entry.get("text") or "").strip():
+                continue
+            n += 1
+            # body_sha256 vai para os chunks: o rebuild reaproveita o vetor de página que não mudou
+            metadata = {**(entry.get("metadata") or {}), "source": url, "body_sha256": entry.get("body_sha256")}
+            yield _normalize(Document(page_content=entry["text"], metadata=metadata), "urls", "url")
+        logger.info("[URLS] urls=%d -> %d docs | %s", len(seen), n, fetcher.counts)
     except Exception as e:
         logger.exception("[CONNECTOR][URLS] error: %s", e)
-        return []
+    finally:
+        fetcher.close()
 
 # ------------------------- Notion -----------------------------------------
 
@@ -170,7 +211,7 @@ def _extract_notion_text_from_property(prop_val):
         return str(prop_val)
 
 
-def _iter_notion_docs(notion_cfg: Dict[str, Any]) -> List[Document]:
+def _iter_notion_docs(notion_cfg: Dict[str, Any]) -> Iterator[Document]:
     """
     Lê um database do Notion via API oficial, converte propriedades padrão e
     monta o page_content manualmente. Evita o 'None' que aparece no NotionDBLoader.
@@ -184,10 +225,13 @@ def _iter_notion_docs(notion_cfg: Dict[str, Any]) -> List[Document]:
     database_id = notion_cfg.get("database_id")
     if not token or not database_id:
         logger.warning("[NOTION] missing token or database_id")
-        return []
+        return
+
+    from langchain_core.documents import Document
+    from notion_client import Client as NotionClient
 
     client = NotionClient(auth=token)
-    docs: List[Document] = []
+    n = 0
 
     try:
         # paginação simples (até 100 registros por chamada)
@@ -255,78 +299,101 @@ def _iter_notion_docs(notion_cfg: Dict[str, Any]) -> List[Document]:
                     "lastupdated": lastupdate,
                 }
 
-                docs.append(Document(page_content=text, metadata=metadata))
+                if n < 3:
+                    logger.info("[NOTION] sample %d | title=%s | text=%s", n + 1, name, text[:120] + "...")
+                n += 1
+                yield Document(page_content=text, metadata=metadata)
 
             if resp.get("has_more"):
                 cursor = resp.get("next_cursor")
             else:
                 break
 
-        logger.info("[NOTION] loaded %d docs (via notion_client) database_id=%s", len(docs), database_id)
-        # debug: primeiros 3 títulos/trechos
-        for i, d in enumerate(docs[:3]):
-            logger.info("[NOTION] sample %d | title=%s | text=%s",
-                        i+1, d.metadata.get("title"), (d.page_content[:120] + "..."))
-
-        return docs
+        logger.info("[NOTION] loaded %d docs (via notion_client) database_id=%s", n, database_id)
 
     except Exception as e:
         logger.exception("[CONNECTOR][NOTION] error: %s", e)
-        return []
 
 
 # ------------------------- Google Drive -----------------------------------
-def _iter_gdrive_docs(gdrive_cfg: Dict[str, Any]) -> List[Document]:
+def _iter_gdrive_docs(gdrive_cfg: Dict[str, Any]) -> Iterator[Document]:
     folder_id = gdrive_cfg.get("folder_id")
     sa_json = gdrive_cfg.get("service_account_json") or os.getenv("GOOGLE_APPLICATION_CREDENTIALS")
     if not folder_id or not sa_json or not os.path.exists(sa_json):
         logger.warning("[GDRIVE] missing folder_id or service_account_json")
-        return []
+        return
 
+    n = 0
     try:
+        from langchain_community.document_loaders import GoogleDriveLoader
+
         loader = GoogleDriveLoader(
             folder_id=folder_id,
             service_account_key_path=sa_json,
             recursive=True,
         )
-        docs = loader.load()
-        for d in docs:
-            d.metadata.setdefault("connector", "gdrive")
-            src = d.metadata.get("source") or d.metadata.get("file_path") or f"gdrive://{folder_id}"
-            d.metadata["source"] = str(src).replace("\\", "/")
-            if "page" not in d.metadata and "page_number" in d.metadata:
-                d.metadata["page"] = d.metadata["page_number"]
-        logger.info("[GDRIVE] folder=%s -> %d docs", folder_id, len(docs))
-        return docs
+        for d in loader.lazy_load():
+            n += 1
+            yield _normalize(d, "gdrive", f"gdrive://{folder_id}")
+        logger.info("[GDRIVE] folder=%s -> %d docs", folder_id, n)
     except Exception as e:
         logger.exception("[CONNECTOR][GDRIVE] error: %s", e)
-        return []
 
-def _iter_m365_docs(_: Dict[str, Any]) -> List[Document]:
+def _iter_m365_docs(_: Dict[str, Any]) -> Iterator[Document]:
     # TODO: Microsoft Graph (SharePoint/OneDrive)
-    return []
+    return iter(())
 
 # ------------------------- Orquestrador -----------------------------------
-def collect_documents() -> List[Document]:
+_CONNECTORS = {
+    "local":  lambda c: _iter_local_docs(c.get("path", "app/data/docs")),
+    "urls":   lambda c: _iter_url_docs(c.get("list", []), c.get("sitemaps", [])),
+    "notion": _iter_notion_docs,
+    "gdrive": _iter_gdrive_docs,
+    "m365":   _iter_m365_docs,
+}
+
+def metered(name: str, docs: Iterable[Document]) -> Iterator[Document]:
+    """
+    Repassa os documentos medindo o conector: connector_docs_total /
+    connector_chars_total e, ao final, connector_docs_per_s (documentos por
+    segundo gasto DENTRO do conector, sem contar o tempo de quem consome).
+    """
+    n = chars = 0
+    busy = 0.0
+    it = iter(docs)
+    while True:
+        t = time.perf_counter()
+        try:
+            d = next(it)
+        except StopIteration:
+            busy += time.perf_counter() - t
+            break
+        busy += time.perf_counter() - t
+        n += 1
+        chars += len(d.page_content or "")
+        metrics.inc("connector_docs_total", connector=name)
+        metrics.inc("connector_chars_total", len(d.page_content or ""), connector=name)
+        yield d
+    metrics.observe("connector_fetch_s", busy, connector=name)
+    metrics.set_gauge("connector_docs_per_s", round(n / busy, 2) if busy else 0.0, connector=name)
+    logger.info("[COLLECT] %s: %d docs, %d chars em %.2fs (%.1f docs/s)",
+                name, n, chars, busy, n / busy if busy else 0.0)
+
+def iter_documents(names: Optional[List[str]] = None) -> Iterator[Document]:
+    """
+    Documentos de todos os conectores habilitados, um por vez (um conector
+    depois do outro); com `names`, só desses (é assim que cada coleção escolhe
+    seus conectores).
+    """
     cfg = load_config()
-    out: List[Document] = []
-    summary = {}
-
-    if cfg.get("local", {}).get("enabled"):
-        loc = _iter_local_docs(cfg["local"].get("path", "app/data/docs"))
-        out.extend(loc); summary["local"] = len(loc)
-    if cfg.get("urls", {}).get("enabled"):
-        url_docs = _iter_url_docs(cfg["urls"].get("list", []))
-        out.extend(url_docs); summary["urls"] = len(url_docs)
-    if cfg.get("notion", {}).get("enabled"):
-        not_docs = _iter_notion_docs(cfg["notion"])
-        out.extend(not_docs); summary["notion"] = len(not_docs)
-    if cfg.get("gdrive", {}).get("enabled"):
-        gd = _iter_gdrive_docs(cfg["gdrive"])
-        out.extend(gd); summary["gdrive"] = len(gd)
-    if cfg.get("m365", {}).get("enabled"):
-        m = _iter_m365_docs(cfg["m365"])
-        out.extend(m); summary["m365"] = len(m)
-
-    logger.info("[COLLECT] summary: %s | total=%d", summary, len(out))
+    for name, make in _CONNECTORS.items():
+        if names is not None and name not in names:
+            continue
+        if cfg.get(name, {}).get("enabled"):
+            yield from metered(name, make(cfg[name]))
+
+def collect_documents(names: Optional[List[str]] = None) -> List[Document]:
+    """Versão em lista de iter_documents() (materializa tudo; para volumes pequenos)."""
+    out = list(iter_documents(names))
+    logger.info("[COLLECT] total=%d", len(out))
     return out
@@ -0,0 +1,169 @@
+# app/services/dedup.py
+"""
+Detecção de chunks quase duplicados na ingestão (MinHash + LSH por bandas).
+
+A mesma política em PDF e DOCX, páginas do Notion copiadas entre databases,
+a pasta local lida por dois caminhos... viram chunks quase iguais que custam
+embedding, ocupam o índice e tiram diversidade do MMR. Aqui cada chunk vira
+uma assinatura MinHash (DEDUP_NUM_PERM hashes sobre shingles de DEDUP_SHINGLE
+palavras); a assinatura é cortada em DEDUP_BANDS bandas e chunks que
+coincidem em alguma banda são candidatos. O candidato com similaridade de
+Jaccard estimada >= DEDUP_THRESHOLD é duplicata: o primeiro chunk visto fica
+(canônico) e as fontes dos demais vão para metadata["duplicate_sources"] dele.
+
+No rebuild o filtro nasce vazio. Nos caminhos incrementais (upload com
+reindex, watcher da pasta) o estado é o do índice carregado: seed() registra
+os chunks que já estão lá e forget() tira os de fontes removidas/alteradas.
+"""
+from __future__ import annotations
+
+import re
+import uuid
+import zlib
+from typing import TYPE_CHECKING, Dict, List, Set, Tuple
+
+import numpy as np
+
+from . import metrics
+from ..config import settings
+
+if TYPE_CHECKING:
+    from langchain_core.documents import Document
+
+_PRIME = np.uint64((1 << 61) - 1)
+_MAX_HASH = np.uint64((1 << 32) - 1)
+_WORD = re.compile(r"\w+", re.UNICODE)
+
+
+def _origin(d: Document) -> Tuple[str, str]:
+    meta = d.metadata or {}
+    page = meta.get("page")
+    return str(meta.get("source", "unknown")), "" if page is None else str(page)
+
+
+class NearDuplicates:
+    """Filtro com estado para uma ingestão: keep(chunk) diz se o chunk vai para o índice."""
+
+    def __init__(self):
+        self.num_perm = max(8, settings.dedup_num_perm)
+        self.bands = max(1, min(settings.dedup_bands, self.num_perm))
+        self.rows = self.num_perm // self.bands
+        self.threshold = settings.dedup_threshold
+        self.shingle = max(1, settings.dedup_shingle)
+        rng = np.random.RandomState(1)  # fixo: mesma assinatura para o mesmo texto entre execuções
+        self._a = rng.randint(1, 1 << 32, size=self.num_perm, dtype=np.uint64)
+        self._b = rng.randint(0, 1 << 32, size=self.num_perm, dtype=np.uint64)
+        self._buckets: List[Dict[bytes, List[int]]] = [{} for _ in range(self.bands)]
+        self._sigs: List[np.ndarray] = []
+        self._ids: List[str] = []
+        self._origins: List[Tuple[str, str]] = []
+        self._index_of: Dict[str, int] = {}  # id do chunk -> posição nas listas acima
+        self._dead: Set[int] = set()  # esquecidos (forget): não contam mais como canônicos
+        self.extra_sources: Dict[str, Set[Tuple[str, str]]] = {}
+        self.kept = 0
+        self.removed = 0
+
+    def signature(self, text: str) -> np.ndarray:
+        words = _WORD.findall(text.lower())
+        if len(words) <= self.shingle:
+            shingles = {" ".join(words)}
+        else:
+            shingles = {" ".join(words[i:i + self.shingle]) for i in range(len(words) - self.shingle + 1)}
+        hv = np.fromiter((zlib.crc32(s.encode("utf-8")) for s in shingles), dtype=np.uint64, count=len(shingles))
+        # permutações universais (a*x + b mod p), como no datasketch; overflow de uint64 é aceito
+        with np.errstate(over="ignore"):
+            phv = ((hv[:, None] * self._a + self._b) % _PRIME) & _MAX_HASH
+        return phv.min(axis=0).astype(np.uint32)
+
+    def __contains__(self, chunk_id: str) -> bool:
+        return chunk_id in self._index_of
+
+    def _keys(self, sig: np.ndarray) -> List[bytes]:
+        return [sig[i * self.rows:(i + 1) * self.rows].tobytes() for i in range(self.bands)]
+
+    def _add(self, chunk_id: str, origin: Tuple[str, str], sig: np.ndarray, keys: List[bytes]):
+        i = len(self._sigs)
+        self._sigs.append(sig)
+        self._ids.append(chunk_id)
+        self._origins.append(origin)
+        self._index_of[chunk_id] = i
+        for band, key in enumerate(keys):
+            self._buckets[band].setdefault(key, []).append(i)
+
+    def keep(self, chunk: Document) -> bool:
+        sig = self.signature(chunk.page_content or "")
+        keys = self._keys(sig)
+        seen: Set[int] = set()
+        for band, key in enumerate(keys):
+            for j in self._buckets[band].get(key, ()):
+                if j in seen or j in self._dead:
+                    continue
+                seen.add(j)
+                if float(np.mean(self._sigs[j] == sig)) >= self.threshold:
+                    self._duplicate_of(j, chunk)
+                    return False
+
+        # id próprio: depois da ingestão o canônico é achado no docstore por ele
+        chunk.id = chunk.id or uuid.uuid4().hex
+        self._add(chunk.id, _origin(chunk), sig, keys)
+        self.kept += 1
+        return True
+
+    def seed(self, chunk_id: str, chunk: Document):
+        """Registra um chunk que já está no índice (canônico), com as duplicatas que ele já carrega."""
+        if chunk_id in self._index_of:
+            return
+        sig = self.signature(chunk.page_content or "")
+        self._add(chunk_id, _origin(chunk), sig, self._keys(sig))
+        dups = (chunk.metadata or {}).get("duplicate_sources") or []
+        if dups:
+            self.extra_sources[chunk_id] = {
+                (str(o.get("source")), "" if o.get("page") is None else str(o.get("page"))) for o in dups
+            }
+
+    def forget(self, sources: Set[str] = frozenset(), ids: Set[str] = frozenset()) -> Set[str]:
+        """
+        Tira do estado os chunks dessas fontes (ou desses ids) e as fontes
+        deles das duplicatas dos demais. Retorna as outras fontes que só
+        estavam no índice como duplicata de um chunk esquecido (precisam ser
+        indexadas de novo).
+        """
+        orphans: Set[str] = set()
+        for i, (chunk_id, (src, _page)) in enumerate(zip(self._ids, self._origins)):
+            if i in self._dead or (src not in sources and chunk_id not in ids):
+                continue
+            self._dead.add(i)
+            orphans.update(s for s, _p in self.extra_sources.get(chunk_id, ()))
+            self.extra_sources[chunk_id] = set()
+        if sources:
+            for origins in self.extra_sources.values():
+                origins.difference_update({o for o in origins if o[0] in sources})
+        return orphans - set(sources)
+
+    def _duplicate_of(self, j: int, chunk: Document):
+        self.removed += 1
+        metrics.inc("ingest_duplicates_total")
+        origin = _origin(chunk)
+        if origin != self._origins[j]:
+            self.extra_sources.setdefault(self._ids[j], set()).add(origin)
+
+    def attach_sources(self, docstore) -> int:
+        """Grava as fontes das duplicatas no metadata dos canônicos (já no docstore). Retorna quantos."""
+        n = 0
+        for doc_id, origins in self.extra_sources.items():
+            doc = docstore.search(doc_id)
+            if isinstance(doc, str):  # docstore devolve mensagem de erro se não achar
+                continue
+            if not origins:
+                doc.metadata.pop("duplicate_sources", None)
+                continue
+            doc.metadata["duplicate_sources"] = [
+                {"source": s, "page": int(p) if p.isdigit() else None} for s, p in sorted(origins)
+            ]
+            n += 1
+        return n
+
+    def report(self) -> Dict[str, float]:
+        total = self.kept + self.removed
+        return {"chunks_seen": total, "duplicates_removed": self.removed,
+                "duplicate_ratio": round(self.removed / total, 3) if total else 0.0}
@@ -0,0 +1,357 @@
+# app/services/docs_watcher.py
+"""
+Watcher da pasta local (DOCS_WATCH=true): arquivos criados, alterados ou
+apagados no docs_dir das coleções (e no local.path do connectors.json, que vai
+para a coleção default) entram no índice sozinhos, pelo segmento delta
+(rag.sync_files): só os arquivos que mudaram são relidos e embedados, e a busca
+continua atendendo no índice atual enquanto isso.
+
+Eventos: watchfiles (inotify no Linux; vem com uvicorn[standard]) quando
+instalado; senão, ou com DOCS_WATCH_BACKEND=poll, varredura de mtime/tamanho a
+cada DOCS_WATCH_POLL_S. Nos dois casos o evento só diz "algo mudou": o que foi
+criado/alterado/apagado sai da comparação com o último estado indexado, que
+fica em <persist_dir>/delta/watch-manifest.json (mudanças feitas com a API
+parada entram na subida).
+
+Debounce: uma rajada (cópia de vários arquivos, editor salvando em etapas) vira
+uma atualização só, quando a pasta fica DOCS_WATCH_DEBOUNCE_MS sem mudança ou,
+com escrita contínua, DOCS_WATCH_MAX_DELAY_S depois da primeira mudança.
+
+Só um worker vigia (flock em PERSIST_DIR/delta/.watch.lock, solto pelo kernel
+se o processo morrer); os demais recebem os
+lotes pelo watcher do índice, como num upload. docs_watch_lag_ms mede da
+escrita do arquivo (mtime) até ele estar buscável.
+"""
+from __future__ import annotations
+
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import IO, Any, Dict, List, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows: sem vários workers, o lock sempre é concedido
+    fcntl = None  # type: ignore[assignment]
+
+from . import collections_config, connectors, metrics, segments
+from ..config import settings
+
+_LOCK_FILE = ".watch.lock"
+_MANIFEST_FILE = "watch-manifest.json"
+_LOCK_RETRY_S = 30  # worker sem o lock tenta de novo (o dono pode ter morrido)
+_lock_file: Optional[IO[str]] = None  # aberto enquanto este processo é o dono
+_RETRY_S = 5  # espera mínima depois de uma atualização que falhou
+
+# (coleção, fonte) -> (mtime_ns, tamanho); fonte no mesmo formato do DirectoryLoader
+Files = Dict[Tuple[str, str], Tuple[int, int]]
+
+
+def _source(path: str) -> str:
+    return str(Path(path)).replace("\\", "/")
+
+
+def targets() -> List[Tuple[str, str]]:
+    """(coleção, pasta) vigiadas: docs_dir de cada coleção + local.path do connectors.json."""
+    out: List[Tuple[str, str]] = []
+    default_uses_local = False
+    for cfg in collections_config.list_collections():
+        if cfg["docs_dir"]:
+            out.append((cfg["name"], cfg["docs_dir"]))
+        if cfg["name"] == collections_config.DEFAULT:
+            default_uses_local = cfg["connectors"] is None or "local" in cfg["connectors"]
+    local = connectors.load_config().get("local") or {}
+    if default_uses_local and local.get("enabled") and local.get("path"):
+        out.append((collections_config.DEFAULT, local["path"]))
+    seen, unique = set(), []
+    for name, folder in out:
+        key = (name, os.path.abspath(folder))
+        if key not in seen:
+            seen.add(key)
+            unique.append((name, folder))
+    return unique
+
+
+def scan(folders: List[Tuple[str, str]]) -> Files:
+    """Arquivos indexáveis das pastas (mesmo recorte do rebuild: extensões de LOCAL_LOADERS, sem ocultos)."""
+    from .connectors import LOCAL_LOADERS
+
+    files: Files = {}
+    for name, folder in folders:
+        for root, dirs, names in os.walk(folder):
+            dirs[:] = [d for d in dirs if not d.startswith(".")]
+            for fn in names:
+                if fn.startswith(".") or os.path.splitext(fn)[1] not in LOCAL_LOADERS:
+                    continue
+                path = os.path.join(root, fn)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue  # apagado durante a varredura
+                files[(name, _source(path))] = (st.st_mtime_ns, st.st_size)
+    return files
+
+
+def diff(state: Files, current: Files) -> Dict[str, Dict[str, List[str]]]:
+    """Mudanças por coleção: {"created": [...], "modified": [...], "removed": [...]}."""
+    out: Dict[str, Dict[str, List[str]]] = {}
+
+    def _add(key: Tuple[str, str], kind: str):
+        out.setdefault(key[0], {"created": [], "modified": [], "removed": []})[kind].append(key[1])
+
+    for key, sig in current.items():
+        old = state.get(key)
+        if old is None:
+            _add(key, "created")
+        elif old != sig:
+            _add(key, "modified")
+    for key in state.keys() - current.keys():
+        _add(key, "removed")
+    return out
+
+
+class DocsWatcher:
+    def __init__(self, folders: List[Tuple[str, str]]):
+        self.folders = folders
+        self.backend = _backend()
+        self.state: Files = {}
+        self.owner = False
+        self.last_sync: Optional[Dict[str, Any]] = None
+        self.last_error: Optional[str] = None
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="docs-watcher", daemon=True)
+
+    @property
+    def running(self) -> bool:
+        return self._thread.is_alive()
+
+    def _run(self):
+        while not self._stop.is_set() and not _try_lock():
+            self._stop.wait(_LOCK_RETRY_S)
+        if self._stop.is_set():
+            return
+        self.owner = True
+        try:
+            self.state = self._initial_state()
+            self._flush(scan(self.folders), time.time(), startup=True)  # o que mudou com a API parada
+            if self.backend == "watchfiles" and any(os.path.isdir(f) for _n, f in self.folders):
+                self._run_events()
+            else:
+                self._run_poll()
+        except Exception as e:
+            self.last_error = str(e)
+            print(f"[WATCH] watcher da pasta parou: {e}")
+        finally:
+            _unlock()
+            self.owner = False
+
+    def _run_poll(self):
+        debounce_s = settings.docs_watch_debounce_ms / 1000
+        previous = scan(self.folders)
+        last_change = first_change = retry_at = 0.0
+        while not self._stop.wait(settings.docs_watch_poll_s):
+            current = scan(self.folders)
+            now = time.time()
+            if current != previous:
+                previous, last_change = current, now
+            if not diff(self.state, current):
+                first_change = 0.0
+                continue
+            first_change = first_change or now
+            if now < retry_at:
+                continue
+            if now - last_change >= debounce_s or now - first_change >= settings.docs_watch_max_delay_s:
+                if not self._flush(current, first_change):
+                    retry_at = now + max(_RETRY_S, settings.docs_watch_max_delay_s)
+                first_change = 0.0
+
+    def _run_events(self):
+        import watchfiles  # type: ignore
+
+        folders = [f for _n, f in self.folders if os.path.isdir(f)]
+        # step = silêncio que fecha a rajada; debounce = espera máxima com escrita contínua
+        for _changes in watchfiles.watch(
+            *folders, step=int(settings.docs_watch_debounce_ms),
+            debounce=int(settings.docs_watch_max_delay_s * 1000),
+            stop_event=self._stop, raise_interrupt=False,
+        ):
+            self._flush(scan(self.folders), time.time())
+
+    def _initial_state(self) -> Files:
+        """
+        Manifesto gravado na última atualização. Na primeira vez, o próprio índice:
+        fontes indexadas contam como em dia; as que sumiram da pasta, como apagadas.
+        """
+        from .rag import indexed_sources
+
+        state: Files = {}
+        current = scan(self.folders)
+        for name in sorted({n for n, _f in self.folders}):
+            manifest = _read_manifest(name)
+            if manifest is not None:
+                state.update(((name, src), tuple(sig)) for src, sig in manifest.items())
+                continue
+            sources = indexed_sources(name)
+            prefixes = tuple(_source(f) + "/" for n, f in self.folders if n == name)
+            for src in sources:
+                if src.startswith(prefixes):
+                    state[(name, src)] = current.get((name, src), (0, 0))
+            _write_manifest(name, {src: list(sig) for (n, src), sig in state.items()
+                                   if n == name and sig != (0, 0)})
+        return state
+
+    def _flush(self, current: Files, detected_at: float, startup: bool = False) -> bool:
+        """
+        Aplica as mudanças pendentes; False se alguma coleção falhou. Lag de criados/alterados conta do mtime (se for
+        mais antigo que a janela de detecção, ex.: cp -p ou mv, conta da detecção); de
+        apagados, da detecção. A reconciliação da subida não entra na métrica.
+        """
+        from .rag import sync_files
+
+        window = settings.docs_watch_max_delay_s + settings.docs_watch_poll_s
+        ok = True
+        for name, changes in diff(self.state, current).items():
+            changed = changes["created"] + changes["modified"]
+            t = time.perf_counter()
+            try:
+                result = sync_files(changed, changes["removed"], collection=name)
+            except Exception as e:
+                self.last_error = f"{name}: {e}"
+                metrics.inc("docs_watch_errors_total", collection=name)
+                print(f"[WATCH] [{name}] falha ao atualizar o índice: {e!r}")
+                ok = False
+                continue  # estado não avança: tenta de novo na próxima mudança/varredura
+            now = time.time()
+            for kind, paths in changes.items():
+                if paths:
+                    metrics.inc("docs_watch_files_total", len(paths), collection=name, change=kind)
+            for src in changed:
+                sig = current[(name, src)]
+                self.state[(name, src)] = sig
+                written = sig[0] / 1e9
+                if written < detected_at - window:
+                    written = detected_at
+                if not startup:
+                    metrics.observe("docs_watch_lag_ms", max(0.0, now - written) * 1000, collection=name)
+            for src in changes["removed"]:
+                self.state.pop((name, src), None)
+                if not startup:
+                    metrics.observe("docs_watch_lag_ms", max(0.0, now - detected_at) * 1000, collection=name)
+            _write_manifest(name, {src: list(sig) for (n, src), sig in self.state.items() if n == name})
+            self.last_sync = {"collection": name, "at": now, **{k: len(v) for k, v in changes.items()},
+                              "chunks": result["chunks"], "elapsed_ms": round((time.perf_counter() - t) * 1000, 1)}
+            self.last_error = None
+            print(f"[WATCH] [{name}] {len(changes['created'])} criados, {len(changes['modified'])} alterados, "
+                  f"{len(changes['removed'])} apagados -> {result['chunks']} chunks no delta")
+        return ok
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join(timeout=10)
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "pid": os.getpid(),
+            "enabled": True,
+            "running": self.running,
+            "owner": self.owner,
+            "backend": self.backend,
+            "folders": [{"collection": n, "path": f, "exists": os.path.isdir(f)} for n, f in self.folders],
+            "files": len(self.state),
+            "last_sync": self.last_sync,
+            "last_error": self.last_error,
+        }
+
+
+def _backend() -> str:
+    if settings.docs_watch_backend == "poll":
+        return "poll"
+    try:
+        import watchfiles  # type: ignore  # noqa: F401
+    except ImportError:
+        if settings.docs_watch_backend == "watchfiles":
+            print("[WATCH] watchfiles não instalado: usando varredura (DOCS_WATCH_POLL_S)")
+        return "poll"
+    return "watchfiles"
+
+
+# ---------------- manifesto e lock ----------------
+def _manifest_path(collection: str) -> str:
+    persist_dir = collections_config.get_collection(collection)["persist_dir"]
+    return os.path.join(segments.delta_dir(persist_dir), _MANIFEST_FILE)
+
+
+def _read_manifest(collection: str) -> Optional[Dict[str, List[int]]]:
+    try:
+        with open(_manifest_path(collection), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_manifest(collection: str, files: Dict[str, List[int]]):
+    path = _manifest_path(collection)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(files, f)
+    os.replace(tmp, path)
+
+
+def _lock_path() -> str:
+    return os.path.join(segments.delta_dir(), _LOCK_FILE)
+
+
+def _try_lock() -> bool:
+    """flock exclusivo sem bloquear, mantido com o arquivo aberto enquanto o watcher roda."""
+    global _lock_file
+    if _lock_file is not None or fcntl is None:
+        return True
+    path = _lock_path()
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    f = open(path, "a+", encoding="utf-8")
+    try:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        f.close()
+        return False
+    f.truncate(0)
+    f.write(str(os.getpid()))  # só informativo: quem vale é o flock
+    f.flush()
+    _lock_file = f
+    return True
+
+
+def _unlock():
+    # o arquivo fica: apagá-lo deixaria outro worker com flock num inode órfão
+    global _lock_file
+    f, _lock_file = _lock_file, None
+    if f is not None:
+        fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+        f.close()
+
+
+_watcher: Optional[DocsWatcher] = None
+
+
+def start() -> Optional[DocsWatcher]:
+    global _watcher
+    if _watcher is None:
+        _watcher = DocsWatcher(targets())
+        _watcher._thread.start()
+    return _watcher
+
+
+def stop():
+    global _watcher
+    if _watcher is not None:
+        _watcher.stop()
+        _watcher = None
+
+
+def status() -> Dict[str, Any]:
+    if _watcher is None:
+        return {"pid": os.getpid(), "enabled": settings.docs_watch, "running": False}
+    return _watcher.status()
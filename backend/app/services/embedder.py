@@ -1,5 +1,37 @@
-from langchain_huggingface import HuggingFaceEmbeddings
+import threading
+
 from ..config import settings
 
+_embeddings = None
+_dim = None
+_lock = threading.Lock()
+
+
 def get_embeddings():
-    return HuggingFaceEmbeddings(model_name=settings.embeddings_model)
\ No newline at end of file
+    """
+    Modelo de embeddings compartilhado pelo processo. langchain_huggingface (e o
+    sentence-transformers por trás) só é importado e carregado no primeiro uso.
+    embed_query passa pelo micro-batching + cache de services/query_embedder.py.
+    """
+    global _embeddings
+    if _embeddings is None:
+        with _lock:
+            if _embeddings is None:
+                from langchain_huggingface import HuggingFaceEmbeddings
+                from .query_embedder import BatchedEmbeddings
+
+                _embeddings = BatchedEmbeddings(HuggingFaceEmbeddings(model_name=settings.embeddings_model))
+    return _embeddings
+
+
+def remember_dim(dim: int):
+    """Registra a dimensão já conhecida (metadata do índice, warm-up) para não sondar o modelo."""
+    global _dim
+    _dim = int(dim)
+
+
+def embedding_dim() -> int:
+    """Dimensão dos vetores; só embeda um texto de sonda se ninguém a informou antes."""
+    if _dim is None:
+        remember_dim(len(get_embeddings().embed_query("dimension_probe")))
+    return _dim
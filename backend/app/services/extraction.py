@@ -0,0 +1,196 @@
+# app/services/extraction.py
+"""
+Extração de texto das evidências de QA.
+
+- PDFs são divididos em faixas de páginas e cada faixa vai para um processo do
+  pool; imagens (OCR) também rodam em paralelo, uma por processo.
+- O resultado sai NA ORDEM dos arquivos (iter_extract vai entregando assim que
+  o próximo da fila fica pronto).
+- Texto extraído fica em cache por hash do conteúdo (EXTRACT_CACHE_DIR), então
+  re-analisar a mesma evidência não repete pdfplumber/tesseract.
+
+EXTRACT_WORKERS=0 desliga o pool (tudo no próprio processo); negativo = nº de CPUs.
+"""
+import importlib.util
+import multiprocessing
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+from typing import Iterator, List, Optional, Tuple
+
+from . import metrics
+from .uploads import file_sha256
+from ..config import settings
+
+TEXT_EXTS = {".txt", ".log", ".md"}
+IMAGE_EXTS = {".png", ".jpg", ".jpeg"}
+PDF_PAGES_PER_TASK = 4
+_CACHE_VERSION = "v1"  # mude se a forma de extrair mudar (invalida o cache)
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+_available: dict = {}
+
+
+def _has(*modules: str) -> bool:
+    """OCR / PDF são opcionais: checa se estão instalados sem importá-los."""
+    key = modules
+    if key not in _available:
+        _available[key] = all(importlib.util.find_spec(m) is not None for m in modules)
+    return _available[key]
+
+
+# ---------------- tarefas (rodam nos processos do pool) ----------------
+def _pdf_pages_text(path: str, start: int, end: int) -> str:
+    import pdfplumber
+
+    with pdfplumber.open(path) as pdf:
+        return "\n".join((p.extract_text() or "") for p in pdf.pages[start:end])
+
+
+def _ocr_image(path: str) -> str:
+    import pytesseract
+    from PIL import Image
+
+    return pytesseract.image_to_string(Image.open(path))
+
+
+# ---------------- pool ----------------
+def _get_pool() -> Optional[ProcessPoolExecutor]:
+    global _pool
+    workers = settings.extract_workers
+    if workers == 0:
+        return None
+    with _pool_lock:  # várias requisições de QA em paralelo: um pool só
+        if _pool is None:
+            # sem fork: o processo da API tem threads (uvicorn, pipeline, watcher) e
+            # locks segurados por elas seriam copiados travados para os filhos
+            method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+            _pool = ProcessPoolExecutor(max_workers=workers if workers > 0 else (os.cpu_count() or 1),
+                                        mp_context=multiprocessing.get_context(method))
+        return _pool
+
+
+def _reset_pool(broken: Optional[ProcessPoolExecutor] = None):
+    """Descarta o pool quebrado (se outra thread já trocou por um novo, mantém o novo)."""
+    global _pool
+    with _pool_lock:
+        if _pool is None or (broken is not None and _pool is not broken):
+            return
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+def _submit(pool: Optional[ProcessPoolExecutor], fn, *args) -> Future:
+    if pool is not None:
+        try:
+            return pool.submit(fn, *args)
+        except (BrokenProcessPool, RuntimeError):
+            _reset_pool(pool)
+    # sem pool: executa aqui mesmo e devolve um Future já resolvido
+    fut: Future = Future()
+    try:
+        fut.set_result(fn(*args))
+    except Exception as e:
+        fut.set_exception(e)
+    return fut
+
+
+# ---------------- cache ----------------
+def _cache_path(sha: str) -> Path:
+    return Path(settings.extract_cache_dir) / f"{_CACHE_VERSION}_{sha}.txt"
+
+
+def _cache_get(sha: str) -> Optional[str]:
+    p = _cache_path(sha)
+    if p.exists():
+        return p.read_text(encoding="utf-8")
+    return None
+
+
+def _cache_put(sha: str, text: str):
+    """Grava no cache (tmp único + rename). Falha aqui não derruba a análise: o texto já foi extraído."""
+    p = _cache_path(sha)
+    tmp = p.with_name(f".{p.name}.{uuid.uuid4().hex}.tmp")  # duas análises do mesmo arquivo não dividem o tmp
+    try:
+        p.parent.mkdir(parents=True, exist_ok=True)
+        tmp.write_text(text, encoding="utf-8")
+        os.replace(tmp, p)
+    except OSError as e:
+        metrics.inc("extract_cache_total", result="write_error")
+        print(f"[EXTRACT] falha ao gravar cache {p.name}: {e}")
+        try:
+            tmp.unlink()
+        except OSError:
+            pass
+
+
+# ---------------- API ----------------
+def _plan(pool, path: str):
+    """Dispara o trabalho de um arquivo. Retorna (texto_pronto, sha, futures)."""
+    ext = os.path.splitext(path)[1].lower()
+    try:
+        # TXT/LOG/MD sempre ok (ler é mais barato que o cache)
+        if ext in TEXT_EXTS:
+            return open(path, "r", encoding="utf-8", errors="ignore").read(), None, []
+
+        supported = (ext == ".pdf" and _has("pdfplumber")) or (
+            ext in IMAGE_EXTS and _has("pytesseract", "PIL")
+        )
+        if not supported:
+            # Se não suportado ou sem libs, retorna rótulo
+            return f"[no_ocr_supported_for]{path}", None, []
+
+        sha = file_sha256(Path(path))
+        cached = _cache_get(sha)
+        if cached is not None:
+            metrics.inc("extract_cache_total", result="hit")
+            return cached, None, []
+        metrics.inc("extract_cache_total", result="miss")
+
+        if ext == ".pdf":
+            import pdfplumber
+
+            with pdfplumber.open(path) as pdf:
+                n = len(pdf.pages)
+            futs = [
+                _submit(pool, _pdf_pages_text, path, s, min(s + PDF_PAGES_PER_TASK, n))
+                for s in range(0, n, PDF_PAGES_PER_TASK)
+            ]
+            return None, sha, futs
+
+        return None, sha, [_submit(pool, _ocr_image, path)]
+    except Exception as e:
+        return f"[extract_error] {path}: {e}", None, []
+
+
+def iter_extract(paths: List[str]) -> Iterator[Tuple[str, str]]:
+    """Gera (path, texto) na ordem de `paths`; o trabalho pesado roda em paralelo."""
+    t0 = time.perf_counter()
+    pool = _get_pool()
+    plans = [_plan(pool, p) for p in paths]  # dispara tudo antes de esperar qualquer um
+    for path, (ready, sha, futs) in zip(paths, plans):
+        if ready is not None:
+            yield path, ready
+            continue
+        try:
+            text = "\n".join(f.result() for f in futs)
+        except BrokenProcessPool as e:
+            _reset_pool(pool)
+            yield path, f"[extract_error] {path}: {e}"
+            continue
+        except Exception as e:
+            yield path, f"[extract_error] {path}: {e}"
+            continue
+        _cache_put(sha, text)
+        yield path, text
+    metrics.observe("extract_ms", (time.perf_counter() - t0) * 1000)
+
+
+def extract_texts(paths: List[str]) -> List[str]:
+    """Lista de textos, na mesma ordem de `paths`."""
+    return [text for _, text in iter_extract(paths)]
@@ -0,0 +1,252 @@
+# app/services/http_cache.py
+"""
+Cache HTTP do conector de URLs.
+
+Por URL fica gravado em HTTP_CACHE_DIR (um JSON por URL): ETag, Last-Modified,
+hash do corpo e o texto já extraído. No sync seguinte a página é pedida com
+If-None-Match / If-Modified-Since:
+
+  304            -> usa o texto do cache (sem baixar corpo, sem parsear)
+  200, mesmo hash -> idem (servidor sem validadores, conteúdo igual)
+  200, hash novo  -> parseia e atualiza o cache
+  erro de rede    -> usa o cache, se houver (uma queda não tira a página do índice)
+
+Sitemaps (urlset e sitemapindex) viram listas de URLs. Politeness por host:
+intervalo mínimo entre requests (URLS_HOST_DELAY_S), teto de páginas
+(URLS_MAX_PAGES_PER_HOST) e robots.txt (URLS_RESPECT_ROBOTS).
+"""
+from __future__ import annotations
+
+import gzip
+import hashlib
+import importlib.util
+import json
+import logging
+import os
+import time
+import xml.etree.ElementTree as ET
+from html.parser import HTMLParser
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from urllib import robotparser
+from urllib.parse import urlsplit
+
+import httpx
+
+from . import metrics
+from ..config import settings
+
+logger = logging.getLogger("chronos.connectors")
+
+_CACHE_VERSION = "v1"  # mude se a forma de extrair mudar (invalida o cache)
+_SITEMAP_MAX_DEPTH = 3
+
+
+# ---------------- cache ----------------
+def _cache_path(url: str) -> Path:
+    key = hashlib.sha1(url.encode("utf-8")).hexdigest()
+    return Path(settings.http_cache_dir) / f"{_CACHE_VERSION}_{key}.json"
+
+
+def _cache_get(url: str) -> Optional[Dict[str, Any]]:
+    p = _cache_path(url)
+    try:
+        return json.loads(p.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return None
+
+
+def _cache_put(url: str, entry: Dict[str, Any]):
+    p = _cache_path(url)
+    p.parent.mkdir(parents=True, exist_ok=True)
+    tmp = p.with_suffix(f".{os.getpid()}.tmp")
+    tmp.write_text(json.dumps(entry, ensure_ascii=False), encoding="utf-8")
+    os.replace(tmp, p)
+
+
+# ---------------- parse ----------------
+class _TextParser(HTMLParser):
+    """Texto visível + title/description/lang, quando o bs4 não está instalado."""
+
+    _SKIP = {"script", "style", "noscript", "template"}
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.parts: List[str] = []
+        self.meta: Dict[str, str] = {}
+        self._skip = 0
+        self._in_title = False
+
+    def handle_starttag(self, tag, attrs):
+        a = dict(attrs)
+        if tag in self._SKIP:
+            self._skip += 1
+        elif tag == "title":
+            self._in_title = True
+        elif tag == "html" and a.get("lang"):
+            self.meta["language"] = a["lang"]
+        elif tag == "meta" and (a.get("name") or "").lower() == "description" and a.get("content"):
+            self.meta["description"] = a["content"]
+
+    def handle_endtag(self, tag):
+        if tag in self._SKIP and self._skip:
+            self._skip -= 1
+        elif tag == "title":
+            self._in_title = False
+
+    def handle_data(self, data):
+        if self._in_title:
+            self.meta["title"] = self.meta.get("title", "") + data.strip()
+        elif not self._skip and data.strip():
+            self.parts.append(data.strip())
+
+
+def _parse_html(html: str) -> Tuple[str, Dict[str, str]]:
+    """(texto, metadata) no mesmo formato do WebBaseLoader."""
+    if importlib.util.find_spec("bs4") is not None:
+        from bs4 import BeautifulSoup
+
+        soup = BeautifulSoup(html, "html.parser")
+        meta: Dict[str, str] = {}
+        if soup.find("title"):
+            meta["title"] = soup.find("title").get_text()
+        desc = soup.find("meta", attrs={"name": "description"})
+        if desc and desc.get("content"):
+            meta["description"] = desc.get("content")
+        if soup.find("html") and soup.find("html").get("lang"):
+            meta["language"] = soup.find("html").get("lang")
+        return soup.get_text(), meta
+    p = _TextParser()
+    p.feed(html)
+    return "\n".join(p.parts), p.meta
+
+
+# ---------------- fetch ----------------
+class UrlFetcher:
+    """Um por sync: guarda o estado de politeness (último request e robots.txt por host)."""
+
+    def __init__(self, user_agent: str):
+        self.user_agent = user_agent
+        self.client = httpx.Client(
+            headers={"User-Agent": user_agent},
+            timeout=settings.urls_timeout_s,
+            follow_redirects=True,
+        )
+        self._last: Dict[str, float] = {}
+        self._robots: Dict[str, Optional[robotparser.RobotFileParser]] = {}
+        self._pages: Dict[str, int] = {}
+        self.counts: Dict[str, int] = {}
+
+    def close(self):
+        self.client.close()
+
+    def _count(self, result: str):
+        self.counts[result] = self.counts.get(result, 0) + 1
+        metrics.inc("url_fetch_total", result=result)
+
+    def _wait_turn(self, host: str):
+        wait = self._last.get(host, 0) + settings.urls_host_delay_s - time.monotonic()
+        if wait > 0:
+            time.sleep(wait)
+        self._last[host] = time.monotonic()
+
+    def _allowed(self, url: str) -> bool:
+        if not settings.urls_respect_robots:
+            return True
+        parts = urlsplit(url)
+        host = parts.netloc
+        if host not in self._robots:
+            rp: Optional[robotparser.RobotFileParser] = robotparser.RobotFileParser()
+            try:
+                self._wait_turn(host)
+                r = self.client.get(f"{parts.scheme}://{host}/robots.txt")
+                if r.status_code >= 400:
+                    rp = None  # sem robots.txt: tudo liberado
+                else:
+                    rp.parse(r.text.splitlines())
+            except httpx.HTTPError:
+                rp = None
+            self._robots[host] = rp
+        rp = self._robots[host]
+        return rp is None or rp.can_fetch(self.user_agent, url)
+
+    def _get(self, url: str, entry: Optional[Dict[str, Any]]) -> httpx.Response:
+        headers = {}
+        if entry:
+            if entry.get("etag"):
+                headers["If-None-Match"] = entry["etag"]
+            if entry.get("last_modified"):
+                headers["If-Modified-Since"] = entry["last_modified"]
+        self._wait_turn(urlsplit(url).netloc)
+        return self.client.get(url, headers=headers)
+
+    def page(self, url: str) -> Optional[Dict[str, Any]]:
+        """
+        Entrada de cache da página ({text, metadata, ...}) ou None (bloqueada,
+        fora do teto do host, erro sem cache). Só parseia se o conteúdo mudou.
+        """
+        host = urlsplit(url).netloc
+        if self._pages.get(host, 0) >= settings.urls_max_pages_per_host:
+            self._count("host_limit")
+            return None
+        if not self._allowed(url):
+            self._count("robots")
+            return None
+        self._pages[host] = self._pages.get(host, 0) + 1
+
+        entry = _cache_get(url)
+        try:
+            r = self._get(url, entry)
+        except httpx.HTTPError as e:
+            logger.warning("[URLS] %s: %s%s", url, e, " (usando cache)" if entry else "")
+            self._count("error_cached" if entry else "error")
+            return entry
+        if r.status_code == 304 and entry:
+            self._count("not_modified")
+            entry["checked_at"] = int(time.time())
+            _cache_put(url, entry)
+            return entry
+        if r.status_code >= 400:
+            logger.warning("[URLS] %s: HTTP %d%s", url, r.status_code, " (usando cache)" if entry else "")
+            self._count("error_cached" if entry else "error")
+            return entry
+
+        body_sha = hashlib.sha256(r.content).hexdigest()
+        validators = {"etag": r.headers.get("etag"), "last_modified": r.headers.get("last-modified"),
+                      "body_sha256": body_sha, "checked_at": int(time.time())}
+        if entry and entry.get("body_sha256") == body_sha:
+            self._count("same_hash")
+            entry.update(validators)
+            _cache_put(url, entry)
+            return entry
+
+        text, meta = _parse_html(r.text)
+        entry = {"url": url, "text": text, "metadata": meta, "fetched_at": int(time.time()), **validators}
+        _cache_put(url, entry)
+        self._count("changed")
+        return entry
+
+    def sitemap_urls(self, sitemap_url: str, depth: int = 0) -> Iterator[str]:
+        """URLs de um sitemap (segue sitemapindex até _SITEMAP_MAX_DEPTH níveis)."""
+        if depth > _SITEMAP_MAX_DEPTH or not self._allowed(sitemap_url):
+            return
+        try:
+            self._wait_turn(urlsplit(sitemap_url).netloc)
+            r = self.client.get(sitemap_url)
+            r.raise_for_status()
+            body = r.content
+            if body[:2] == b"\x1f\x8b":  # sitemap.xml.gz
+                body = gzip.decompress(body)
+            root = ET.fromstring(body)
+        except (httpx.HTTPError, ET.ParseError, OSError) as e:
+            logger.warning("[URLS] sitemap %s: %s", sitemap_url, e)
+            return
+        ns = root.tag.split("}")[0] + "}" if root.tag.startswith("{") else ""
+        for loc in root.iter(f"{ns}loc"):
+            url = (loc.text or "").strip()
+            if not url:
+                continue
+            if root.tag == f"{ns}sitemapindex":
+                yield from self.sitemap_urls(url, depth + 1)
+            else:
+                yield url
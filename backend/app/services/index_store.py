@@ -0,0 +1,221 @@
+# app/services/index_store.py
+"""
+Persistência do índice FAISS em gerações, para vários workers lerem o mesmo
+diretório.
+
+Layout em PERSIST_DIR:
+    GENERATION               número da geração atual (escrito por último, atômico)
+    gen-000007/index.faiss   índice
+    gen-000007/index.pkl     docstore + mapeamento posição -> id
+    gen-000007/index_meta.json
+
+Cada gravação vai para uma pasta temporária e é renomeada para gen-<n>
+inteira; só depois o GENERATION aponta para ela (sob flock em
+PERSIST_DIR/.publish.lock, então workers publicando juntos não disputam o
+número nem fazem o ponteiro voltar). Um worker nunca lê índice pela metade, e a geração antiga continua lá (as últimas INDEX_KEEP_GENERATIONS)
+para quem ainda a está usando. INDEX_STORAGE escolhe o formato dos vetores
+(ver services/quantization.py). Com INDEX_MMAP=true o index.faiss é mapeado em
+memória (somente leitura): os workers compartilham as páginas via page cache
+em vez de cada um ter a própria cópia.
+
+Diretórios antigos (index.faiss direto em PERSIST_DIR) são lidos como geração 0.
+"""
+from __future__ import annotations
+
+import json
+import os
+import pickle
+import shutil
+import time
+import uuid
+from contextlib import contextmanager
+from typing import TYPE_CHECKING, Any, Dict, Iterator, List, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows: sem lock entre processos (dev com um worker só)
+    fcntl = None  # type: ignore[assignment]
+
+from . import quantization
+from ..config import settings
+
+if TYPE_CHECKING:
+    from langchain_community.vectorstores import FAISS
+
+GENERATION_FILE = "GENERATION"
+INDEX_META_FILE = "index_meta.json"
+_PREFIX = "gen-"
+_PUBLISH_LOCK = ".publish.lock"
+
+
+def _persist_dir(persist_dir: Optional[str]) -> str:
+    return persist_dir or settings.persist_dir
+
+
+def _gen_dir(persist_dir: str, gen: int) -> str:
+    return os.path.join(persist_dir, f"{_PREFIX}{gen:06d}")
+
+
+def current_generation(persist_dir: Optional[str] = None) -> int:
+    """Geração publicada (0 = layout antigo ou nada gravado ainda)."""
+    try:
+        with open(os.path.join(_persist_dir(persist_dir), GENERATION_FILE), "r", encoding="utf-8") as f:
+            return int(f.read().strip() or 0)
+    except (OSError, ValueError):
+        return 0
+
+
+def index_dir(persist_dir: Optional[str] = None, gen: Optional[int] = None) -> str:
+    """Pasta com index.faiss/index.pkl da geração (default: a atual)."""
+    persist_dir = _persist_dir(persist_dir)
+    gen = current_generation(persist_dir) if gen is None else gen
+    return _gen_dir(persist_dir, gen) if gen > 0 else persist_dir
+
+
+def exists(persist_dir: Optional[str] = None) -> bool:
+    return os.path.exists(os.path.join(index_dir(persist_dir), "index.faiss"))
+
+
+def read_meta(persist_dir: Optional[str] = None, gen: Optional[int] = None) -> Dict[str, Any]:
+    """Metadata gravada junto do índice ({} se não houver)."""
+    try:
+        with open(os.path.join(index_dir(persist_dir, gen), INDEX_META_FILE), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _publish(persist_dir: str, gen: int):
+    tmp = os.path.join(persist_dir, f".{GENERATION_FILE}.{uuid.uuid4().hex}.tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(str(gen))
+    os.replace(tmp, os.path.join(persist_dir, GENERATION_FILE))
+
+
+@contextmanager
+def _publish_lock(persist_dir: str) -> Iterator[None]:
+    """flock em PERSIST_DIR/.publish.lock: um publish por vez entre workers (o kernel solta se o processo morrer)."""
+    if fcntl is None:
+        yield
+        return
+    with open(os.path.join(persist_dir, _PUBLISH_LOCK), "a") as f:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+def _last_gen_dir(persist_dir: str) -> int:
+    """Maior gen-<n> em disco (pode estar à frente do ponteiro se um publish morreu no meio)."""
+    last = 0
+    for name in os.listdir(persist_dir):
+        if name.startswith(_PREFIX):
+            try:
+                last = max(last, int(name[len(_PREFIX):]))
+            except ValueError:
+                continue
+    return last
+
+
+def _cleanup(persist_dir: str, keep_from: int):
+    for name in os.listdir(persist_dir):
+        if name.startswith(_PREFIX):
+            try:
+                gen = int(name[len(_PREFIX):])
+            except ValueError:
+                continue
+            if gen < keep_from:
+                # no Linux, quem ainda tem o arquivo mapeado continua lendo normalmente
+                shutil.rmtree(os.path.join(persist_dir, name), ignore_errors=True)
+
+
+def save(
+    vs: FAISS,
+    persist_dir: Optional[str] = None,
+    sources: Optional[List[str]] = None,
+    extra_meta: Optional[Dict[str, Any]] = None,
+) -> int:
+    """
+    Grava o índice como uma nova geração e a publica. Retorna o número dela.
+    extra_meta vai junto para o index_meta.json (ex.: compacted_deltas, ver segments.py).
+    """
+    persist_dir = _persist_dir(persist_dir)
+    tmp_dir = new_tmp_dir(persist_dir)
+    if isinstance(vs.index, quantization.RerankIndex):
+        # grava o índice, não o invólucro de re-ranking (e leva junto os float32)
+        quantization.save_full_vectors(vs.index, tmp_dir)
+        vs.index = vs.index.base
+    storage = settings.index_storage
+    if storage != "flat" and quantization.storage_of(vs.index) == "flat":
+        # float32 originais vão para o disco (re-ranking); em memória fica o comprimido
+        quantization.save_full_vectors(vs.index, tmp_dir)
+        vs.index = quantization.compress(vs.index, storage)
+    vs.save_local(tmp_dir)
+    meta = {
+        "embeddings_model": settings.embeddings_model,
+        "embedding_dim": int(vs.index.d),
+        "vectors": int(vs.index.ntotal),
+        "storage": quantization.storage_of(vs.index),
+        "sources": len(sources) if sources is not None else None,
+        "built_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        **(extra_meta or {}),
+    }
+
+    gen = publish_dir(tmp_dir, persist_dir, meta)
+    vs.index = quantization.with_rerank(vs.index, _gen_dir(persist_dir, gen))
+    return gen
+
+
+def new_tmp_dir(persist_dir: Optional[str] = None) -> str:
+    """Pasta temporária dentro de PERSIST_DIR (mesmo filesystem: o rename de publish_dir é atômico)."""
+    persist_dir = _persist_dir(persist_dir)
+    os.makedirs(persist_dir, exist_ok=True)
+    tmp_dir = os.path.join(persist_dir, f".tmp-{uuid.uuid4().hex}")
+    os.makedirs(tmp_dir)
+    return tmp_dir
+
+
+def publish_dir(tmp_dir: str, persist_dir: Optional[str], meta: Dict[str, Any]) -> int:
+    """
+    Transforma uma pasta completa (index.faiss + index.pkl [+ vectors.f32.npy])
+    na próxima geração e a publica. Grava index_meta.json com `meta`.
+    """
+    persist_dir = _persist_dir(persist_dir)
+    # número, rename e ponteiro sob o mesmo lock: dois workers publicando juntos
+    # não pegam o mesmo número nem deixam o ponteiro voltar para uma geração menor
+    with _publish_lock(persist_dir):
+        gen = max(current_generation(persist_dir), _last_gen_dir(persist_dir)) + 1
+        meta["generation"] = gen
+        with open(os.path.join(tmp_dir, INDEX_META_FILE), "w", encoding="utf-8") as f:
+            json.dump(meta, f, ensure_ascii=False, indent=2)
+        os.rename(tmp_dir, _gen_dir(persist_dir, gen))
+        if gen > current_generation(persist_dir):  # o ponteiro só anda para frente
+            _publish(persist_dir, gen)
+        _cleanup(persist_dir, gen - max(1, settings.index_keep_generations) + 1)
+    return gen
+
+
+def load(embeddings, persist_dir: Optional[str] = None, gen: Optional[int] = None) -> Tuple[FAISS, int]:
+    """Carrega a geração (default: a atual), com mmap se INDEX_MMAP=true."""
+    import faiss  # type: ignore
+    from langchain_community.vectorstores import FAISS
+
+    persist_dir = _persist_dir(persist_dir)
+    gen = current_generation(persist_dir) if gen is None else gen
+    folder = index_dir(persist_dir, gen)
+
+    flags = 0
+    if settings.index_mmap:
+        # IO_FLAG_MMAP_IFC (faiss >= 1.8) também mapeia índices flat; antes disso, só IVF
+        flags = getattr(faiss, "IO_FLAG_MMAP_IFC", 0) or getattr(faiss, "IO_FLAG_MMAP", 0)
+    index = quantization.with_rerank(faiss.read_index(os.path.join(folder, "index.faiss"), flags), folder)
+    with open(os.path.join(folder, "index.pkl"), "rb") as f:
+        docstore, index_to_docstore_id = pickle.load(f)
+    vs = FAISS(
+        embedding_function=embeddings,
+        index=index,
+        docstore=docstore,
+        index_to_docstore_id=index_to_docstore_id,
+    )
+    return vs, gen
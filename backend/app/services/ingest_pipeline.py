@@ -0,0 +1,148 @@
+# app/services/ingest_pipeline.py
+"""
+Pipeline de ingestão em três estágios, ligados por filas limitadas:
+
+    [thread fetch]  conectores (geradores) -> fila de documentos (INGEST_QUEUE_DOCS)
+    [thread split]  split em chunks (+ filtro keep, ex.: dedup.py), em lotes de INGEST_EMBED_BATCH
+                    -> fila de lotes (INGEST_QUEUE_BATCHES)
+    [quem chamou]   on_batch(lote): embeddings + add no índice
+
+Enquanto um lote é embutido, o próximo já está sendo baixado/dividido. Se o
+embedding fica para trás, as filas enchem e os conectores param de ler
+(backpressure): o que está "em trânsito" fica limitado pelo tamanho das filas,
+não pelo tamanho da fonte.
+"""
+from __future__ import annotations
+
+import queue
+import threading
+import time
+from typing import TYPE_CHECKING, Any, Callable, Dict, Iterable, List, Optional
+
+from . import metrics
+from ..config import settings
+
+if TYPE_CHECKING:
+    from langchain_core.documents import Document
+
+_END = object()
+_PUT_TIMEOUT_S = 0.2  # de quanto em quanto tempo um estágio bloqueado confere se deve parar
+
+
+class _Failed:
+    def __init__(self, exc: BaseException):
+        self.exc = exc
+
+
+def _nonempty(d: Document) -> bool:
+    return bool(d) and len((d.page_content or "").strip()) >= 5  # ignora textos muito curtos/vazios
+
+
+def _put(q: queue.Queue, item: Any, stop: threading.Event) -> bool:
+    """put bloqueante que desiste se o pipeline foi abortado."""
+    while not stop.is_set():
+        try:
+            q.put(item, timeout=_PUT_TIMEOUT_S)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+def _get(q: queue.Queue, stop: threading.Event) -> Any:
+    while not stop.is_set():
+        try:
+            return q.get(timeout=_PUT_TIMEOUT_S)
+        except queue.Empty:
+            continue
+    return _END
+
+
+def run(
+    docs: Iterable[Document],
+    on_batch: Callable[[List[Document]], None],
+    chunk_size: int = 1000,
+    chunk_overlap: int = 150,
+    keep: Optional[Callable[[Document], bool]] = None,
+) -> Dict[str, Any]:
+    """
+    Consome `docs` (gerador) e chama on_batch() com lotes de chunks, na ordem.
+    keep(chunk) -> False descarta o chunk antes do embedding (roda na thread de split).
+    Retorna estatísticas: docs, chunks, batches, sources, seconds e o pico das filas.
+    Uma exceção em qualquer estágio aborta os demais e é relançada aqui.
+    """
+    from langchain.text_splitter import RecursiveCharacterTextSplitter
+
+    splitter = RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+    batch_size = max(1, settings.ingest_embed_batch)
+    doc_q: queue.Queue = queue.Queue(maxsize=max(1, settings.ingest_queue_docs))
+    batch_q: queue.Queue = queue.Queue(maxsize=max(1, settings.ingest_queue_batches))
+    stop = threading.Event()
+    stats: Dict[str, Any] = {"docs": 0, "chunks": 0, "batches": 0, "sources": set(),
+                             "peak_queue_docs": 0, "peak_queue_batches": 0}
+
+    def _fetch():
+        try:
+            for d in docs:
+                if stop.is_set():
+                    return
+                if not _nonempty(d):
+                    continue
+                stats["docs"] += 1
+                stats["sources"].add(str((d.metadata or {}).get("source", "unknown")))
+                if not _put(doc_q, d, stop):
+                    return
+                stats["peak_queue_docs"] = max(stats["peak_queue_docs"], doc_q.qsize())
+            _put(doc_q, _END, stop)
+        except BaseException as e:  # noqa: BLE001 - repassado para quem chamou
+            _put(doc_q, _Failed(e), stop)
+
+    def _split():
+        batch: List[Document] = []
+        try:
+            while True:
+                d = _get(doc_q, stop)
+                if d is _END or isinstance(d, _Failed):
+                    break
+                for c in splitter.split_documents([d]):
+                    if _nonempty(c) and (keep is None or keep(c)):
+                        batch.append(c)
+                if len(batch) >= batch_size:
+                    if not _put(batch_q, batch, stop):
+                        return
+                    stats["peak_queue_batches"] = max(stats["peak_queue_batches"], batch_q.qsize())
+                    batch = []
+            if isinstance(d, _Failed):
+                _put(batch_q, d, stop)
+                return
+            if batch:
+                _put(batch_q, batch, stop)
+            _put(batch_q, _END, stop)
+        except BaseException as e:  # noqa: BLE001
+            _put(batch_q, _Failed(e), stop)
+
+    t0 = time.perf_counter()
+    threads = [threading.Thread(target=_fetch, name="ingest-fetch", daemon=True),
+               threading.Thread(target=_split, name="ingest-split", daemon=True)]
+    for t in threads:
+        t.start()
+    try:
+        while True:
+            item = _get(batch_q, stop)
+            if item is _END:
+                break
+            if isinstance(item, _Failed):
+                raise item.exc
+            t = time.perf_counter()
+            on_batch(item)
+            metrics.observe("ingest_batch_ms", (time.perf_counter() - t) * 1000)
+            stats["batches"] += 1
+            stats["chunks"] += len(item)
+    finally:
+        stop.set()  # se on_batch falhou, libera fetch/split que estejam bloqueados
+        for t in threads:
+            t.join(timeout=5)
+    stats["seconds"] = round(time.perf_counter() - t0, 2)
+    metrics.set_gauge("ingest_peak_queue_docs", stats["peak_queue_docs"])
+    metrics.set_gauge("ingest_peak_queue_batches", stats["peak_queue_batches"])
+    return stats
@@ -1,17 +1,311 @@
+"""
+Camada de cliente do LLM.
+
+Aceita uma lista de endpoints OpenAI-compatíveis (OPENAI_BASE_URLS, separados
+por vírgula; na falta, OPENAI_BASE_URL ou o LM Studio local) e distribui as
+chamadas entre eles:
+
+- um único pool HTTP keep-alive (httpx) compartilhado por todos os endpoints;
+- balanceamento por menor número de requisições em andamento;
+- circuit breaker por endpoint (abre após N falhas seguidas; passado o
+  cooldown fica meio aberto e deixa passar UMA chamada de teste por vez; health
+  check periódico em /models fecha de novo quando o servidor volta);
+- em erro de conexão/timeout/5xx, tenta de novo em OUTRO endpoint; 429 também
+  vai para outro endpoint, mas não conta como falha (o servidor está de pé).
+
+get_llm() devolve um Runnable compartilhado; .invoke(...) retorna o mesmo
+AIMessage do ChatOpenAI, então `prompt | llm | parser` continua igual.
+"""
+import asyncio
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import httpx
+import openai
+from langchain_core.runnables import Runnable, RunnableConfig
 from langchain_openai import ChatOpenAI
+
+from . import metrics
 from ..config import settings
 
-def get_llm() -> ChatOpenAI:
+# erros em que vale tentar outro servidor (os demais — 400, 401... — sobem direto)
+_RETRYABLE = (
+    openai.APIConnectionError,  # inclui APITimeoutError
+    openai.InternalServerError,
+    openai.RateLimitError,
+    httpx.TransportError,
+)
+
+
+def _base_urls() -> List[str]:
+    urls = [u.strip().rstrip("/") for u in settings.openai_base_urls if u.strip()]
+    if urls:
+        return urls
     base_url = settings.openai_base_url
     if settings.use_lm_studio and not base_url:
         base_url = "http://127.0.0.1:1234/v1"
+    return [base_url.rstrip("/")] if base_url else [""]  # "" = api.openai.com
+
+
+class _Endpoint:
+    def __init__(self, base_url: str, model: ChatOpenAI):
+        self.base_url = base_url
+        self.model = model
+        self.outstanding = 0
+        self.failures = 0            # falhas consecutivas
+        self.open_until = 0.0        # circuito aberto até (monotonic); 0 = fechado
+        self.probing = False         # meio aberto: chamada de teste em andamento
+        self.latency_ewma: Optional[float] = None
+
+    @property
+    def label(self) -> str:
+        return self.base_url or "openai"
+
+    def circuit(self, now: float) -> str:
+        if not self.open_until:
+            return "closed"
+        return "open" if now < self.open_until else "half_open"
+
+    def available(self, now: float) -> bool:
+        # meio aberto: só uma chamada de teste por vez (as demais vão para outro endpoint)
+        state = self.circuit(now)
+        return state == "closed" or (state == "half_open" and not self.probing)
+
+
+class EndpointPool:
+    def __init__(self, base_urls: List[str]):
+        limits = httpx.Limits(
+            max_connections=settings.llm_pool_max_connections,
+            max_keepalive_connections=settings.llm_pool_max_connections,
+            keepalive_expiry=30.0,
+        )
+        timeout = httpx.Timeout(settings.llm_timeout_s, connect=5.0)
+        self.http_client = httpx.Client(limits=limits, timeout=timeout)
+        self.http_async_client = httpx.AsyncClient(limits=limits, timeout=timeout)
+
+        multi = len(base_urls) > 1
+        self.endpoints: List[_Endpoint] = []
+        for url in base_urls:
+            kwargs: Dict[str, Any] = {
+                "model": settings.model_name,
+                "temperature": 0.2,
+                "api_key": settings.openai_api_key or "lm-studio",
+                "max_tokens": 512,   # evita respostas muito longas
+                "timeout": settings.llm_timeout_s,
+                "http_client": self.http_client,
+                "http_async_client": self.http_async_client,
+                # com vários servidores, quem re-tenta é o pool (em outro endpoint)
+                "max_retries": 0 if multi else 2,
+            }
+            if url:
+                kwargs["base_url"] = url
+            self.endpoints.append(_Endpoint(url, ChatOpenAI(**kwargs)))
+
+        self._lock = threading.Lock()
+        self._rr = 0
+        self._health_thread: Optional[threading.Thread] = None
+
+    # ---------------- seleção / contabilidade ----------------
+    def acquire(self, exclude: set) -> Optional[Tuple[_Endpoint, bool]]:
+        """(endpoint, é a chamada de teste do meio aberto) ou None se não sobrou endpoint."""
+        now = time.monotonic()
+        with self._lock:
+            cands = [e for e in self.endpoints if e.base_url not in exclude and e.available(now)]
+            if not cands:
+                # todos com circuito aberto: melhor tentar o que reabre primeiro do que falhar sem tentar
+                cands = sorted(
+                    (e for e in self.endpoints if e.base_url not in exclude),
+                    key=lambda e: e.open_until,
+                )[:1]
+            if not cands:
+                return None
+            least = min(e.outstanding for e in cands)
+            tied = [e for e in cands if e.outstanding == least]
+            self._rr += 1
+            ep = tied[self._rr % len(tied)]
+            ep.outstanding += 1
+            probe = ep.circuit(now) == "half_open" and not ep.probing
+            if probe:
+                ep.probing = True
+            metrics.set_gauge("llm_endpoint_outstanding", ep.outstanding, endpoint=ep.label)
+            return ep, probe
+
+    def release(self, ep: _Endpoint, ok: Optional[bool], elapsed: float, probe: bool = False):
+        """ok=None: resposta que não diz nada da saúde do servidor (429), não mexe no circuito."""
+        with self._lock:
+            ep.outstanding -= 1
+            if probe:
+                ep.probing = False  # fecha, reabre ou (429) libera o próximo teste
+            metrics.set_gauge("llm_endpoint_outstanding", ep.outstanding, endpoint=ep.label)
+            if ok:
+                ep.failures = 0
+                ep.open_until = 0.0
+                ep.latency_ewma = elapsed if ep.latency_ewma is None else 0.8 * ep.latency_ewma + 0.2 * elapsed
+            elif ok is False:
+                self._mark_failure(ep)
+        outcome = "rate_limited" if ok is None else "ok" if ok else "error"
+        metrics.inc("llm_requests_total", endpoint=ep.label, outcome=outcome)
+        if ok:
+            metrics.observe("llm_latency_ms", elapsed * 1000, endpoint=ep.label)
+
+    def _mark_failure(self, ep: _Endpoint):
+        ep.failures += 1
+        if ep.failures >= settings.llm_circuit_failures:
+            ep.open_until = time.monotonic() + settings.llm_circuit_cooldown_s
+            metrics.inc("llm_circuit_open_total", endpoint=ep.label)
+
+    # ---------------- health check ----------------
+    def ping(self) -> List[Dict[str, Any]]:
+        """
+        GET <base_url>/models em cada endpoint; atualiza o circuito e devolve
+        o resultado de cada um (também abre as conexões keep-alive do pool).
+        """
+        headers = {"Authorization": f"Bearer {settings.openai_api_key or 'lm-studio'}"}
+        out: List[Dict[str, Any]] = []
+        for ep in self.endpoints:
+            if not ep.base_url:
+                out.append({"endpoint": ep.label, "ok": None})  # api.openai.com: sem health check
+                continue
+            t = time.monotonic()
+            try:
+                r = self.http_client.get(f"{ep.base_url}/models", headers=headers, timeout=3.0)
+                healthy = r.status_code < 500
+            except Exception:
+                healthy = False
+            out.append({"endpoint": ep.label, "ok": healthy, "ms": round((time.monotonic() - t) * 1000, 1)})
+            with self._lock:
+                if healthy:
+                    ep.failures = 0
+                    ep.open_until = 0.0
+                else:
+                    ep.failures = max(ep.failures, settings.llm_circuit_failures - 1)
+                    self._mark_failure(ep)
+        return out
+
+    def check_health(self):
+        """Health check periódico (ver start_health_checks)."""
+        self.ping()
+
+    def start_health_checks(self):
+        if self._health_thread is not None or settings.llm_health_interval_s <= 0 or len(self.endpoints) < 2:
+            return
+
+        def _loop():
+            while True:
+                time.sleep(settings.llm_health_interval_s)
+                try:
+                    self.check_health()
+                except Exception:
+                    pass
+
+        self._health_thread = threading.Thread(target=_loop, name="llm-health", daemon=True)
+        self._health_thread.start()
+
+    def snapshot(self) -> List[Dict[str, Any]]:
+        now = time.monotonic()
+        with self._lock:
+            return [
+                {
+                    "endpoint": e.label,
+                    "outstanding": e.outstanding,
+                    "failures": e.failures,
+                    "circuit": e.circuit(now),
+                    "latency_ewma_ms": round(e.latency_ewma * 1000, 1) if e.latency_ewma else None,
+                }
+                for e in self.endpoints
+            ]
+
+
+class BalancedChatModel(Runnable):
+    """Runnable que repassa a chamada ao ChatOpenAI do endpoint escolhido pelo pool."""
+
+    def __init__(self, pool: EndpointPool):
+        self.pool = pool
+
+    def _attempts(self) -> int:
+        return max(1, min(settings.llm_max_attempts, len(self.pool.endpoints)))
+
+    def invoke(self, input: Any, config: Optional[RunnableConfig] = None, **kwargs: Any) -> Any:
+        tried: set = set()
+        last_exc: Optional[BaseException] = None
+        for _ in range(self._attempts()):
+            got = self.pool.acquire(tried)
+            if got is None:
+                break
+            ep, probe = got
+            tried.add(ep.base_url)
+            t = time.monotonic()
+            try:
+                out = ep.model.invoke(input, config, **kwargs)
+            except openai.RateLimitError as e:
+                self.pool.release(ep, ok=None, elapsed=time.monotonic() - t, probe=probe)
+                last_exc = e
+                continue
+            except _RETRYABLE as e:
+                self.pool.release(ep, ok=False, elapsed=time.monotonic() - t, probe=probe)
+                last_exc = e
+                continue
+            except Exception:
+                # erro do pedido (não do servidor): não conta contra o endpoint
+                self.pool.release(ep, ok=True, elapsed=time.monotonic() - t, probe=probe)
+                raise
+            self.pool.release(ep, ok=True, elapsed=time.monotonic() - t, probe=probe)
+            return out
+        raise last_exc or RuntimeError("nenhum endpoint de LLM disponível")
+
+    async def ainvoke(self, input: Any, config: Optional[RunnableConfig] = None, **kwargs: Any) -> Any:
+        tried: set = set()
+        last_exc: Optional[BaseException] = None
+        for _ in range(self._attempts()):
+            got = self.pool.acquire(tried)
+            if got is None:
+                break
+            ep, probe = got
+            tried.add(ep.base_url)
+            t = time.monotonic()
+            try:
+                out = await ep.model.ainvoke(input, config, **kwargs)
+            except openai.RateLimitError as e:
+                self.pool.release(ep, ok=None, elapsed=time.monotonic() - t, probe=probe)
+                last_exc = e
+                continue
+            except _RETRYABLE as e:
+                self.pool.release(ep, ok=False, elapsed=time.monotonic() - t, probe=probe)
+                last_exc = e
+                continue
+            except asyncio.CancelledError:
+                self.pool.release(ep, ok=None, elapsed=time.monotonic() - t, probe=probe)
+                raise
+            except Exception:
+                self.pool.release(ep, ok=True, elapsed=time.monotonic() - t, probe=probe)
+                raise
+            self.pool.release(ep, ok=True, elapsed=time.monotonic() - t, probe=probe)
+            return out
+        raise last_exc or RuntimeError("nenhum endpoint de LLM disponível")
+
+
+_pool: Optional[EndpointPool] = None
+_llm: Optional[BalancedChatModel] = None
+_init_lock = threading.Lock()
+
+
+def get_pool() -> EndpointPool:
+    global _pool, _llm
+    if _pool is None:
+        with _init_lock:
+            if _pool is None:
+                _pool = EndpointPool(_base_urls())
+                _llm = BalancedChatModel(_pool)
+                _pool.start_health_checks()
+    return _pool
+
+
+def get_llm() -> BalancedChatModel:
+    get_pool()
+    return _llm
+
 
-    kwargs = {
-        "model": settings.model_name,
-        "temperature": 0.2,
-        "api_key": settings.openai_api_key or "lm-studio",
-        "max_tokens": 512,   # evita respostas muito longas
-    }
-    if base_url:
-        kwargs["base_url"] = base_url
-    return ChatOpenAI(**kwargs)
\ No newline at end of file
+def endpoints_snapshot() -> List[Dict[str, Any]]:
+    """Estado dos endpoints (sem instanciar o pool se ninguém usou o LLM ainda)."""
+    return _pool.snapshot() if _pool is not None else []
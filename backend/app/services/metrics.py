@@ -0,0 +1,98 @@
+# app/services/metrics.py
+"""
+Métricas em memória do processo (contadores, gauges e histogramas simples).
+Diferente de state.py (persistido em disco), aqui é tudo volátil e barato:
+pode ser chamado em hot path. Exposto em GET /api/admin/metrics.
+"""
+import threading
+from collections import deque
+from typing import Dict, Any, Tuple, Deque
+
+_RESERVOIR = 2048  # últimas N observações por histograma (para percentis)
+
+_lock = threading.Lock()
+_counters: Dict[Tuple[str, Tuple], float] = {}
+_gauges: Dict[Tuple[str, Tuple], float] = {}
+_hists: Dict[Tuple[str, Tuple], Dict[str, Any]] = {}
+
+
+def _key(name: str, labels: Dict[str, Any]) -> Tuple[str, Tuple]:
+    return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _fmt(key: Tuple[str, Tuple]) -> str:
+    name, labels = key
+    if not labels:
+        return name
+    return name + "{" + ",".join(f'{k}="{v}"' for k, v in labels) + "}"
+
+
+def inc(name: str, by: float = 1, **labels):
+    k = _key(name, labels)
+    with _lock:
+        _counters[k] = _counters.get(k, 0) + by
+
+
+def set_gauge(name: str, value: float, **labels):
+    with _lock:
+        _gauges[_key(name, labels)] = value
+
+
+def observe(name: str, value: float, **labels):
+    k = _key(name, labels)
+    with _lock:
+        h = _hists.get(k)
+        if h is None:
+            h = _hists[k] = {"count": 0, "sum": 0.0, "max": 0.0, "window": deque(maxlen=_RESERVOIR)}
+        h["count"] += 1
+        h["sum"] += value
+        h["max"] = max(h["max"], value)
+        h["window"].append(value)
+
+
+def _percentile(sorted_vals, q: float) -> float:
+    if not sorted_vals:
+        return 0.0
+    idx = min(len(sorted_vals) - 1, int(round(q * (len(sorted_vals) - 1))))
+    return sorted_vals[idx]
+
+
+def _summary(h: Dict[str, Any]) -> Dict[str, float]:
+    window: Deque[float] = h["window"]
+    vals = sorted(window)
+    return {
+        "count": h["count"],
+        "sum": round(h["sum"], 3),
+        "avg": round(h["sum"] / h["count"], 3) if h["count"] else 0.0,
+        "p50": round(_percentile(vals, 0.50), 3),
+        "p95": round(_percentile(vals, 0.95), 3),
+        "p99": round(_percentile(vals, 0.99), 3),
+        "max": round(h["max"], 3),
+    }
+
+
+def snapshot() -> Dict[str, Any]:
+    with _lock:
+        return {
+            "counters": {_fmt(k): v for k, v in _counters.items()},
+            "gauges": {_fmt(k): v for k, v in _gauges.items()},
+            "histograms": {_fmt(k): _summary(h) for k, h in _hists.items()},
+        }
+
+
+def prometheus_text() -> str:
+    """Formato texto do Prometheus (histogramas saem como summary com quantis)."""
+    lines = []
+    with _lock:
+        for k, v in sorted(_counters.items()):
+            lines.append(f"{_fmt(k)} {v}")
+        for k, v in sorted(_gauges.items()):
+            lines.append(f"{_fmt(k)} {v}")
+        for (name, labels), h in sorted(_hists.items()):
+            s = _summary(h)
+            for q in ("p50", "p95", "p99"):
+                ql = labels + (("quantile", str(int(q[1:]) / 100)),)
+                lines.append(f"{_fmt((name, ql))} {s[q]}")
+            lines.append(f"{_fmt((name + '_count', labels))} {s['count']}")
+            lines.append(f"{_fmt((name + '_sum', labels))} {s['sum']}")
+    return "\n".join(lines) + "\n"
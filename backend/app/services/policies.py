@@ -0,0 +1,192 @@
+# app/services/policies.py
+"""
+Políticas de QA por área (app/data/qa/policies/<area>.yaml).
+
+Formato:
+    id: pix
+    name: "PIX"
+    criteria: ["mensagem de erro clara", "retry_policy", ...]
+    sources: ["*smart_checkout*", ...]   # opcional: filtra o contexto do RAG
+
+Todas as políticas são lidas e validadas uma vez e ficam em memória. A cada
+POLICY_RELOAD_CHECK_S no máximo, um scandir compara o mtime dos arquivos e só
+recarrega se algo mudou — requests normais não tocam o disco. Arquivo inválido
+é ignorado (mantém a versão anterior, se houver) e logado.
+
+Os critérios de cada política são embedados uma vez (por modelo de embedding)
+e usados para puxar a busca de contexto na direção dos tópicos da política.
+"""
+import fnmatch
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import yaml
+
+from ..config import settings
+
+logger = logging.getLogger("chronos.policies")
+
+DEFAULT_ID = "default"
+_FALLBACK_CRITERIA = ["msg de erro", "retry_policy", "idempotencia"]
+
+
+class Policy:
+    def __init__(self, id: str, name: str, criteria: List[str], sources: List[str], path: Optional[str]):
+        self.id = id
+        self.name = name
+        self.criteria = criteria
+        self.sources = sources
+        self.path = path
+        self._vectors: Dict[int, np.ndarray] = {}  # id(embeddings) -> vetores dos critérios
+        self._lock = threading.Lock()
+
+    def criteria_text(self) -> str:
+        return "\n".join(f"- {c}" for c in self.criteria)
+
+    def matches(self, metadata: Dict[str, Any]) -> bool:
+        """Filtro de documentos do RAG (sem `sources`, aceita tudo)."""
+        if not self.sources:
+            return True
+        src = str((metadata or {}).get("source", ""))
+        return any(fnmatch.fnmatch(src, pat) for pat in self.sources)
+
+    def centroid(self, embeddings) -> Optional[np.ndarray]:
+        """Média (normalizada) dos vetores dos critérios; embeda só na primeira vez."""
+        if not self.criteria:
+            return None
+        key = id(embeddings)
+        vecs = self._vectors.get(key)
+        if vecs is None:
+            with self._lock:
+                vecs = self._vectors.get(key)
+                if vecs is None:
+                    vecs = np.array(embeddings.embed_documents(self.criteria), dtype=np.float32)
+                    self._vectors[key] = vecs
+        c = vecs.mean(axis=0)
+        n = float(np.linalg.norm(c))
+        return c / n if n else c
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"id": self.id, "name": self.name, "criteria": self.criteria,
+                "sources": self.sources, "path": self.path}
+
+
+_FALLBACK = Policy(DEFAULT_ID, "Padrão", _FALLBACK_CRITERIA, [], None)
+
+_lock = threading.Lock()
+_policies: Dict[str, Policy] = {}
+_mtimes: Dict[str, float] = {}
+_last_check: Optional[float] = None
+
+
+def _validate(data: Any, path: Path) -> Policy:
+    if not isinstance(data, dict):
+        raise ValueError("esperado um mapeamento YAML")
+    pid = str(data.get("id") or path.stem).strip()
+    criteria = data.get("criteria")
+    if not isinstance(criteria, list) or not criteria or not all(isinstance(c, str) and c.strip() for c in criteria):
+        raise ValueError("'criteria' deve ser uma lista não vazia de textos")
+    sources = data.get("sources") or []
+    if not isinstance(sources, list) or not all(isinstance(s, str) for s in sources):
+        raise ValueError("'sources' deve ser uma lista de globs")
+    return Policy(pid, str(data.get("name") or pid), [c.strip() for c in criteria], sources,
+                  str(path).replace("\\", "/"))
+
+
+def _scan() -> Dict[str, float]:
+    d = Path(settings.qa_policies_dir)
+    if not d.is_dir():
+        return {}
+    out = {}
+    with os.scandir(d) as it:
+        for e in it:
+            if e.is_file() and e.name.endswith((".yaml", ".yml")):
+                out[e.path] = e.stat().st_mtime
+    return out
+
+
+def _reload(mtimes: Dict[str, float], force: bool = False):
+    global _policies, _mtimes
+    by_path = {p.path: p for p in _policies.values()}
+    new: Dict[str, Policy] = {}
+    for path, mtime in sorted(mtimes.items()):
+        norm = path.replace("\\", "/")
+        if not force and _mtimes.get(path) == mtime and norm in by_path:
+            pol = by_path[norm]  # inalterado: reaproveita (e os vetores já calculados)
+        else:
+            try:
+                data = yaml.safe_load(Path(path).read_text(encoding="utf-8"))
+                pol = _validate(data, Path(path))
+                logger.info("[POLICIES] carregada %s (%d critérios)", pol.id, len(pol.criteria))
+            except Exception as e:
+                logger.error("[POLICIES] ignorando %s: %s", path, e)
+                if norm not in by_path:
+                    continue
+                pol = by_path[norm]  # mantém a versão válida anterior
+        if pol.id in new:
+            logger.warning("[POLICIES] id duplicado '%s' em %s", pol.id, path)
+        new[pol.id] = pol
+    _policies = new
+    _mtimes = mtimes
+
+
+def _fresh(now: float) -> bool:
+    return _last_check is not None and now - _last_check < settings.policy_reload_check_s
+
+
+def _maybe_reload(force: bool = False):
+    global _last_check
+    now = time.monotonic()
+    if not force and _fresh(now):
+        return
+    with _lock:
+        if not force and _fresh(now):
+            return
+        first = _last_check is None
+        _last_check = now
+        mtimes = _scan()
+        if force or first or mtimes != _mtimes:
+            _reload(mtimes, force=force)
+
+
+def get_policy(area: Optional[str]) -> Policy:
+    """Política da área (ou a 'default'; na falta dela, os critérios fixos de sempre)."""
+    _maybe_reload()
+    pols = _policies
+    if area and area in pols:
+        return pols[area]
+    return pols.get(DEFAULT_ID, _FALLBACK)
+
+
+def list_policies() -> List[Dict[str, Any]]:
+    _maybe_reload()
+    return [p.to_dict() for p in _policies.values()]
+
+
+def reload_policies() -> int:
+    _maybe_reload(force=True)
+    return len(_policies)
+
+
+def steer_queries(queries: np.ndarray, policies: List[Policy], embeddings) -> np.ndarray:
+    """
+    Mistura cada vetor de consulta com o centróide dos critérios da sua política
+    (peso settings.policy_blend). Não embeda nada por request: o centróide é cacheado.
+    """
+    w = settings.policy_blend
+    if w <= 0:
+        return queries
+    out = queries.copy()
+    for i, pol in enumerate(policies):
+        c = pol.centroid(embeddings)
+        if c is None:
+            continue
+        q = out[i]
+        qn = float(np.linalg.norm(q)) or 1.0
+        out[i] = (1 - w) * q + w * c * qn
+    return out
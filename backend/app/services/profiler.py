@@ -0,0 +1,284 @@
+# app/services/profiler.py
+"""
+Profiling sob demanda (endpoints em routers/profiling.py).
+
+CPU: amostragem de parede. Uma thread lê sys._current_frames() a cada
+PROFILE_SAMPLE_INTERVAL_MS e conta as pilhas de todas as threads (inclusive as
+que estão esperando: espera do LLM, lock, I/O também aparecem). O resultado sai
+em "collapsed stacks" (uma linha `thread;arquivo:função;... contagem`), o formato
+do flamegraph.pl, speedscope e inferno. Cada amostra é marcada como "espera"
+quando a linha atual da thread é uma chamada bloqueante (sleep, wait, lock,
+fila, socket); idle=false mostra só o que estava de fato rodando.
+
+Memória: tracemalloc com snapshots numerados, top por linha, diff entre dois
+snapshots e collapsed stacks ponderadas por bytes.
+
+Sem sessão ativa não há thread de amostragem nem hook de trace: custo zero.
+Vale para o worker que atendeu o request (pid na resposta).
+"""
+from __future__ import annotations
+
+import itertools
+import linecache
+import os
+import re
+import sys
+import threading
+import time
+import traceback
+import tracemalloc
+from collections import Counter, OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+from ..config import settings
+
+# linha atual da folha com uma chamada que bloqueia fora do Python (sleep, lock, fila, socket):
+# a thread está esperando, não usando CPU (filtrado com idle=False)
+_BLOCKING = re.compile(
+    r"\bsleep\(|\.wait\(|\.acquire\(|\.join\(|\.get\(\)|\.get\(timeout|\.put\([^)]*timeout"
+    r"|\bselect\(|\.poll\(|accept\(|\.recv|\.readinto\(|\.readline\("
+)
+_idle_lines: Dict[Tuple[str, int], bool] = {}
+
+
+class ProfilerBusy(Exception):
+    """Já há uma sessão de CPU rodando neste worker (vira HTTP 409)."""
+
+
+def _frame_label(code) -> str:
+    return f"{os.path.basename(code.co_filename)}:{code.co_name}"
+
+
+def _is_idle(frame) -> bool:
+    key = (frame.f_code.co_filename, frame.f_lineno)
+    idle = _idle_lines.get(key)
+    if idle is None:
+        idle = _idle_lines[key] = bool(_BLOCKING.search(linecache.getline(*key)))
+    return idle
+
+
+def _keep(store: "OrderedDict[int, Any]", key: int, value: Any):
+    store[key] = value
+    while len(store) > max(1, settings.profile_keep):
+        store.popitem(last=False)
+
+
+# ---------------- CPU ----------------
+class CpuSession:
+    def __init__(self, sid: int, seconds: float, interval_ms: float):
+        self.id = sid
+        self.seconds = seconds
+        self.interval_s = max(0.001, interval_ms / 1000)
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self.started_at = time.time()
+        self.ended_at: Optional[float] = None
+        self.overrun = 0  # amostras que atrasaram (a própria amostragem pesando)
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=f"profiler-cpu-{sid}", daemon=True)
+
+    def _run(self):
+        me = threading.get_ident()
+        deadline = time.monotonic() + self.seconds
+        next_at = time.monotonic()
+        while not self._stop.is_set() and time.monotonic() < deadline:
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                idle = _is_idle(frame)
+                parts = []
+                while frame is not None:
+                    parts.append(_frame_label(frame.f_code))
+                    frame = frame.f_back
+                parts.append(names.get(ident, f"thread-{ident}").replace(";", "_"))
+                self.stacks[(";".join(reversed(parts)), idle)] += 1
+            self.samples += 1
+            next_at += self.interval_s
+            wait = next_at - time.monotonic()
+            if wait < 0:
+                self.overrun += 1
+                next_at = time.monotonic()
+                wait = 0
+            self._stop.wait(wait)
+        self.ended_at = time.time()
+
+    @property
+    def running(self) -> bool:
+        return self._thread.is_alive()
+
+    def folded(self, idle: bool = True) -> str:
+        counts: Counter = Counter()
+        for (stack, is_idle), n in self.stacks.items():
+            if idle or not is_idle:
+                counts[stack] += n
+        return "".join(f"{stack} {n}\n" for stack, n in counts.most_common())
+
+    def summary(self, top: int = 20, idle: bool = False) -> Dict[str, Any]:
+        """Funções com mais amostras: self (no topo da pilha) e total (em qualquer ponto da pilha)."""
+        own: Counter = Counter()
+        total: Counter = Counter()
+        for (stack, is_idle), n in self.stacks.items():
+            if is_idle and not idle:
+                continue
+            frames = stack.split(";")[1:]  # [0] é o nome da thread
+            if not frames:
+                continue
+            own[frames[-1]] += n
+            for f in set(frames):
+                total[f] += n
+        n_stacks = sum(n for (_s, is_idle), n in self.stacks.items() if idle or not is_idle) or 1
+        end = self.ended_at or time.time()
+        return {
+            "id": self.id,
+            "pid": os.getpid(),
+            "running": self.running,
+            "seconds": round(end - self.started_at, 2),
+            "interval_ms": round(self.interval_s * 1000, 1),
+            "samples": self.samples,
+            "overrun": self.overrun,
+            "top_self": [{"function": f, "samples": n, "pct": round(100 * n / n_stacks, 1)} for f, n in own.most_common(top)],
+            "top_total": [{"function": f, "samples": n, "pct": round(100 * n / n_stacks, 1)} for f, n in total.most_common(top)],
+        }
+
+
+_lock = threading.Lock()
+_ids = itertools.count(1)
+_cpu: "OrderedDict[int, CpuSession]" = OrderedDict()
+
+
+def start_cpu(seconds: float, interval_ms: Optional[float] = None) -> CpuSession:
+    seconds = max(0.1, min(float(seconds), settings.profile_max_seconds))
+    with _lock:
+        if any(s.running for s in _cpu.values()):
+            raise ProfilerBusy("já existe um profile de CPU em andamento")
+        session = CpuSession(next(_ids), seconds, interval_ms or settings.profile_sample_interval_ms)
+        _keep(_cpu, session.id, session)
+    session._thread.start()
+    return session
+
+
+def stop_cpu(sid: Optional[int] = None) -> Optional[CpuSession]:
+    """Para a sessão (a ativa, se sid for None) e espera a thread sair."""
+    session = get_cpu(sid)
+    if session is not None:
+        session._stop.set()
+        session._thread.join(timeout=5)
+    return session
+
+
+def get_cpu(sid: Optional[int] = None) -> Optional[CpuSession]:
+    """Sessão pelo id; sem id, a mais recente."""
+    with _lock:
+        if sid is None:
+            return next(reversed(_cpu.values()), None)
+        return _cpu.get(sid)
+
+
+def list_cpu() -> List[Dict[str, Any]]:
+    with _lock:
+        sessions = list(_cpu.values())
+    return [{"id": s.id, "running": s.running, "samples": s.samples, "started_at": s.started_at} for s in sessions]
+
+
+# ---------------- memória ----------------
+_snapshots: "OrderedDict[int, tracemalloc.Snapshot]" = OrderedDict()
+_snap_times: Dict[int, float] = {}
+
+
+def memory_status() -> Dict[str, Any]:
+    tracing = tracemalloc.is_tracing()
+    current, peak = tracemalloc.get_traced_memory() if tracing else (0, 0)
+    return {"pid": os.getpid(), "tracing": tracing, "frames": tracemalloc.get_traceback_limit(),
+            "traced_bytes": current, "peak_bytes": peak,
+            "snapshots": [{"id": i, "taken_at": _snap_times.get(i)} for i in _snapshots]}
+
+
+def start_memory(frames: int = 25) -> Dict[str, Any]:
+    if not tracemalloc.is_tracing():
+        tracemalloc.start(max(1, min(int(frames), 100)))
+    return memory_status()
+
+
+def stop_memory() -> Dict[str, Any]:
+    """Desliga o tracemalloc (snapshots já tirados continuam disponíveis)."""
+    tracemalloc.stop()
+    return memory_status()
+
+
+def _filtered(snap: tracemalloc.Snapshot) -> tracemalloc.Snapshot:
+    # o próprio tracemalloc e este módulo não interessam
+    return snap.filter_traces((tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, __file__)))
+
+
+def _stat(s) -> Dict[str, Any]:
+    frame = s.traceback[0]
+    out = {"where": f"{frame.filename}:{frame.lineno}", "bytes": s.size, "count": s.count}
+    if hasattr(s, "size_diff"):
+        out.update({"bytes_diff": s.size_diff, "count_diff": s.count_diff})
+    return out
+
+
+def take_snapshot(top: int = 20) -> Dict[str, Any]:
+    if not tracemalloc.is_tracing():
+        raise RuntimeError("tracemalloc desligado: chame POST /api/admin/profile/memory/start antes")
+    snap = _filtered(tracemalloc.take_snapshot())
+    with _lock:
+        sid = next(_ids)
+        _keep(_snapshots, sid, snap)
+        _snap_times[sid] = time.time()
+        for old in set(_snap_times) - set(_snapshots):
+            del _snap_times[old]
+    stats = snap.statistics("lineno")
+    return {"id": sid, "pid": os.getpid(), "total_bytes": sum(s.size for s in stats),
+            "top": [_stat(s) for s in stats[:top]]}
+
+
+def _snapshot(sid: int) -> tracemalloc.Snapshot:
+    try:
+        return _snapshots[sid]
+    except KeyError:
+        raise KeyError(f"snapshot {sid} não existe (ou já saiu dos últimos PROFILE_KEEP)")
+
+
+def diff(base: int, target: int, top: int = 20) -> Dict[str, Any]:
+    stats = _snapshot(target).compare_to(_snapshot(base), "lineno")
+    return {"base": base, "target": target, "pid": os.getpid(),
+            "bytes_diff": sum(s.size_diff for s in stats),
+            "top": [_stat(s) for s in stats[:top]]}
+
+
+def memory_folded(sid: int) -> str:
+    """Collapsed stacks ponderadas por bytes alocados (flamegraph de memória)."""
+    lines = []
+    for s in _snapshot(sid).statistics("traceback"):
+        # tracemalloc guarda o frame mais recente primeiro
+        stack = ";".join(f"{os.path.basename(f.filename)}:{f.lineno}" for f in reversed(s.traceback))
+        lines.append(f"{stack} {s.size}\n")
+    return "".join(lines)
+
+
+# ---------------- threads ----------------
+def thread_dump() -> Dict[str, Any]:
+    threads = {t.ident: t for t in threading.enumerate()}
+    out = []
+    for ident, frame in sys._current_frames().items():
+        t = threads.get(ident)
+        out.append({
+            "ident": ident,
+            "name": t.name if t else f"thread-{ident}",
+            "daemon": t.daemon if t else None,
+            "idle": _is_idle(frame),
+            "stack": [line.rstrip("\n") for line in traceback.format_stack(frame)],
+        })
+    out.sort(key=lambda t: t["name"])
+    return {"pid": os.getpid(), "count": len(out), "threads": out}
+
+
+def thread_dump_text() -> str:
+    dump = thread_dump()
+    parts = [f"pid {dump['pid']}: {dump['count']} threads\n"]
+    for t in dump["threads"]:
+        parts.append(f"\n--- {t['name']} (ident={t['ident']}, daemon={t['daemon']}) ---\n")
+        parts.extend(line + "\n" for line in t["stack"])
+    return "".join(parts)
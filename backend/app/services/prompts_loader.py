@@ -1,23 +1,205 @@
+"""
+Registro de prompts (app/data/prompts/*.txt).
+
+Todos os templates são lidos na subida, compilados (variáveis extraídas e
+validadas) e ficam em memória. No máximo a cada PROMPT_RELOAD_CHECK_S um
+scandir compara mtimes e recarrega só o que mudou — editar um prompt entra no
+ar sem restart, e o hot path não toca o disco.
+
+Cada template tem uma versão (hash do conteúdo) que vai para os relatórios de
+QA e para as respostas do chat, para saber com qual prompt cada resultado foi
+gerado; prompts_version() combina as versões de todos.
+"""
+import hashlib
+import logging
+import os
+import string
+import threading
+import time
 from pathlib import Path
+from typing import TYPE_CHECKING, Any, Dict, List, Optional
+
+from ..config import settings
+
+if TYPE_CHECKING:
+    from langchain_core.prompts import PromptTemplate
+
+logger = logging.getLogger("chronos.prompts")
 
-PROMPTS_DIR = Path("app/data/prompts")
+PROMPTS_DIR = Path(settings.prompts_dir)
 PROMPTS_DIR.mkdir(parents=True, exist_ok=True)
 
+# variáveis que o código sempre passa; template sem alguma delas é recusado
+REQUIRED_VARS = {
+    "chat_answer.txt": {"context", "question"},
+    "qa_evaluate.txt": {"context", "case_title", "evidence_text", "required_criteria"},
+}
+
+# fallbacks mínimos (arquivo ausente ou inválido na primeira carga)
+_BUILTIN = {
+    "chat_answer.txt": (
+        "Você é o BIA, agente interno da Bemobi. Use o contexto para responder objetivamente. "
+        "Se não houver info suficiente, diga que não encontrou.\n\n"
+        "Contexto:\n{context}\n\nPergunta: {question}\n\nResposta:"
+    ),
+    "qa_evaluate.txt": (
+        "Você é um analista de QA. Use o contexto e as evidências para avaliar o caso.\n\n"
+        "Contexto:\n{context}\n\n"
+        "Título do caso: {case_title}\n\n"
+        "Evidências:\n{evidence_text}\n\n"
+        "Critérios obrigatórios:\n{required_criteria}\n\n"
+        "Gere um JSON com os campos: title, evaluation(criteria: name, result, reason), "
+        "suggestions, additional_cases."
+    ),
+}
+
+
+class Prompt:
+    def __init__(self, name: str, text: str, mtime: Optional[float]):
+        self.name = name
+        self.text = text
+        self.mtime = mtime
+        self.version = hashlib.sha1(text.encode("utf-8")).hexdigest()[:10]
+        self.variables = self._parse_variables(text)
+        self._template: Optional["PromptTemplate"] = None
+
+    @staticmethod
+    def _parse_variables(text: str) -> List[str]:
+        names = []
+        for _, field, _, _ in string.Formatter().parse(text):
+            if field is None:
+                continue
+            if not field.isidentifier():
+                raise ValueError(f"placeholder inválido {{{field.strip()[:30]}}} (use {{{{ }}}} para chaves literais)")
+            if field not in names:
+                names.append(field)
+        return names
+
+    def validate(self):
+        missing = REQUIRED_VARS.get(self.name, set()) - set(self.variables)
+        if missing:
+            raise ValueError(f"faltam variáveis {sorted(missing)}")
+
+    @property
+    def template(self) -> "PromptTemplate":
+        if self._template is None:
+            from langchain_core.prompts import PromptTemplate
+
+            self._template = PromptTemplate(input_variables=self.variables, template=self.text)
+        return self._template
+
+    def render(self, **kwargs: Any) -> str:
+        return self.text.format(**kwargs)
+
+    def info(self) -> Dict[str, Any]:
+        return {"name": self.name, "version": self.version, "variables": self.variables,
+                "builtin": self.mtime is None}
+
+
+_lock = threading.Lock()
+_prompts: Dict[str, Prompt] = {}
+_mtimes: Dict[str, float] = {}
+_last_check: Optional[float] = None
+_errors: Dict[str, str] = {}
+
+
+def _scan() -> Dict[str, float]:
+    if not PROMPTS_DIR.is_dir():
+        return {}
+    with os.scandir(PROMPTS_DIR) as it:
+        return {e.name: e.stat().st_mtime for e in it if e.is_file() and e.name.endswith(".txt")}
+
+
+def _reload(mtimes: Dict[str, float], force: bool = False):
+    global _prompts, _mtimes
+    new: Dict[str, Prompt] = {}
+    for name, mtime in mtimes.items():
+        old = _prompts.get(name)
+        if not force and old is not None and old.mtime == mtime:
+            new[name] = old
+            continue
+        try:
+            p = Prompt(name, (PROMPTS_DIR / name).read_text(encoding="utf-8"), mtime)
+            p.validate()
+            new[name] = p
+            _errors.pop(name, None)
+            if old is not None:
+                logger.info("[PROMPTS] %s recarregado (versão %s)", name, p.version)
+        except Exception as e:
+            _errors[name] = str(e)
+            logger.error("[PROMPTS] ignorando %s: %s", name, e)
+            if old is not None and old.mtime is not None:
+                new[name] = old  # mantém a última versão válida
+    for name, text in _BUILTIN.items():
+        if name not in new:
+            prev = _prompts.get(name)
+            new[name] = prev if prev is not None and prev.mtime is None else Prompt(name, text, None)
+    _prompts = new
+    _mtimes = mtimes
+
+
+def _maybe_reload(force: bool = False):
+    global _last_check
+    now = time.monotonic()
+    fresh = _last_check is not None and now - _last_check < settings.prompt_reload_check_s
+    if fresh and not force:
+        return
+    with _lock:
+        fresh = _last_check is not None and now - _last_check < settings.prompt_reload_check_s
+        if fresh and not force:
+            return
+        first = _last_check is None
+        _last_check = now
+        mtimes = _scan()
+        if force or first or mtimes != _mtimes:
+            _reload(mtimes, force=force)
+
+
+def load_all() -> List[Dict[str, Any]]:
+    """Lê e valida todos os templates (chamado na subida da API)."""
+    _maybe_reload(force=True)
+    return list_prompts()
+
+
+def compile_all() -> int:
+    """Compila os PromptTemplate (importa langchain_core; feito no warm-up)."""
+    _maybe_reload()
+    for p in _prompts.values():
+        p.template
+    return len(_prompts)
+
+
+def get_prompt(name: str) -> Prompt:
+    _maybe_reload()
+    p = _prompts.get(name)
+    if p is None:
+        raise KeyError(f"prompt '{name}' não encontrado em {PROMPTS_DIR}")
+    return p
+
+
 def load_prompt(name: str) -> str:
     """
-    Lê um arquivo de prompt de app/data/prompts/<name>.
+    Texto do prompt app/data/prompts/<name> (em memória).
     Ex.: load_prompt("qa_evaluate.txt")
     """
-    path = PROMPTS_DIR / name
-    if not path.exists():
-        # fallback mínimo
-        return (
-            "Você é um analista de QA. Use o contexto e as evidências para avaliar o caso.\n\n"
-            "Contexto:\n{context}\n\n"
-            "Título do caso: {case_title}\n\n"
-            "Evidências:\n{evidence_text}\n\n"
-            "Critérios obrigatórios:\n{required_criteria}\n\n"
-            "Gere um JSON com os campos: title, evaluation(criteria: name, result, reason), "
-            "suggestions, additional_cases."
-        )
-    return path.read_text(encoding="utf-8")
+    return get_prompt(name).text
+
+
+def render_prompt(name: str, **kwargs: Any) -> str:
+    return get_prompt(name).render(**kwargs)
+
+
+def prompts_version() -> str:
+    """Versão combinada de todos os prompts carregados (muda se qualquer um mudar)."""
+    _maybe_reload()
+    joined = "|".join(f"{n}:{p.version}" for n, p in sorted(_prompts.items()))
+    return hashlib.sha1(joined.encode("utf-8")).hexdigest()[:10]
+
+
+def list_prompts() -> List[Dict[str, Any]]:
+    _maybe_reload()
+    out = [p.info() for p in sorted(_prompts.values(), key=lambda p: p.name)]
+    for item in out:
+        if item["name"] in _errors:
+            item["error"] = _errors[item["name"]]
+    return out
@@ -1,63 +1,17 @@
 # app/services/qa_analyzer.py
 import os, json, uuid, datetime, re
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
-
-# OCR / PDF opcionais
-try:
-    import pytesseract
-    from PIL import Image
-except Exception:
-    pytesseract = None
-    Image = None
-
-try:
-    import pdfplumber
-except Exception:
-    pdfplumber = None
-
-from .rag import make_retriever, build_or_load_vectorstore
-from .llm import get_llm
-from .prompts_loader import load_prompt
+from typing import Any, Callable, Dict, List, Optional
+
+from .extraction import extract_texts, iter_extract
+from .rag import build_or_load_vectorstore, batch_retrieve, embed_texts
+from .policies import Policy, get_policy, steer_queries
+from .prompts_loader import get_prompt
+from .scheduler import llm_slot
+from .report_store import save_report
 from ..config import settings
 
-# (Opcional futuro) carregar matriz de políticas por área (yaml)
-# def load_policies(area: str | None) -> str:
-#     if not area:
-#         return "- msg de erro\n- retry_policy\n- idempotencia"
-#     p = Path("app/data/qa/policies") / f"{area}.yaml"
-#     if p.exists():
-#         import yaml
-#         data = yaml.safe_load(p.read_text(encoding="utf-8"))
-#         items = data.get("criteria", [])
-#         return "\n".join(f"- {c}" for c in items) or "- msg de erro\n- retry_policy\n- idempotencia"
-#     return "- msg de erro\n- retry_policy\n- idempotencia"
-
-
-def _extract_text_from_path(path: str) -> str:
-    ext = os.path.splitext(path)[1].lower()
-    try:
-        # TXT/LOG/MD sempre ok
-        if ext in [".txt", ".log", ".md"]:
-            return open(path, "r", encoding="utf-8", errors="ignore").read()
-
-        # PDF (se pdfplumber disponível)
-        if ext == ".pdf" and pdfplumber is not None:
-            parts = []
-            with pdfplumber.open(path) as pdf:
-                for p in pdf.pages:
-                    parts.append(p.extract_text() or "")
-            return "\n".join(parts)
-
-        # Imagens (se pytesseract disponível)
-        if ext in [".png", ".jpg", ".jpeg"] and pytesseract is not None and Image is not None:
-            return pytesseract.image_to_string(Image.open(path))
-
-        # Se não suportado ou sem libs, retorna rótulo
-        return f"[no_ocr_supported_for]{path}"
-    except Exception as e:
-        return f"[extract_error] {path}: {e}"
-
-
 def _parse_llm_json(raw: str) -> dict | None:
     # tenta pegar bloco ```json ... ```
     m = re.search(r"```json\s*(\{.*?\})\s*```", raw, re.S)
@@ -70,31 +24,53 @@ def _parse_llm_json(raw: str) -> dict | None:
         return None
 
 
-def analyze_evidence(case_title: str, evidence_paths: list, area: str | None = None):
-    # 1) extrai texto das evidências
-    evidence_texts = [_extract_text_from_path(p) for p in evidence_paths]
-    evidence_text = "\n\n".join(evidence_texts)
+def _seed(case_title: str, evidence_text: str) -> str:
+    return (case_title or "") + " " + evidence_text[:1200]
+
 
-    # 2) contexto via RAG
+def _retrieve_contexts(seeds: List[str], policies: List[Policy], k: int = 6) -> List[list]:
+    """
+    Contexto RAG de vários casos numa busca só. Cada seed é puxada na direção
+    dos critérios da sua política (centróide pré-embedado) e filtrada pelas
+    fontes da política, quando ela define `sources`.
+    """
     vs, _ = build_or_load_vectorstore(rebuild=False)
-    retriever = make_retriever(vs, k=6)
-    seed = (case_title or "") + " " + evidence_text[:1200]
-    context_docs = retriever.get_relevant_documents(seed)
+    queries = embed_texts(vs, seeds)
+    queries = steer_queries(queries, policies, vs.embedding_function)
+    filters = [p.matches if p.sources else None for p in policies]
+    docs_per_case, _unique = batch_retrieve(vs, seeds, k=k, query_vectors=queries, filters=filters)
+    return docs_per_case
+
+
+def _evaluate_and_save(
+    case_title: str,
+    evidence_paths: list,
+    evidence_text: str,
+    context_docs: list,
+    area: str | None = None,
+    slot_kind: str = "qa",
+    policy: Policy | None = None,
+):
+    """Etapas 3–5: critérios, chamada ao LLM e gravação do relatório."""
     context = "\n\n".join([d.page_content for d in context_docs])
 
-    # 3) critérios requeridos
-    # required_criteria = load_policies(area)  # quando ativar YAML por área
-    required_criteria = "- msg de erro\n- retry_policy\n- idempotencia"
+    # 3) critérios requeridos (política da área, em memória)
+    policy = policy or get_policy(area)
+    required_criteria = policy.criteria_text()
 
     # 4) LLM
-    prompt = load_prompt("qa_evaluate.txt").format(
+    qa_prompt = get_prompt("qa_evaluate.txt")
+    prompt = qa_prompt.render(
         context=context,
         case_title=case_title,
         evidence_text=evidence_text,
         required_criteria=required_criteria,
     )
+    from .llm import get_llm  # openai/langchain só quando há LLM a chamar
+
     llm = get_llm()
-    raw = llm.invoke(prompt).content if hasattr(llm, "invoke") else str(llm(prompt))
+    with llm_slot(slot_kind):
+        raw = llm.invoke(prompt).content if hasattr(llm, "invoke") else str(llm(prompt))
 
     # 4.1) tentar extrair JSON estruturado do raw
     structured = _parse_llm_json(raw)
@@ -105,9 +81,6 @@ def analyze_evidence(case_title: str, evidence_paths: list, area: str | None = N
     now = datetime.datetime.now()
     rid = f"qa_{now.strftime('%Y_%m_%d_%H%M%S')}_{uuid.uuid4().hex[:6]}"
 
-    reports_dir = Path(settings.reports_dir)
-    reports_dir.mkdir(parents=True, exist_ok=True)
-
     # normaliza evidências para "/"
     normalized_evidences = [str(Path(p)).replace("\\", "/") for p in evidence_paths]
 
@@ -115,6 +88,8 @@ def analyze_evidence(case_title: str, evidence_paths: list, area: str | None = N
         "id": rid,
         "title": f"Análise - {case_title}",
         "area": area,
+        "policy": policy.id,
+        "prompt_version": qa_prompt.version,
         "inputs": {"case_title": case_title, "evidences": normalized_evidences},
         "extracted": {"text": evidence_text},
         "llm_raw": raw,
@@ -124,10 +99,6 @@ def analyze_evidence(case_title: str, evidence_paths: list, area: str | None = N
         "report_markdown_path": None,
     }
 
-    # salva JSON (primeira versão)
-    json_path = reports_dir / f"{rid}.json"
-    json_path.write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding="utf-8")
-
     # gera Markdown (resumo)
     md_lines = [
         f"# {report['title']}",
@@ -146,14 +117,80 @@ def analyze_evidence(case_title: str, evidence_paths: list, area: str | None = N
         raw[:3000] + ("..." if len(raw) > 3000 else ""),
         "```",
     ]
-    md_path = reports_dir / f"{rid}.md"
-    md_path.write_text("\n".join(md_lines), encoding="utf-8")
 
-    # atualiza JSON com caminho do MD
-    report["report_markdown_path"] = str(md_path).replace("\\", "/")
-    json_path.write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding="utf-8")
+    # grava tudo uma vez só (md + blobs comprimidos + resumo) e registra no catálogo
+    return save_report(report, "\n".join(md_lines))
+
+
+def analyze_evidence(case_title: str, evidence_paths: list, area: str | None = None):
+    # 1) extrai texto das evidências (em paralelo, com cache por hash)
+    evidence_texts = extract_texts(evidence_paths)
+    evidence_text = "\n\n".join(evidence_texts)
+
+    # 2) contexto via RAG, guiado pela política da área
+    policy = get_policy(area)
+    context_docs = _retrieve_contexts([_seed(case_title, evidence_text)], [policy])[0]
+
+    # 3..5) critérios, LLM e relatório
+    return _evaluate_and_save(
+        case_title, evidence_paths, evidence_text, context_docs, area=area, policy=policy
+    )
+
+
+def analyze_cases(
+    cases: List[Dict[str, Any]],
+    max_concurrency: Optional[int] = None,
+    on_progress: Optional[Callable[[int, str, Dict[str, Any]], None]] = None,
+):
+    """
+    Vários casos num só job. cases = [{case_title, area?, evidence_paths: [...]}].
+
+    - extrai as evidências de TODOS os casos de uma vez (pool de processos);
+    - recupera o contexto de todas as seeds em lote (batch_retrieve);
+    - avalia no LLM em paralelo, até max_concurrency casos ao mesmo tempo
+      (teto: QA_BATCH_CONCURRENCY; fila "batch" do scheduler: chat e QA
+      interativo passam na frente).
+
+    on_progress(index, status, info) é chamado a cada mudança de estado de um
+    caso (status: extracting | evaluating | done | failed); cada relatório é
+    gravado no report store assim que o caso termina.
+    """
+    notify = on_progress or (lambda i, status, info: None)
+
+    # 1) extração em paralelo (ordem preservada)
+    for i in range(len(cases)):
+        notify(i, "extracting", {})
+    all_paths = list(dict.fromkeys(p for c in cases for p in c["evidence_paths"]))
+    texts_by_path = dict(iter_extract(all_paths))
+    evidence_texts = [
+        "\n\n".join(texts_by_path[p] for p in c["evidence_paths"]) for c in cases
+    ]
 
-    return report
+    # 2) contexto em lote (cada caso com a política da sua área)
+    policies = [get_policy(c.get("area")) for c in cases]
+    seeds = [_seed(c["case_title"], t) for c, t in zip(cases, evidence_texts)]
+    docs_per_case = _retrieve_contexts(seeds, policies)
+
+    # 3) LLM em paralelo, limitado
+    limit = max(1, min(max_concurrency or settings.qa_batch_concurrency, settings.qa_batch_concurrency))
+
+    def _run(i: int):
+        c = cases[i]
+        notify(i, "evaluating", {})
+        return _evaluate_and_save(
+            c["case_title"], c["evidence_paths"], evidence_texts[i], docs_per_case[i],
+            area=c.get("area"), slot_kind="batch", policy=policies[i],
+        )
+
+    with ThreadPoolExecutor(max_workers=limit, thread_name_prefix="qa-batch") as pool:
+        futures = {pool.submit(_run, i): i for i in range(len(cases))}
+        for fut in as_completed(futures):
+            i = futures[fut]
+            try:
+                report = fut.result()
+                notify(i, "done", {"report_id": report["id"]})
+            except Exception as e:
+                notify(i, "failed", {"error": str(e)})
 
 
 def publish_report(report_id: str, target: str = "notion"):
@@ -0,0 +1,77 @@
+# app/services/qa_batch.py
+"""
+Jobs de análise de QA em lote (/api/qa/batch).
+
+Um job roda numa thread em segundo plano (analyze_cases) do worker que o
+recebeu; o progresso por caso é gravado no catálogo SQLite
+(report_catalog.save_job) a cada mudança, então GET /api/qa/batch/{job_id}
+responde de qualquer worker. Os relatórios vão para o report store conforme
+cada caso termina.
+"""
+import datetime
+import threading
+import time
+import uuid
+from typing import Any, Dict, List, Optional
+
+from . import report_catalog
+from .qa_analyzer import analyze_cases
+
+_MAX_JOBS = 100  # jobs antigos (já finalizados) saem do catálogo
+
+
+def submit(cases: List[Dict[str, Any]], max_concurrency: Optional[int] = None) -> Dict[str, Any]:
+    job_id = f"qabatch_{datetime.datetime.now().strftime('%Y_%m_%d_%H%M%S')}_{uuid.uuid4().hex[:6]}"
+    job = {
+        "job_id": job_id,
+        "status": "running",
+        "created_at": datetime.datetime.now().isoformat(),
+        "total": len(cases),
+        "done": 0,
+        "failed": 0,
+        "elapsed_s": None,
+        "cases": [
+            {"index": i, "case_title": c["case_title"], "area": c.get("area"),
+             "status": "queued", "report_id": None, "error": None}
+            for i, c in enumerate(cases)
+        ],
+    }
+    lock = threading.Lock()  # serializa as mudanças do job e a ordem das gravações
+    report_catalog.save_job(job)
+    report_catalog.trim_jobs(_MAX_JOBS)
+
+    def _on_progress(i: int, status: str, info: Dict[str, Any]):
+        with lock:
+            case = job["cases"][i]
+            case["status"] = status
+            case.update(info)
+            if status == "done":
+                job["done"] += 1
+            elif status == "failed":
+                job["failed"] += 1
+            report_catalog.save_job(job)
+
+    def _run():
+        t0 = time.perf_counter()
+        try:
+            analyze_cases(cases, max_concurrency=max_concurrency, on_progress=_on_progress)
+            status = "finished"
+        except Exception as e:
+            # falha antes da etapa de LLM (extração/recuperação): marca o que faltou
+            with lock:
+                for case in job["cases"]:
+                    if case["status"] not in ("done", "failed"):
+                        case.update(status="failed", error=str(e))
+                        job["failed"] += 1
+            status = "failed"
+        with lock:
+            job["status"] = status
+            job["elapsed_s"] = round(time.perf_counter() - t0, 3)
+            report_catalog.save_job(job)
+
+    threading.Thread(target=_run, name=f"qa-batch-{job_id}", daemon=True).start()
+    return get(job_id)
+
+
+def get(job_id: str) -> Optional[Dict[str, Any]]:
+    return report_catalog.get_job(job_id)
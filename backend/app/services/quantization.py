@@ -0,0 +1,150 @@
+# app/services/quantization.py
+"""
+Armazenamento comprimido dos vetores do índice (INDEX_STORAGE).
+
+  flat  float32, busca exata (padrão; 4 bytes por dimensão)
+  fp16  float16 (2 bytes por dimensão; perda de recall desprezível)
+  sq8   scalar quantizer 8 bits (1 byte por dimensão)
+  pq    product quantization (INDEX_PQ_M bytes por vetor; 0 = dim/8)
+
+Com compressão, os vetores float32 originais também vão para o disco
+(vectors.f32.npy, ao lado do index.faiss) e, com INDEX_RERANK=true, são lidos
+via mmap para reordenar de forma exata os INDEX_RERANK_FACTOR x k melhores
+candidatos do índice comprimido. Só as páginas desses candidatos entram em
+memória; o índice residente fica com o tamanho comprimido.
+"""
+import math
+import os
+from typing import Any, Dict, Optional
+
+import numpy as np
+
+from ..config import settings
+
+STORAGES = ("flat", "fp16", "sq8", "pq")
+FULL_VECTORS_FILE = "vectors.f32.npy"
+
+
+def _pq_m(d: int) -> int:
+    m = settings.index_pq_m or max(1, d // 8)
+    while d % m:  # PQ exige que m divida a dimensão
+        m -= 1
+    return m
+
+
+def compress(index, storage: str):
+    """Novo índice faiss com os mesmos vetores (e na mesma ordem) no formato pedido."""
+    import faiss  # type: ignore
+
+    if storage not in STORAGES:
+        raise ValueError(f"INDEX_STORAGE inválido: {storage} (use {', '.join(STORAGES)})")
+    if storage == "flat" or index.ntotal == 0:
+        return index
+    vectors = index.reconstruct_n(0, index.ntotal)
+    d = index.d
+    if storage == "pq":
+        # treinar 2^nbits centróides pede pelo menos esse tanto de vetores
+        nbits = min(8, int(math.log2(index.ntotal)))
+        if nbits < 4:
+            storage = "sq8"  # corpus minúsculo: PQ não compensa
+        else:
+            out = faiss.IndexPQ(d, _pq_m(d), nbits, faiss.METRIC_L2)
+    if storage in ("fp16", "sq8"):
+        qtype = faiss.ScalarQuantizer.QT_fp16 if storage == "fp16" else faiss.ScalarQuantizer.QT_8bit
+        out = faiss.IndexScalarQuantizer(d, qtype, faiss.METRIC_L2)
+    out.train(vectors)
+    out.add(vectors)
+    return out
+
+
+def storage_of(index) -> str:
+    import faiss  # type: ignore
+
+    base = index.base if isinstance(index, RerankIndex) else index
+    if isinstance(base, faiss.IndexPQ):
+        return "pq"
+    if isinstance(base, faiss.IndexScalarQuantizer):
+        return "fp16" if base.sq.qtype == faiss.ScalarQuantizer.QT_fp16 else "sq8"
+    return "flat"
+
+
+class RerankIndex:
+    """
+    Índice comprimido + vetores float32 em disco (mmap). search() busca
+    factor x k candidatos no comprimido e reordena pela distância exata;
+    reconstruct() devolve o vetor exato (o MMR usa isso). Demais atributos
+    (ntotal, d, sa_code_size...) vêm do índice comprimido.
+    """
+
+    def __init__(self, base, full: np.ndarray, factor: int):
+        self.base = base
+        self.full = full
+        self.factor = max(1, factor)
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.base, name)
+
+    def search(self, x, k: int):
+        x = np.asarray(x, dtype=np.float32)
+        k_cand = min(self.base.ntotal, k * self.factor)
+        _d, cand = self.base.search(x, k_cand)
+        dists = np.full((len(x), k), np.inf, dtype=np.float32)
+        ids = np.full((len(x), k), -1, dtype=np.int64)
+        for qi in range(len(x)):
+            c = cand[qi][cand[qi] != -1]
+            if not len(c):
+                continue
+            order = np.sort(c)  # leitura sequencial no mmap
+            exact = ((self.full[order] - x[qi]) ** 2).sum(axis=1)
+            top = np.argsort(exact)[:k]
+            dists[qi, : len(top)] = exact[top]
+            ids[qi, : len(top)] = order[top]
+        return dists, ids
+
+    def reconstruct(self, i: int) -> np.ndarray:
+        return np.array(self.full[int(i)], dtype=np.float32)
+
+
+def save_full_vectors(index, folder: str):
+    """Grava os vetores float32 (para re-ranking) antes de o índice ser comprimido."""
+    if isinstance(index, RerankIndex):
+        vectors = np.asarray(index.full)
+    elif index.ntotal:
+        vectors = index.reconstruct_n(0, index.ntotal)
+    else:
+        vectors = np.zeros((0, index.d), np.float32)
+    np.save(os.path.join(folder, FULL_VECTORS_FILE), vectors.astype(np.float32))
+
+
+def with_rerank(index, folder: str):
+    """Envolve o índice comprimido com o re-ranking exato, se configurado e possível."""
+    path = os.path.join(folder, FULL_VECTORS_FILE)
+    if not settings.index_rerank or storage_of(index) == "flat" or not os.path.exists(path):
+        return index
+    full = np.load(path, mmap_mode="r")
+    if full.shape != (index.ntotal, index.d):
+        return index  # arquivo de outra geração/dimensão: melhor sem re-ranking do que errado
+    return RerankIndex(index, full, settings.index_rerank_factor)
+
+
+def describe(index, folder: Optional[str] = None) -> Dict[str, Any]:
+    """Memória do índice: bytes por vetor no formato residente e o que fica só em disco."""
+    base = index.base if isinstance(index, RerankIndex) else index
+    try:
+        code = int(base.sa_code_size())
+    except Exception:
+        code = base.d * 4
+    out: Dict[str, Any] = {
+        "storage": storage_of(index),
+        "vectors": int(base.ntotal),
+        "dim": int(base.d),
+        "bytes_per_vector": code,
+        "index_mb": round(base.ntotal * code / 1e6, 2),
+        "float32_mb": round(base.ntotal * base.d * 4 / 1e6, 2),
+        "rerank": isinstance(index, RerankIndex),
+    }
+    if folder:
+        path = os.path.join(folder, FULL_VECTORS_FILE)
+        if os.path.exists(path):
+            out["full_vectors_on_disk_mb"] = round(os.path.getsize(path) / 1e6, 2)
+    return out
@@ -0,0 +1,153 @@
+# app/services/query_embedder.py
+"""
+Embeddings de perguntas com micro-batching e cache LRU.
+
+Cada /api/chat embedava a pergunta sozinho (um forward do modelo por request).
+Aqui as perguntas que chegam juntas esperam até QUERY_EMBED_WINDOW_MS (ou até
+QUERY_EMBED_MAX_BATCH perguntas) e vão num forward só; perguntas repetidas
+(depois de normalizar espaços/Unicode) saem do cache sem tocar no modelo.
+
+get_embeddings() devolve um BatchedEmbeddings: os FAISS de todas as coleções
+usam ele, então o retriever, o fan-out e o warm-up passam por aqui sem mudar.
+embed_documents (ingestão, lotes) vai direto para o modelo.
+"""
+from __future__ import annotations
+
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from concurrent.futures import Future
+from queue import Empty, SimpleQueue
+from typing import Any, Dict, List, Optional, Tuple
+
+from langchain_core.embeddings import Embeddings
+
+from . import metrics
+from ..config import settings
+
+
+def normalize_query(text: str) -> str:
+    """Chave do cache (e texto embedado): NFC + espaços colapsados."""
+    return " ".join(unicodedata.normalize("NFC", text or "").split())
+
+
+class QueryBatcher:
+    """Junta chamadas concorrentes de embed() num único embed em lote (thread própria)."""
+
+    def __init__(self, embed_many, window_ms: float, max_batch: int, cache_size: int):
+        self._embed_many = embed_many
+        self.window_s = max(0.0, window_ms) / 1000
+        self.max_batch = max(1, max_batch)
+        self.cache_size = max(0, cache_size)
+        self._cache: "OrderedDict[str, List[float]]" = OrderedDict()
+        self._cache_lock = threading.Lock()
+        self._pending: SimpleQueue = SimpleQueue()
+        self._worker: Optional[threading.Thread] = None
+        self._worker_lock = threading.Lock()
+
+    # ---- cache ----
+    def _cached(self, key: str) -> Optional[List[float]]:
+        if not self.cache_size:
+            return None
+        with self._cache_lock:
+            vec = self._cache.get(key)
+            if vec is not None:
+                self._cache.move_to_end(key)
+            return vec
+
+    def _store(self, key: str, vec: List[float]):
+        if not self.cache_size:
+            return
+        with self._cache_lock:
+            self._cache[key] = vec
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def cache_info(self) -> Dict[str, Any]:
+        with self._cache_lock:
+            return {"size": len(self._cache), "max": self.cache_size}
+
+    # ---- batching ----
+    def embed(self, text: str) -> List[float]:
+        key = normalize_query(text)
+        vec = self._cached(key)
+        if vec is not None:
+            metrics.inc("query_embed_cache_hits")
+            return list(vec)
+        metrics.inc("query_embed_cache_misses")
+        if not self.window_s:
+            vec = self._embed_many([key])[0]
+            self._store(key, vec)
+            return list(vec)
+        fut: Future = Future()
+        self._pending.put((key, fut, time.perf_counter()))
+        self._ensure_worker()
+        return list(fut.result())
+
+    def _ensure_worker(self):
+        if self._worker is None:
+            with self._worker_lock:
+                if self._worker is None:
+                    self._worker = threading.Thread(target=self._loop, name="query-embed", daemon=True)
+                    self._worker.start()
+
+    def _collect(self) -> List[Tuple[str, Future, float]]:
+        batch = [self._pending.get()]  # bloqueia até chegar a primeira
+        deadline = time.perf_counter() + self.window_s
+        while len(batch) < self.max_batch:
+            left = deadline - time.perf_counter()
+            if left <= 0:
+                break
+            try:
+                batch.append(self._pending.get(timeout=left))
+            except Empty:
+                break
+        return batch
+
+    def _loop(self):
+        while True:
+            batch = self._collect()
+            texts = list(dict.fromkeys(key for key, _f, _t in batch))  # repetidas no mesmo lote: uma vez só
+            try:
+                vectors = dict(zip(texts, self._embed_many(texts)))
+            except Exception as e:
+                for _key, fut, _t in batch:
+                    fut.set_exception(e)
+                continue
+            now = time.perf_counter()
+            metrics.observe("query_embed_batch_size", len(texts))
+            for key, fut, t in batch:
+                metrics.observe("query_embed_wait_ms", (now - t) * 1000)
+                self._store(key, vectors[key])
+                fut.set_result(vectors[key])
+
+
+class BatchedEmbeddings(Embeddings):
+    """Embeddings do langchain: embed_query pelo QueryBatcher, embed_documents direto no modelo."""
+
+    def __init__(self, base: Embeddings):
+        self.base = base
+        self.batcher = QueryBatcher(
+            self._embed_queries,
+            window_ms=settings.query_embed_window_ms,
+            max_batch=settings.query_embed_max_batch,
+            cache_size=settings.query_embed_cache_size,
+        )
+
+    def _embed_queries(self, texts: List[str]) -> List[List[float]]:
+        # HuggingFaceEmbeddings pode ter kwargs próprios para perguntas (ex.: prompt "query: " do e5)
+        query_kwargs = getattr(self.base, "query_encode_kwargs", None)
+        if query_kwargs and hasattr(self.base, "_embed"):
+            return self.base._embed(texts, query_kwargs)
+        return self.base.embed_documents(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.batcher.embed(text)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.base.embed_documents(texts)
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.base, name)
@@ -1,34 +1,50 @@
 # app/services/rag.py
 from __future__ import annotations
 import os
-from typing import Optional, List, Tuple, Set, Union, Dict, Any
+import threading
+from collections import OrderedDict
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import TYPE_CHECKING, Optional, List, Set, Tuple, Union, Dict, Any, Iterator, Callable
 from operator import itemgetter
 
-from langchain_community.document_loaders import (
-    DirectoryLoader,
-    TextLoader,
-    PyPDFLoader,
-    CSVLoader,
-)
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain_core.documents import Document
-from langchain_core.output_parsers import StrOutputParser
-from langchain_core.prompts import PromptTemplate
-from langchain_core.runnables import RunnableLambda
-from langchain_community.vectorstores import FAISS
-
-# --- construir FAISS vazio com segurança ---
-import faiss  # type: ignore
-from langchain_community.docstore.in_memory import InMemoryDocstore
-
-from .embedder import get_embeddings
-from .llm import get_llm
+import numpy as np
+
+from . import collections_config, index_store, relevance, segments
+from .embedder import get_embeddings, embedding_dim, remember_dim
+from . import metrics
+from .scheduler import llm_slot
+from .prompts_loader import get_prompt
 from ..config import settings
-from .connectors import collect_documents
 
-# cache em memória
-_vectorstore: Optional[FAISS] = None
-_meta: dict = {}
+# langchain_community / faiss / splitter / LLM são importados dentro das funções:
+# subir a API não paga esse custo (ver app/services/warmup.py).
+if TYPE_CHECKING:
+    from langchain_core.documents import Document
+    from langchain_community.vectorstores import FAISS
+
+# índices abertos neste processo, por coleção (LRU; ver _remember)
+_open: "OrderedDict[str, _Loaded]" = OrderedDict()
+_open_lock = threading.Lock()
+_name_locks: Dict[str, threading.Lock] = {}
+_delta_locks: Dict[str, threading.Lock] = {}  # um ingest incremental por coleção (estado do dedup)
+_watcher: Optional[threading.Thread] = None
+
+
+class _Loaded:
+    """Índice de uma coleção carregado em memória."""
+
+    def __init__(self, name: str, persist_dir: str, vs: FAISS, meta: dict, generation: int):
+        self.name = name
+        self.persist_dir = persist_dir
+        self.vs = vs
+        self.meta = meta
+        self.generation = generation    # geração em memória (ver index_store)
+        self.reloading = False
+        self.compacting = False
+        self.dedup = None  # NearDuplicates dos chunks do índice (caminho incremental; ver _live_dedup)
+        self.bytes = _estimate_bytes(vs)
+        self.last_used = time.time()
 
 
 def _format_docs(docs: List[Document]) -> str:
@@ -45,70 +61,43 @@ def _faiss_count(vs: FAISS) -> Optional[int]:
         return None
 
 
-def _load_documents(docs_dir: str) -> List[Document]:
-    """Carrega documentos locais do diretório de base."""
-    loaders = [
-        DirectoryLoader(
-            docs_dir,
-            glob="**/*.md",
-            loader_cls=TextLoader,
-            loader_kwargs={"encoding": "utf-8", "autodetect_encoding": True},
-            show_progress=True,
-        ),
-        DirectoryLoader(
-            docs_dir,
-            glob="**/*.txt",
-            loader_cls=TextLoader,
-            loader_kwargs={"encoding": "utf-8", "autodetect_encoding": True},
-            show_progress=True,
-        ),
-        DirectoryLoader(
-            docs_dir,
-            glob="**/*.pdf",
-            loader_cls=PyPDFLoader,
-            show_progress=True,
-        ),
-        DirectoryLoader(
-            docs_dir,
-            glob="**/*.csv",
-            loader_cls=CSVLoader,
-            loader_kwargs={"encoding": "utf-8"},
-            show_progress=True,
-        ),
-    ]
-    docs: List[Document] = []
-    for loader in loaders:
+def _normalize_local(d: Document) -> Document:
+    """Metadados mínimos dos documentos locais."""
+    src = d.metadata.get("source") or d.metadata.get("file_path") or "local"
+    d.metadata["source"] = str(src).replace("\\", "/")
+    d.metadata.setdefault("connector", "local")
+    if "page" not in d.metadata and "page_number" in d.metadata:
+        d.metadata["page"] = d.metadata["page_number"]
+    return d
+
+
+def _iter_files(paths: List[str]) -> Iterator[Document]:
+    """Os loaders da pasta local (connectors.LOCAL_LOADERS), para arquivos avulsos (upload, watcher da pasta)."""
+    from .connectors import local_loader
+
+    for path in paths:
+        loader = local_loader(path)
+        if loader is None:
+            continue  # mesmo recorte da pasta: os demais formatos não são indexados
         try:
-            docs.extend(loader.load())
+            for d in loader.lazy_load():
+                yield _normalize_local(d)
         except Exception as e:
-            print(f"[RAG] Loader error {loader}: {e}")
+            print(f"[RAG] Loader error {path}: {e}")
 
-    # Normaliza metadados mínimos
-    for d in docs:
-        src = d.metadata.get("source") or d.metadata.get("file_path") or "local"
-        d.metadata["source"] = str(src).replace("\\", "/")
-        d.metadata.setdefault("connector", "local")
-        if "page" not in d.metadata and "page_number" in d.metadata:
-            d.metadata["page"] = d.metadata["page_number"]
 
-    return docs
+def _iter_documents(docs_dir: str) -> Iterator[Document]:
+    """Documentos locais do diretório de base, um arquivo por vez (mesmos loaders do conector local)."""
+    from .connectors import _iter_local_docs
 
+    yield from _iter_local_docs(docs_dir)
 
-def _split_documents(docs: List[Document]) -> List[Document]:
-    splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=150)
-    return splitter.split_documents(docs)
 
+def _split_documents(docs: List[Document], chunk_size: int = 1000, chunk_overlap: int = 150) -> List[Document]:
+    from langchain.text_splitter import RecursiveCharacterTextSplitter
 
-def _filter_nonempty(docs: List[Document]) -> List[Document]:
-    """Remove documentos/chunks sem conteúdo útil."""
-    out: List[Document] = []
-    for d in docs:
-        if not d:
-            continue
-        txt = (d.page_content or "").strip()
-        if len(txt) >= 5:  # ignora textos muito curtos/vazios
-            out.append(d)
-    return out
+    splitter = RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+    return splitter.split_documents(docs)
 
 
 def _debug_sample_docs(docs: List[Document], n: int = 5):
@@ -130,10 +119,33 @@ def _debug_sample_chunks(chunks: List[Document], n: int = 5):
         print("TEXT:", txt, "\n")
 
 
-def _build_empty_faiss(emb):
-    """Cria um FAISS vazio (sem vetores) mas com a mesma dimensão do embedding."""
+def _estimate_bytes(vs: FAISS) -> int:
+    """Memória aproximada do índice: vetores (bytes por código x ntotal) + textos do docstore."""
+    idx = vs.index
     try:
-        dim = len(emb.embed_query("dimension_probe"))
+        code = idx.sa_code_size()
+    except Exception:
+        code = idx.d * 4
+    docs = getattr(vs.docstore, "_dict", {}) or {}
+    text = sum(len(d.page_content or "") + 256 for d in docs.values())  # +256: metadata/objeto
+    return int(idx.ntotal * code + text)
+
+
+def _build_empty_faiss(emb, persist_dir: Optional[str] = None):
+    """
+    Cria um FAISS vazio (sem vetores) mas com a mesma dimensão do embedding.
+    A dimensão vem da metadata do índice anterior (mesmo modelo) ou do warm-up;
+    só em último caso o modelo é sondado.
+    """
+    import faiss  # type: ignore
+    from langchain_community.docstore.in_memory import InMemoryDocstore
+    from langchain_community.vectorstores import FAISS
+
+    known = index_store.read_meta(persist_dir)
+    if known.get("embedding_dim") and known.get("embeddings_model") == settings.embeddings_model:
+        remember_dim(known["embedding_dim"])
+    try:
+        dim = embedding_dim()
     except Exception:
         dim = 384  # fallback para MiniLM; ajuste se quiser
     index = faiss.IndexFlatL2(dim)
@@ -148,98 +160,619 @@ def _build_empty_faiss(emb):
 def build_or_load_vectorstore(
     rebuild: bool = False,
     extra_docs: Optional[List[Document]] = None,
+    collection: Optional[str] = None,
 ) -> Tuple[FAISS, dict]:
     """
-    Cria ou carrega o FAISS a partir de settings.DOCS_DIR e, quando rebuild=True,
-    também agrega documentos vindos de conectores (URLs/Notion/GDrive/M365) via collect_documents().
-    Persiste em settings.PERSIST_DIR.
-    Retorna (vectorstore, meta) onde meta contém {vectors, sources}.
+    Cria ou carrega o FAISS da coleção (default: "default", que usa
+    settings.DOCS_DIR/PERSIST_DIR) e, quando rebuild=True, também agrega
+    documentos dos conectores da coleção (URLs/Notion/GDrive/M365) via iter_documents().
+    Retorna (vectorstore, meta) onde meta contém {vectors, sources, embedding_dim}.
+    KeyError se a coleção não existir.
     """
-    global _vectorstore, _meta
+    loaded = _get_loaded(collection, rebuild, extra_docs)
+    return loaded.vs, loaded.meta
+
 
+def _get_loaded(
+    collection: Optional[str] = None,
+    rebuild: bool = False,
+    extra_docs: Optional[List[Document]] = None,
+) -> _Loaded:
+    """
+    Como build_or_load_vectorstore, mas devolve o próprio _Loaded (persist_dir,
+    geração, segmento delta). Use este em vez de ler _open[nome] depois:
+    com várias coleções, o LRU pode ter fechado o índice nesse meio-tempo.
+    """
+    name = collection or collections_config.DEFAULT
+    loaded = _open.get(name)
     # cache em memória
-    if _vectorstore is not None and not rebuild:
-        return _vectorstore, _meta
+    if loaded is not None and not rebuild:
+        _touch(loaded)
+        return loaded
+    cfg = collections_config.get_collection(name)
+    # warm-up e primeiro request podem chegar juntos: só um carrega (por coleção)
+    with _lock_for(name):
+        loaded = _open.get(name)
+        if loaded is not None and not rebuild:
+            _touch(loaded)
+            return loaded
+        loaded = _build_or_load(cfg, rebuild, extra_docs)
+        _remember(loaded)
+        return loaded
 
+
+def _lock_for(name: str) -> threading.Lock:
+    with _open_lock:
+        return _name_locks.setdefault(name, threading.Lock())
+
+
+def _touch(loaded: _Loaded):
+    loaded.last_used = time.time()
+    with _open_lock:
+        if loaded.name in _open:
+            _open.move_to_end(loaded.name)
+
+
+def _remember(loaded: _Loaded):
+    """Guarda o índice no LRU e fecha os menos usados se passar de COLLECTIONS_MEMORY_MB."""
+    budget = settings.collections_memory_mb * 1024 * 1024
+    with _open_lock:
+        _open[loaded.name] = loaded
+        _open.move_to_end(loaded.name)
+        while len(_open) > 1 and sum(x.bytes for x in _open.values()) > budget:
+            evicted_name, evicted = _open.popitem(last=False)
+            metrics.inc("collections_evicted_total", collection=evicted_name)
+            print(f"[RAG] coleção '{evicted_name}' fechada (LRU, ~{evicted.bytes / 1e6:.0f} MB)")
+    _start_watcher()
+
+
+def _maybe_refresh(loaded: _Loaded):
+    """
+    Outro worker publicou um índice novo? Recarrega em segundo plano e troca
+    quando estiver pronto; enquanto isso, os requests seguem no índice atual.
+    """
+    if loaded.reloading or index_store.current_generation(loaded.persist_dir) <= loaded.generation:
+        return
+    with _open_lock:  # um rebuild em andamento (lock da coleção) não pode travar ninguém
+        if loaded.reloading:
+            return
+        loaded.reloading = True
+    threading.Thread(target=_reload_generation, args=(loaded,), name="index-reload", daemon=True).start()
+
+
+def _start_watcher():
+    """Uma thread por processo lê GENERATION a cada INDEX_RELOAD_CHECK_S (worker ocioso também converge)."""
+    global _watcher
+    if _watcher is not None or settings.index_reload_check_s <= 0:
+        return
+
+    def _loop():
+        while True:
+            time.sleep(settings.index_reload_check_s)
+            for loaded in list(_open.values()):
+                try:
+                    _maybe_refresh(loaded)
+                    _sync_delta(loaded)
+                except Exception as e:
+                    print(f"[RAG] watcher do índice ({loaded.name}): {e}")
+
+    _watcher = threading.Thread(target=_loop, name="index-watcher", daemon=True)
+    _watcher.start()
+
+
+def _reload_generation(loaded: _Loaded):
+    try:
+        gen = index_store.current_generation(loaded.persist_dir)
+        if gen <= loaded.generation:
+            return
+        t = time.perf_counter()
+        vs, gen = index_store.load(get_embeddings(), loaded.persist_dir, gen=gen)
+        fresh = _make_loaded(loaded.name, loaded.persist_dir, vs, gen, None)
+        with _lock_for(loaded.name):
+            current = _open.get(loaded.name)
+            if current is loaded:
+                _remember(fresh)
+        metrics.inc("index_reloads_total", collection=loaded.name)
+        print(f"[RAG] índice '{loaded.name}' recarregado: geração {gen} ({(time.perf_counter() - t) * 1000:.0f} ms)")
+    except Exception as e:
+        print(f"[RAG] falha ao recarregar índice '{loaded.name}': {e}")
+    finally:
+        loaded.reloading = False
+
+
+def _loaded_info(loaded: _Loaded) -> Dict[str, Any]:
+    return {
+        "collection": loaded.name,
+        "generation": loaded.generation,
+        "published_generation": index_store.current_generation(loaded.persist_dir),
+        "vectors": _faiss_count(loaded.vs),
+        "approx_mb": round(loaded.bytes / 1e6, 1),
+        "reloading": loaded.reloading,
+        "compacting": loaded.compacting,
+        **segments.describe(loaded.vs.index),
+    }
+
+
+def index_info(collection: Optional[str] = None) -> Dict[str, Any]:
+    """Estado do índice da coleção NESTE processo (não carrega nada)."""
+    name = collection or collections_config.DEFAULT
+    loaded = _open.get(name)
+    info = {
+        "pid": os.getpid(),
+        "collection": name,
+        "loaded": loaded is not None,
+        "generation": 0,
+        "published_generation": None,
+        "vectors": None,
+        "mmap": settings.index_mmap,
+        "reloading": False,
+    }
+    if loaded is not None:
+        info.update(_loaded_info(loaded))
+    else:
+        try:
+            info["published_generation"] = index_store.current_generation(
+                collections_config.get_collection(name)["persist_dir"])
+        except KeyError:
+            pass
+    return info
+
+
+def _rss_mb() -> Optional[float]:
+    try:
+        with open("/proc/self/status", "r", encoding="ascii") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    try:
+        import resource  # pico, não atual (fora do Linux)
+
+        return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+    except Exception:
+        return None
+
+
+def memory_report() -> Dict[str, Any]:
+    """Memória do processo e de cada índice aberto (formato dos vetores, MB residentes x float32)."""
+    from . import quantization
+
+    indexes = []
+    for loaded in list(_open.values()):
+        folder = index_store.index_dir(loaded.persist_dir, loaded.generation)
+        docs = getattr(loaded.vs.docstore, "_dict", {}) or {}
+        indexes.append({
+            "collection": loaded.name,
+            **quantization.describe(segments.main_index(loaded.vs.index), folder),
+            "docstore_mb": round(sum(len(d.page_content or "") for d in docs.values()) / 1e6, 2),
+        })
+    return {"rss_mb": _rss_mb(), "index_storage": settings.index_storage, "indexes": indexes}
+
+
+def open_collections() -> Dict[str, Any]:
+    """Coleções abertas neste processo (ordem LRU, da menos para a mais usada) e o orçamento."""
+    items = [_loaded_info(x) for x in list(_open.values())]
+    return {
+        "budget_mb": settings.collections_memory_mb,
+        "used_mb": round(sum(i["approx_mb"] for i in items), 1),
+        "open": items,
+    }
+
+
+def _build_or_load(cfg: Dict[str, Any], rebuild: bool, extra_docs: Optional[List[Document]]) -> _Loaded:
+    from langchain_community.vectorstores import FAISS
+
+    name = cfg["name"]
     embeddings = get_embeddings()
-    persist_dir = settings.persist_dir
-    index_path = os.path.join(persist_dir, "index.faiss")
+    persist_dir = cfg["persist_dir"]
+
+    def _done(vs: FAISS, generation: int, sources: Optional[List[str]]) -> _Loaded:
+        remember_dim(vs.index.d)
+        return _make_loaded(name, persist_dir, vs, generation, sources)
 
     # caminho feliz: já existe índice no disco e não é rebuild
-    if (not rebuild) and os.path.isdir(persist_dir) and os.path.exists(index_path):
-        _vectorstore = FAISS.load_local(
-            persist_dir, embeddings, allow_dangerous_deserialization=True
-        )
-        _meta = {"vectors": _faiss_count(_vectorstore), "sources": None}
-        return _vectorstore, _meta
+    if (not rebuild) and index_store.exists(persist_dir):
+        vs, generation = index_store.load(embeddings, persist_dir)
+        return _done(vs, generation, None)
 
-    # (re)construção
+    # o rebuild relê a pasta e os conectores: absorve os lotes do delta que já existem
+    absorbed = {"compacted_deltas": segments.list_batches(persist_dir)}
+
+    # (re)construção: documentos fluem dos conectores até o índice por
+    # services/ingest_pipeline.py, sem materializar a lista inteira
     os.makedirs(persist_dir, exist_ok=True)
-    docs_dir = settings.docs_dir
+    vs: Optional[FAISS] = None
+    samples = {"docs": 0, "chunks": 0}
+
+    def _sampled(docs: Iterator[Document]) -> Iterator[Document]:
+        for d in docs:
+            if samples["docs"] < 8:
+                _debug_sample_docs([d], n=1)
+                samples["docs"] += 1
+            yield d
+
+    reuse = _reusable_vectors(cfg) if rebuild else {}
+
+    def _add(batch: List[Document]):
+        nonlocal vs
+        if samples["chunks"] < 8:
+            _debug_sample_chunks(batch, n=8 - samples["chunks"])
+            samples["chunks"] += len(batch)
+        texts = [c.page_content for c in batch]
+        vectors: List[Any] = [reuse.get(_reuse_key(c)) for c in batch]
+        missing = [i for i, v in enumerate(vectors) if v is None]
+        if missing:
+            for i, v in zip(missing, embeddings.embed_documents([texts[i] for i in missing])):
+                vectors[i] = v
+        if len(missing) < len(batch):
+            metrics.inc("index_vectors_reused_total", len(batch) - len(missing), collection=name)
+        pairs = list(zip(texts, vectors))
+        metadatas = [c.metadata for c in batch]
+        ids = [c.id for c in batch] if all(c.id for c in batch) else None
+        if vs is None:
+            vs = FAISS.from_embeddings(pairs, embeddings, metadatas=metadatas, ids=ids)
+        else:
+            vs.add_embeddings(pairs, metadatas=metadatas, ids=ids)
+
+    from .ingest_pipeline import run as run_pipeline
+
+    dedup = None
+    if settings.dedup_enabled:
+        from .dedup import NearDuplicates
+
+        dedup = NearDuplicates()
+    stats = run_pipeline(
+        _sampled(_build_documents(cfg, rebuild, extra_docs)), _add,
+        chunk_size=cfg["chunk_size"], chunk_overlap=cfg["chunk_overlap"],
+        keep=dedup.keep if dedup else None,
+    )
+    sources = sorted(stats["sources"])
+    print(f"[RAG] [{name}] {stats['docs']} documentos -> {stats['chunks']} chunks em {stats['seconds']}s "
+          f"(pico nas filas: {stats['peak_queue_docs']} docs, {stats['peak_queue_batches']} lotes)")
+    dedup_report = None
+    if dedup:
+        dedup_report = dedup.report()
+        if vs is not None:
+            dedup.attach_sources(vs.docstore)
+        print(f"[RAG] [{name}] quase duplicados removidos: {dedup.removed} de {dedup_report['chunks_seen']} chunks")
+
+    if vs is None:
+        print(f"[RAG] Nenhum chunk com conteúdo para indexar. Construindo índice vazio.")
+        vs = _build_empty_faiss(embeddings, persist_dir)
+        return _done(vs, index_store.save(vs, persist_dir, sources, absorbed), sources)
+
+    loaded = _done(vs, index_store.save(vs, persist_dir, sources, absorbed), sources)
+    if dedup_report:
+        loaded.meta["dedup"] = dedup_report
+        loaded.dedup = dedup  # já conhece todos os chunks: o incremental segue daqui
+
+    # telemetria (se existir)
+    if name == collections_config.DEFAULT:
+        try:
+            from .state import set_vectors, mark_ingest_now
+            set_vectors(loaded.meta["vectors"] or 0)
+            mark_ingest_now()
+        except Exception:
+            pass
+
+    return loaded
+
+
+def _reuse_key(c: Document) -> Optional[Tuple[str, str, str]]:
+    meta = c.metadata or {}
+    if not meta.get("body_sha256"):
+        return None
+    return str(meta.get("source")), str(meta["body_sha256"]), c.page_content
+
+
+def _reusable_vectors(cfg: Dict[str, Any]) -> Dict[Tuple[str, str, str], List[float]]:
+    """
+    Vetores da geração atual dos chunks de URL (que têm body_sha256, ver
+    connectors._iter_url_docs): no rebuild, página com o mesmo hash e o mesmo
+    chunk não é embutida de novo. Vazio se não há índice, se o modelo de
+    embeddings mudou ou se a coleção não usa o conector de URLs.
+    """
+    persist_dir = cfg["persist_dir"]
+    if cfg["connectors"] is not None and "urls" not in cfg["connectors"]:
+        return {}
+    if not index_store.exists(persist_dir):
+        return {}
+    meta = index_store.read_meta(persist_dir)
+    if meta.get("embeddings_model") != settings.embeddings_model:
+        return {}
+    try:
+        old, gen = index_store.load(get_embeddings(), persist_dir)
+    except Exception as e:
+        print(f"[RAG] [{cfg['name']}] sem reaproveitar vetores ({e})")
+        return {}
+    positions: Dict[Tuple[str, str, str], int] = {}
+    for i, doc_id in old.index_to_docstore_id.items():
+        doc = old.docstore.search(doc_id)
+        key = _reuse_key(doc) if hasattr(doc, "metadata") else None
+        if key is not None and i < segments.main_index(old.index).ntotal:
+            positions[key] = i
+    if not positions:
+        return {}
+    vectors = segments.main_vectors(old.index, index_store.index_dir(persist_dir, gen))
+    return {key: vectors[i].tolist() for key, i in positions.items()}
+
+
+def _make_loaded(name: str, persist_dir: str, vs: FAISS, generation: int, sources: Optional[List[str]]) -> _Loaded:
+    """_Loaded da geração, já com o segmento delta (lotes que ela ainda não absorveu)."""
+    seg = segments.attach(vs, persist_dir, generation)
+    segments.record(name, seg)
+    meta = {"vectors": _faiss_count(vs), "sources": sources, "embedding_dim": vs.index.d,
+            "generation": generation, "collection": name}
+    return _Loaded(name, persist_dir, vs, meta, generation)
+
+
+# ===================== DELTA (documentos novos sem rebuild) ===================== #
+def add_documents(paths: List[str], collection: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Indexa arquivos novos no segmento delta da coleção, sem rebuild: buscáveis
+    na hora neste worker e em até INDEX_RELOAD_CHECK_S nos demais. A compactação
+    com o principal acontece em segundo plano (ver services/segments.py).
+    """
+    from .ingest_pipeline import run as run_pipeline
+
+    t = time.perf_counter()
+    name = collection or collections_config.DEFAULT
+    cfg = collections_config.get_collection(name)
+    loaded = _get_loaded(name)
+    embeddings = get_embeddings()
+
+    def _add(batch: List[Document]):
+        vectors = np.asarray(embeddings.embed_documents([c.page_content for c in batch]), dtype=np.float32)
+        batch_name, payload = segments.write_batch(loaded.persist_dir, vectors, batch)
+        segments.apply_batch(loaded.vs, loaded.persist_dir, batch_name, payload)
+
+    with _delta_lock(name):
+        dedup = _live_dedup(loaded)
+        dropped = dedup.removed if dedup else 0
+        stats = run_pipeline(_iter_files(paths), _add, chunk_size=cfg["chunk_size"],
+                             chunk_overlap=cfg["chunk_overlap"], keep=dedup.keep if dedup else None)
+        if dedup:
+            dedup.attach_sources(loaded.vs.docstore)
+            stats["duplicates_removed"] = dedup.removed - dropped
+    return _delta_done(loaded, stats, t)
 
-    # 1) carrega docs locais
-    docs_local: List[Document] = _load_documents(docs_dir)
 
-    # 2) agrega conectores APENAS quando rebuild=True (ou se extra_docs informado)
-    docs: List[Document] = list(docs_local)
-    if rebuild:
+def sync_files(changed: List[str], removed: List[str], collection: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Leva mudanças da pasta local para o delta (services/docs_watcher.py): chunks
+    de arquivos alterados/apagados saem da busca e os de criados/alterados entram.
+    Os embeddings são calculados antes; o lote de remoção e os lotes novos são
+    aplicados logo em seguida, então a busca não fica sem o arquivo alterado
+    enquanto o modelo roda.
+    """
+    from .ingest_pipeline import run as run_pipeline
+
+    t = time.perf_counter()
+    name = collection or collections_config.DEFAULT
+    cfg = collections_config.get_collection(name)
+    loaded = _get_loaded(name)
+    embeddings = get_embeddings()
+    pending: List[Tuple[np.ndarray, List[Document]]] = []
+
+    def _add(batch: List[Document]):
+        vectors = np.asarray(embeddings.embed_documents([c.page_content for c in batch]), dtype=np.float32)
+        pending.append((vectors, batch))
+
+    stats: Dict[str, Any] = {"docs": 0, "chunks": 0}
+    changed = [p.replace("\\", "/") for p in changed]
+    removed = [p.replace("\\", "/") for p in removed]
+    with _delta_lock(name):
+        dedup = _live_dedup(loaded)
+        # remoção primeiro (lotes aplicam em ordem de nome/tempo): tira as versões antigas, não as novas
+        gone = set(changed) | set(removed)
+        resync: List[str] = []
+        if dedup:
+            # arquivo que só estava no índice como quase duplicata de um chunk que sai volta a ser indexado
+            orphans = dedup.forget(sources=gone)
+            while orphans:
+                extra = sorted(p for p in orphans if p not in gone and os.path.isfile(p))
+                gone.update(extra)
+                resync += extra
+                orphans = dedup.forget(sources=set(extra)) if extra else set()
+            dropped = dedup.removed
+        if changed or resync:
+            stats = run_pipeline(_iter_files(changed + resync), _add, chunk_size=cfg["chunk_size"],
+                                 chunk_overlap=cfg["chunk_overlap"], keep=dedup.keep if dedup else None)
+        loaded = _get_loaded(name)  # a compactação pode ter trocado o índice enquanto isso
+        if gone:
+            batch_name, payload = segments.write_batch(loaded.persist_dir, None, [], removed_sources=sorted(gone))
+            segments.apply_batch(loaded.vs, loaded.persist_dir, batch_name, payload)
+        for vectors, batch in pending:
+            batch_name, payload = segments.write_batch(loaded.persist_dir, vectors, batch)
+            segments.apply_batch(loaded.vs, loaded.persist_dir, batch_name, payload)
+        if dedup:
+            dedup.attach_sources(loaded.vs.docstore)
+            stats["duplicates_removed"] = dedup.removed - dropped
+    return {**_delta_done(loaded, stats, t), "changed": len(changed), "removed": len(removed),
+            "resynced": len(resync)}
+
+
+def _delta_lock(name: str) -> threading.Lock:
+    with _open_lock:
+        return _delta_locks.setdefault(name, threading.Lock())
+
+
+def _live_dedup(loaded: _Loaded):
+    """
+    Filtro de quase duplicados com o estado do índice carregado (None com
+    DEDUP_ENABLED=false). Na primeira vez registra todos os chunks; depois só
+    os que chegaram por lotes de outros workers, e esquece os que saíram por
+    lotes de remoção. Chame com _delta_lock da coleção.
+    """
+    if not settings.dedup_enabled:
+        return None
+    if loaded.dedup is None:
+        from .dedup import NearDuplicates
+
+        loaded.dedup = NearDuplicates()
+    dedup = loaded.dedup
+    removed = getattr(loaded.vs.index, "removed", frozenset())
+    gone: Set[str] = set()
+    for i, doc_id in list(loaded.vs.index_to_docstore_id.items()):
+        if i in removed:
+            gone.add(doc_id)
+        elif doc_id not in dedup:
+            doc = loaded.vs.docstore.search(doc_id)
+            if hasattr(doc, "metadata"):
+                dedup.seed(doc_id, doc)
+    if gone:
+        dedup.forget(ids=gone)
+    return dedup
+
+
+def indexed_sources(collection: Optional[str] = None) -> Set[str]:
+    """Fontes com chunks buscáveis na coleção (inclui as origens de quase duplicados; sem as removidas)."""
+    vs, _meta = build_or_load_vectorstore(collection=collection)
+    removed = getattr(vs.index, "removed", ())
+    out: Set[str] = set()
+    for i, doc_id in list(vs.index_to_docstore_id.items()):
+        if i in removed:
+            continue
+        meta = getattr(vs.docstore.search(doc_id), "metadata", None) or {}
+        out.add(str(meta.get("source", "unknown")))
+        out.update(str(o.get("source")) for o in meta.get("duplicate_sources") or [])
+    return out
+
+
+def _delta_done(loaded: _Loaded, stats: Dict[str, Any], t: float) -> Dict[str, Any]:
+    """Métricas, telemetria e compactação depois de aplicar lotes no delta."""
+    name = loaded.name
+    seg = loaded.vs.index
+    segments.record(name, seg)
+    loaded.meta["vectors"] = _faiss_count(loaded.vs)
+    elapsed_ms = (time.perf_counter() - t) * 1000
+    metrics.inc("index_delta_chunks_total", stats["chunks"], collection=name)
+    metrics.observe("index_delta_add_ms", elapsed_ms, collection=name)
+    print(f"[RAG] [{name}] {stats['docs']} documentos -> {stats['chunks']} chunks no delta "
+          f"({elapsed_ms:.0f} ms; delta com {seg.delta.ntotal} vetores, {len(seg.removed)} removidos)")
+    if name == collections_config.DEFAULT:
+        try:
+            from .state import set_vectors, mark_ingest_now
+            set_vectors(loaded.meta["vectors"] or 0)
+            mark_ingest_now()
+        except Exception:
+            pass
+    _maybe_compact(loaded)
+    out = {"collection": name, "documents": stats["docs"], "chunks": stats["chunks"],
+           "vectors": loaded.meta["vectors"], "elapsed_ms": round(elapsed_ms, 1), **segments.describe(seg)}
+    if "duplicates_removed" in stats:
+        out["duplicates_removed"] = stats["duplicates_removed"]
+    return out
+
+
+def _sync_delta(loaded: _Loaded):
+    """Watcher: aplica lotes gravados por outros workers e dispara a compactação se for a hora."""
+    if loaded.reloading or not isinstance(loaded.vs.index, segments.SegmentedIndex):
+        return
+    if segments.sync(loaded.vs, loaded.persist_dir, loaded.generation):
+        loaded.meta["vectors"] = _faiss_count(loaded.vs)
+        segments.record(loaded.name, loaded.vs.index)
+    _maybe_compact(loaded)
+
+
+def _maybe_compact(loaded: _Loaded):
+    if loaded.compacting or not segments.needs_compaction(loaded.vs.index):
+        return
+    with _open_lock:
+        if loaded.compacting:
+            return
+        loaded.compacting = True
+
+    def _run():
         try:
-            docs_extras = collect_documents()  # URLs/Notion/GDrive/M365 conforme connectors.json
-            print(f"[RAG] collect_documents() retornou {len(docs_extras)} docs.")
-            if docs_extras:
-                docs.extend(docs_extras)
+            compact(loaded.name)
         except Exception as e:
-            print(f"[RAG] Falha ao coletar de conectores: {e}")
+            print(f"[RAG] falha ao compactar '{loaded.name}': {e}")
+        finally:
+            loaded.compacting = False
 
-    # extra_docs explícitos (opcional)
-    if extra_docs:
-        docs.extend(extra_docs)
-
-    # Filtra vazios
-    docs = _filter_nonempty(docs)
-    print(f"[RAG] Documentos após filtro: {len(docs)}")
-    _debug_sample_docs(docs, n=8)
-
-    # Seta conjunto de fontes para meta
-    sources: Set[str] = set()
-    for d in docs:
-        meta = getattr(d, "metadata", {}) or {}
-        src = meta.get("source", "unknown")
-        sources.add(str(src))
-
-    if not docs:
-        print(f"[RAG] Nenhum documento com conteúdo encontrado. Construindo índice vazio.")
-        _vectorstore = _build_empty_faiss(embeddings)
-        _vectorstore.save_local(persist_dir)
-        _meta = {"vectors": 0, "sources": sorted(sources) if sources else []}
-        return _vectorstore, _meta
-
-    chunks = _split_documents(docs)
-    chunks = _filter_nonempty(chunks)
-    print(f"[RAG] Chunks após split/filtro: {len(chunks)}")
-    _debug_sample_chunks(chunks, n=8)
-
-    if not chunks:
-        print("[RAG] Nenhum chunk restante para indexar. Construindo índice vazio.")
-        _vectorstore = _build_empty_faiss(embeddings)
-        _vectorstore.save_local(persist_dir)
-        _meta = {"vectors": 0, "sources": sorted(sources)}
-        return _vectorstore, _meta
-
-    _vectorstore = FAISS.from_documents(chunks, embeddings)
-    _vectorstore.save_local(persist_dir)
-
-    _meta = {"vectors": _faiss_count(_vectorstore), "sources": sorted(sources)}
+    threading.Thread(target=_run, name="index-compact", daemon=True).start()
 
-    # telemetria (se existir)
+
+def compact(collection: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Junta principal + delta numa geração nova (formato de INDEX_STORAGE) e a
+    publica; os outros workers trocam de índice como depois de um ingest.
+    Só um worker compacta por vez (lock em PERSIST_DIR/delta).
+    """
+    import faiss  # type: ignore
+    from langchain_community.docstore.in_memory import InMemoryDocstore
+    from langchain_community.vectorstores import FAISS
+
+    name = collection or collections_config.DEFAULT
+    loaded = _get_loaded(name)
+    persist_dir = loaded.persist_dir
+    if index_store.current_generation(persist_dir) > loaded.generation:
+        return {"compacted": False, "reason": "há geração mais nova publicada (recarregando)"}
+    if not segments.try_lock(persist_dir):
+        return {"compacted": False, "reason": "compactação em andamento em outro worker"}
+    t = time.perf_counter()
     try:
-        from .state import set_vectors, mark_ingest_now
-        set_vectors(_meta["vectors"] or 0)
-        mark_ingest_now()
-    except Exception:
-        pass
+        with _lock_for(name):
+            if index_store.current_generation(persist_dir) > loaded.generation:
+                return {"compacted": False, "reason": "há geração mais nova publicada (recarregando)"}
+            seg: segments.SegmentedIndex = loaded.vs.index
+            with seg.lock:
+                names = sorted(seg.applied)
+                delta, removed = seg.view
+                nd = delta.ntotal
+                delta_vectors = delta.reconstruct_n(0, nd) if nd else np.zeros((0, seg.d), np.float32)
+                total = seg.main.ntotal + nd
+                # posições removidas (lotes de remoção) ficam de fora; as demais são renumeradas
+                keep = [i for i in range(total) if i not in removed]
+                mapping = {j: loaded.vs.index_to_docstore_id[i] for j, i in enumerate(keep)}
+                n_removed = total - len(keep)
+            if not names:
+                return {"compacted": False, "reason": "delta vazio"}
+            folder = index_store.index_dir(persist_dir, loaded.generation)
+            index = faiss.IndexFlatL2(seg.d)
+            index.add(np.vstack([segments.main_vectors(seg, folder), delta_vectors])[keep])
+            docs = {doc_id: loaded.vs.docstore.search(doc_id) for doc_id in mapping.values()}
+            vs = FAISS(embedding_function=loaded.vs.embedding_function, index=index,
+                       docstore=InMemoryDocstore(docs), index_to_docstore_id=mapping)
+            sources = sorted({str((d.metadata or {}).get("source", "unknown")) for d in docs.values()})
+            gen = index_store.save(vs, persist_dir, sources, {"compacted_deltas": names})
+            # lotes que chegaram durante a compactação continuam no delta da geração nova
+            fresh = _make_loaded(name, persist_dir, vs, gen, sources)
+            fresh.dedup = loaded.dedup  # mesmos chunks (ids), sem os removidos
+            _remember(fresh)
+        segments.remove_batches(persist_dir, names)
+    finally:
+        segments.unlock(persist_dir)
+    elapsed_ms = (time.perf_counter() - t) * 1000
+    metrics.inc("index_compactions_total", collection=name)
+    metrics.observe("index_compaction_ms", elapsed_ms, collection=name)
+    print(f"[RAG] [{name}] delta compactado: {len(names)} lotes, {nd} vetores, {n_removed} removidos "
+          f"-> geração {gen} ({elapsed_ms:.0f} ms)")
+    return {"compacted": True, "collection": name, "generation": gen, "vectors": int(index.ntotal),
+            "delta_batches": len(names), "delta_vectors": int(nd), "removed_vectors": n_removed,
+            "elapsed_ms": round(elapsed_ms, 1)}
+
+
+def _build_documents(cfg: Dict[str, Any], rebuild: bool, extra_docs: Optional[List[Document]]) -> Iterator[Document]:
+    """Pasta local da coleção + conectores (só em rebuild) + extra_docs, em sequência."""
+    from .connectors import iter_documents, metered
+
+    # 1) docs locais (coleções sem docs_dir não têm pasta local)
+    if cfg["docs_dir"]:
+        yield from metered("docs_dir", _iter_documents(cfg["docs_dir"]))
+
+    # 2) agrega conectores APENAS quando rebuild=True
+    if rebuild and cfg["connectors"] != []:
+        try:
+            yield from iter_documents(cfg["connectors"])  # conforme connectors.json
+        except Exception as e:
+            print(f"[RAG] Falha ao coletar de conectores: {e}")
 
-    return _vectorstore, _meta
+    # extra_docs explícitos (opcional)
+    if extra_docs:
+        yield from extra_docs
 
 
 def _ensure_vs(vs_or_tuple: Optional[Union[FAISS, Tuple[FAISS, dict]]]) -> FAISS:
@@ -272,12 +805,67 @@ def make_retriever(
     )
 
 
+def adaptive_retrieve(
+    vs: Optional[Union[FAISS, Tuple[FAISS, dict]]],
+    question: str,
+    max_k: Optional[int] = None,
+    min_k: Optional[int] = None,
+    lambda_mult: float = 0.5,
+) -> Tuple[List[Document], Dict[str, Any]]:
+    """
+    MMR com k escolhido pela distribuição de similaridade (services/relevance.py).
+    Retorna (docs, info). docs vazio = nada passou do piso: responda "não encontrado" sem LLM.
+    """
+    from langchain_community.vectorstores.utils import maximal_marginal_relevance
+
+    vs_only = _ensure_vs(vs)
+    max_k = max(1, max_k or settings.retrieval_max_k)
+    min_k = settings.retrieval_min_k if min_k is None else min_k
+    total = _faiss_count(vs_only) or 0
+    info: Dict[str, Any] = {"mode": "adaptive", "k": 0, "reason": "empty", "top_score": None, "candidates": 0}
+    if total == 0:
+        return [], info
+    query = np.asarray(vs_only.embedding_function.embed_query(question), dtype=np.float32)
+    _d, indices = vs_only.index.search(query[None, :], min(total, max(max_k * 4, 20)))
+    cand = [int(i) for i in indices[0] if i != -1]
+    if not cand:
+        # índice vazio ou tudo removido pelo delta (lotes de remoção): nada a recuperar
+        metrics.observe("retrieval_k", 0)
+        metrics.inc("retrieval_not_found_total")
+        return [], info
+    vecs = np.stack([vs_only.index.reconstruct(i) for i in cand])
+    scores = relevance.cosine_scores(query, vecs)
+    order = np.argsort(-scores, kind="stable")
+    cand, vecs, scores = [cand[j] for j in order], vecs[order], scores[order]
+
+    k, reason = relevance.choose_k(scores.tolist(), min_k, max_k)
+    info.update(k=k, reason=reason, top_score=round(float(scores[0]), 3), candidates=len(cand))
+    metrics.observe("retrieval_k", k)
+    if k == 0:
+        metrics.inc("retrieval_not_found_total")
+        return [], info
+    # MMR só entre quem passou do piso (diversidade sem trazer passagem irrelevante)
+    above = int((scores >= settings.retrieval_min_score).sum())
+    selected = maximal_marginal_relevance(query, list(vecs[:above]), k=k, lambda_mult=lambda_mult)
+    docs = [vs_only.docstore.search(vs_only.index_to_docstore_id[cand[j]]) for j in selected]
+    docs = relevance.fit_budget(docs)
+    info["k"] = len(docs)
+    if len(docs) < k:
+        info["reason"] = "budget"
+    metrics.observe("retrieval_context_chars", sum(len(d.page_content or "") for d in docs))
+    return docs, info
+
+
 def make_qa_chain(vs: Optional[Union[FAISS, Tuple[FAISS, dict]]] = None):
     """
     Suporta top_k dinâmico: se o input for {"question": "...", "top_k": 8},
     o retriever será criado com k=8 (MMR).
     """
 
+    from langchain_core.output_parsers import StrOutputParser
+    from langchain_core.runnables import RunnableLambda
+    from .llm import get_llm
+
     def _normalize(x: Union[str, Dict[str, Any]]) -> Dict[str, Any]:
         if isinstance(x, str):
             return {"question": x, "top_k": None}
@@ -290,14 +878,8 @@ def make_qa_chain(vs: Optional[Union[FAISS, Tuple[FAISS, dict]]] = None):
         retr = make_retriever(vs, k=k)
         return retr.invoke(d["question"])
 
-    prompt = PromptTemplate(
-        input_variables=["context", "question"],
-        template=(
-            "Você é o BIA, agente interno da Bemobi. Use o contexto para responder objetivamente. "
-            "Se não houver info suficiente, diga que não encontrou.\n\n"
-            "Contexto:\n{context}\n\nPergunta: {question}\n\nResposta:"
-        ),
-    )
+    # template compilado e cacheado pelo registro (recarrega sozinho se o arquivo mudar)
+    prompt = get_prompt("chat_answer.txt").template
 
     llm = get_llm()
 
@@ -312,3 +894,204 @@ def make_qa_chain(vs: Optional[Union[FAISS, Tuple[FAISS, dict]]] = None):
         | StrOutputParser()
     )
     return chain
+
+
+
+# ===================== BATCH (várias perguntas por chamada) ===================== #
+def embed_texts(vs: FAISS, texts: List[str]) -> np.ndarray:
+    """Embeda todos os textos numa única chamada ao modelo."""
+    emb = vs.embedding_function
+    if hasattr(emb, "embed_documents"):
+        vectors = emb.embed_documents(list(texts))
+    else:
+        vectors = [emb(t) for t in texts]
+    return np.array(vectors, dtype=np.float32)
+
+
+def batch_retrieve(
+    vs: Optional[Union[FAISS, Tuple[FAISS, dict]]],
+    questions: List[str],
+    k: int = 4,
+    fetch_k: Optional[int] = None,
+    lambda_mult: float = 0.5,
+    query_vectors: Optional[np.ndarray] = None,
+    filters: Optional[List[Optional[Callable[[dict], bool]]]] = None,
+    adaptive: bool = False,
+) -> Tuple[List[List[Document]], int]:
+    """
+    Recuperação em lote: um embed para todas as perguntas, uma busca FAISS em lote
+    e MMR por pergunta. Chunks que aparecem para várias perguntas são lidos do
+    docstore (e reconstruídos do índice) uma única vez.
+
+    query_vectors: vetores já calculados (pula o embed).
+    filters: um filtro de metadata por pergunta (ou None). Se o filtro não deixar
+    nenhum candidato, usa os candidatos sem filtro.
+    adaptive: k é o teto e cada pergunta usa o k da distribuição de similaridade
+    (services/relevance.py); lista vazia = nada passou do piso.
+    Retorna (docs por pergunta, nº de chunks únicos).
+    """
+    from langchain_community.vectorstores.utils import maximal_marginal_relevance
+
+    vs_only = _ensure_vs(vs)
+    total = _faiss_count(vs_only) or 0
+    if not questions or total == 0:
+        return [[] for _ in questions], 0
+    if fetch_k is None:
+        fetch_k = max(k * 4, 20)
+    fetch_k = min(fetch_k, total)
+    # com filtro, busca mais candidatos para sobrar o suficiente depois de filtrar
+    search_k = min(total, fetch_k * 4) if filters and any(filters) else fetch_k
+
+    queries = query_vectors if query_vectors is not None else embed_texts(vs_only, questions)
+    queries = np.asarray(queries, dtype=np.float32)
+    _scores, indices = vs_only.index.search(queries, search_k)
+
+    docs_by_id: Dict[int, Document] = {}
+    vecs_by_id: Dict[int, np.ndarray] = {}
+    out: List[List[Document]] = []
+    for qi in range(len(questions)):
+        cand = [int(i) for i in indices[qi] if i != -1]
+        for i in cand:
+            if i not in docs_by_id:
+                docs_by_id[i] = vs_only.docstore.search(vs_only.index_to_docstore_id[i])
+        flt = filters[qi] if filters else None
+        if flt is not None:
+            kept = [i for i in cand if flt(docs_by_id[i].metadata or {})]
+            cand = kept or cand
+        cand = cand[:fetch_k]
+        if not cand:  # tudo removido pelo delta
+            if adaptive:
+                metrics.observe("retrieval_k", 0)
+                metrics.inc("retrieval_not_found_total")
+            out.append([])
+            continue
+        for i in cand:
+            if i not in vecs_by_id:
+                vecs_by_id[i] = vs_only.index.reconstruct(i)
+        k_q = k
+        if adaptive:
+            scores = relevance.cosine_scores(queries[qi], np.stack([vecs_by_id[i] for i in cand]))
+            order = np.argsort(-scores, kind="stable")
+            k_q, _reason = relevance.choose_k(scores[order].tolist(), settings.retrieval_min_k, k)
+            metrics.observe("retrieval_k", k_q)
+            cand = [cand[j] for j in order[: int((scores >= settings.retrieval_min_score).sum())]]
+            if k_q == 0:
+                metrics.inc("retrieval_not_found_total")
+                out.append([])
+                continue
+        selected = maximal_marginal_relevance(
+            queries[qi], [vecs_by_id[i] for i in cand], k=k_q, lambda_mult=lambda_mult
+        )
+        docs = [docs_by_id[cand[j]] for j in selected]
+        out.append(relevance.fit_budget(docs) if adaptive else docs)
+    return out, len(docs_by_id)
+
+
+# ===================== FAN-OUT (várias coleções) ===================== #
+def fanout_search(question: str, collections: List[str], k: int = 4) -> List[Document]:
+    """
+    Busca a pergunta em várias coleções e junta os resultados pela distância
+    (mesmo modelo de embedding em todas, então as distâncias são comparáveis).
+    A pergunta é embedada uma vez só. Cada doc volta com metadata["collection"].
+    KeyError se alguma coleção não existir.
+    """
+    from langchain_core.documents import Document
+
+    names = list(dict.fromkeys(c or collections_config.DEFAULT for c in collections))
+    stores = [(name, build_or_load_vectorstore(collection=name)[0]) for name in names]
+    query = get_embeddings().embed_query(question)
+    scored: List[Tuple[float, Document]] = []
+    for name, vs in stores:
+        if not _faiss_count(vs):
+            continue
+        for doc, dist in vs.similarity_search_with_score_by_vector(query, k=k):
+            # cópia: o Document do docstore é compartilhado entre requests
+            scored.append((float(dist), Document(page_content=doc.page_content,
+                                                 metadata={**(doc.metadata or {}), "collection": name})))
+    scored.sort(key=lambda x: x[0])
+    return [d for _, d in scored[:k]]
+
+
+def answer_with_docs(question: str, docs: List[Document]) -> str:
+    """Chama o LLM com o prompt do chat sobre documentos já recuperados."""
+    from langchain_core.output_parsers import StrOutputParser
+    from .llm import get_llm
+
+    chain = get_prompt("chat_answer.txt").template | get_llm() | StrOutputParser()
+    return chain.invoke({"context": _format_docs(docs), "question": question})
+
+
+def answer_batch(
+    questions: List[str],
+    top_k: int = 4,
+    max_concurrency: Optional[int] = None,
+    collection: Optional[str] = None,
+) -> Iterator[Dict[str, Any]]:
+    """
+    Responde várias perguntas de uma vez. A recuperação é feita em lote
+    (batch_retrieve) e as chamadas ao LLM rodam em paralelo, limitadas a
+    max_concurrency (default e teto: settings.chat_batch_concurrency — um valor
+    maior só encheria a fila do scheduler e travaria o /api/chat interativo).
+
+    Gera um dict por pergunta NA ORDEM DE CONCLUSÃO
+    ({index, question, answer, docs, latency_ms} ou {index, question, error})
+    e, por último, {"summary": {...}} com a vazão em perguntas/s.
+    """
+    from langchain_core.output_parsers import StrOutputParser
+    from .llm import get_llm
+
+    t0 = time.perf_counter()
+    vs, _ = build_or_load_vectorstore(rebuild=False, collection=collection)
+    k = top_k or 4
+    adaptive = settings.retrieval_mode == "adaptive"
+    docs_per_q, unique_chunks = batch_retrieve(vs, questions, k=k, adaptive=adaptive)
+    retrieval_s = time.perf_counter() - t0
+
+    chat_prompt = get_prompt("chat_answer.txt")
+    chain = chat_prompt.template | get_llm() | StrOutputParser()
+
+    def _run(i: int) -> Tuple[str, float]:
+        t = time.perf_counter()
+        if adaptive and not docs_per_q[i]:
+            return settings.retrieval_not_found_answer, time.perf_counter() - t  # nada relevante: sem LLM
+        with llm_slot("batch"):
+            answer = chain.invoke({"context": _format_docs(docs_per_q[i]), "question": questions[i]})
+        return answer, time.perf_counter() - t
+
+    limit = max(1, min(max_concurrency or settings.chat_batch_concurrency, settings.chat_batch_concurrency))
+    ok = errors = 0
+    pool = ThreadPoolExecutor(max_workers=limit, thread_name_prefix="chat-batch")
+    futures = {pool.submit(_run, i): i for i in range(len(questions))}
+    try:
+        for fut in as_completed(futures):
+            i = futures[fut]
+            item: Dict[str, Any] = {"index": i, "question": questions[i]}
+            try:
+                answer, dt = fut.result()
+                item.update(answer=answer, docs=docs_per_q[i], latency_ms=round(dt * 1000, 1))
+                ok += 1
+            except Exception as e:
+                item["error"] = str(e)
+                errors += 1
+            yield item
+    finally:
+        # cliente desconectou no meio do stream: não dispara o que ainda não começou
+        for fut in futures:
+            fut.cancel()
+        pool.shutdown(wait=False)
+
+    elapsed = time.perf_counter() - t0
+    yield {
+        "summary": {
+            "questions": len(questions),
+            "collection": collection or collections_config.DEFAULT,
+            "ok": ok,
+            "errors": errors,
+            "unique_chunks": unique_chunks,
+            "max_concurrency": limit,
+            "retrieval_ms": round(retrieval_s * 1000, 1),
+            "elapsed_s": round(elapsed, 3),
+            "throughput_qps": round(len(questions) / elapsed, 3) if elapsed > 0 else None,
+            "prompt_version": chat_prompt.version,
+        }
+    }
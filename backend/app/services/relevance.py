@@ -0,0 +1,72 @@
+# app/services/relevance.py
+"""
+Profundidade adaptativa da recuperação (RETRIEVAL_MODE=adaptive).
+
+Em vez de sempre mandar k passagens ao LLM, o k de cada pergunta sai da
+distribuição de similaridade (cosseno entre a pergunta e os candidatos do
+FAISS, que independe de o modelo normalizar os vetores):
+
+  piso      candidatos abaixo de RETRIEVAL_MIN_SCORE não contam; se nenhum
+            passa, a resposta é "não encontrado", sem chamar o LLM
+  relativo  fica quem tem >= RETRIEVAL_REL_THRESHOLD x a melhor similaridade
+  gap       corta no primeiro degrau >= RETRIEVAL_GAP entre vizinhos
+  limites   k entre RETRIEVAL_MIN_K e o max_k do pedido (top_k)
+  orçamento depois do MMR, as passagens param em RETRIEVAL_CONTEXT_CHARS caracteres
+"""
+from __future__ import annotations
+
+from typing import TYPE_CHECKING, List, Sequence, Tuple
+
+import numpy as np
+
+from ..config import settings
+
+if TYPE_CHECKING:
+    from langchain_core.documents import Document
+
+
+def cosine_scores(query: np.ndarray, vectors: np.ndarray) -> np.ndarray:
+    q = np.asarray(query, dtype=np.float32).ravel()
+    v = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(v, axis=1) * (np.linalg.norm(q) or 1.0)
+    return (v @ q) / np.where(norms == 0, 1.0, norms)
+
+
+def choose_k(scores: Sequence[float], min_k: int, max_k: int) -> Tuple[int, str]:
+    """
+    k para similaridades em ordem decrescente e o critério que o definiu
+    (floor, relative, gap, min_k, max_k). k=0: nada passou do piso.
+    """
+    above = sum(1 for s in scores if s >= settings.retrieval_min_score)
+    if above == 0:
+        return 0, "floor"
+    k, reason = above, "floor"
+    top = scores[0]
+    relative = sum(1 for s in scores[:k] if s >= top * settings.retrieval_rel_threshold)
+    if relative < k:
+        k, reason = relative, "relative"
+    if settings.retrieval_gap > 0:
+        for i in range(1, k):
+            if scores[i - 1] - scores[i] >= settings.retrieval_gap:
+                k, reason = i, "gap"
+                break
+    floor_k = min(max(1, min_k), above)  # min_k nunca traz passagem abaixo do piso
+    if k < floor_k:
+        k, reason = floor_k, "min_k"
+    if k > max_k:
+        k, reason = max_k, "max_k"
+    return k, reason
+
+
+def fit_budget(docs: List[Document]) -> List[Document]:
+    """Corta as passagens (já na ordem do MMR) no orçamento de caracteres; a primeira sempre fica."""
+    budget = settings.retrieval_context_chars
+    if budget <= 0:
+        return docs
+    out, used = [], 0
+    for d in docs:
+        used += len(d.page_content or "")
+        if out and used > budget:
+            break
+        out.append(d)
+    return out
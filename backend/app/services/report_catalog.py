@@ -0,0 +1,194 @@
+# app/services/report_catalog.py
+"""
+Catálogo dos relatórios de QA em SQLite.
+
+A listagem (/api/qa/reports) consulta só esta tabela, com índices em
+created_at e area, em vez de abrir e parsear todos os <id>.json a cada chamada.
+analyze_evidence registra cada relatório novo aqui. Se o arquivo do catálogo
+não existir (primeiro start, apagado, volume novo), ele é reconstruído a
+partir dos JSONs em settings.reports_dir.
+
+Guarda também o estado dos jobs de QA em lote (services/qa_batch.py): o job
+roda num worker, mas GET /api/qa/batch/{job_id} pode cair em qualquer outro.
+"""
+import json
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from ..config import settings
+
+SORTABLE = {"created_at", "title", "area", "id"}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS reports (
+    id TEXT PRIMARY KEY,
+    title TEXT,
+    area TEXT,
+    case_title TEXT,
+    created_at TEXT,
+    report_json_path TEXT,
+    report_markdown_path TEXT
+);
+CREATE INDEX IF NOT EXISTS ix_reports_created_at ON reports (created_at);
+CREATE INDEX IF NOT EXISTS ix_reports_area_created_at ON reports (area, created_at);
+CREATE TABLE IF NOT EXISTS qa_batch_jobs (
+    job_id TEXT PRIMARY KEY,
+    status TEXT,
+    created_at TEXT,
+    data TEXT
+);
+CREATE INDEX IF NOT EXISTS ix_qa_batch_jobs_created_at ON qa_batch_jobs (created_at);
+"""
+
+_COLUMNS = ["id", "title", "area", "case_title", "created_at", "report_json_path", "report_markdown_path"]
+
+_init_lock = threading.Lock()
+_ready_for: Optional[str] = None  # caminho do catálogo já verificado neste processo
+
+
+def _db_path() -> Path:
+    return Path(settings.reports_catalog or (Path(settings.reports_dir) / "catalog.db"))
+
+
+def _connect() -> sqlite3.Connection:
+    conn = sqlite3.connect(str(_db_path()), timeout=10)
+    conn.row_factory = sqlite3.Row
+    return conn
+
+
+def _row_from_report(report: Dict[str, Any], json_path: Optional[str] = None) -> Tuple:
+    inputs = report.get("inputs") or {}
+    return (
+        report.get("id"),
+        report.get("title"),
+        report.get("area"),
+        inputs.get("case_title"),
+        report.get("created_at"),
+        json_path or report.get("report_json_path"),
+        report.get("report_markdown_path"),
+    )
+
+
+def _upsert_rows(conn: sqlite3.Connection, rows: List[Tuple]):
+    conn.executemany(
+        f"INSERT OR REPLACE INTO reports ({', '.join(_COLUMNS)}) "
+        f"VALUES ({', '.join('?' for _ in _COLUMNS)})",
+        rows,
+    )
+
+
+def rebuild() -> int:
+    """Recria o catálogo varrendo '<reports_dir>/*.json'. Retorna nº de relatórios."""
+    reports_dir = Path(settings.reports_dir)
+    rows: List[Tuple] = []
+    for fp in reports_dir.glob("*.json"):
+        try:
+            data = json.loads(fp.read_text(encoding="utf-8"))
+        except Exception:
+            continue  # ignora arquivos inválidos
+        if not isinstance(data, dict):
+            continue
+        data.setdefault("id", fp.stem)
+        rows.append(_row_from_report(data, str(fp).replace("\\", "/")))
+
+    with _connect() as conn:
+        conn.executescript(_SCHEMA)
+        conn.execute("DELETE FROM reports")
+        _upsert_rows(conn, rows)
+    return len(rows)
+
+
+def ensure():
+    """Cria o catálogo (e reconstrói a partir do diretório) se ele não existir."""
+    global _ready_for
+    path = _db_path()
+    if _ready_for == str(path) and path.exists():
+        return
+    with _init_lock:
+        if _ready_for == str(path) and path.exists():
+            return
+        path.parent.mkdir(parents=True, exist_ok=True)
+        missing = not path.exists()
+        with _connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SCHEMA)
+        if missing:
+            n = rebuild()
+            print(f"[QA] catálogo de relatórios reconstruído: {n} relatórios")
+        _ready_for = str(path)
+
+
+def upsert(report: Dict[str, Any], json_path: Optional[str] = None):
+    ensure()
+    with _connect() as conn:
+        _upsert_rows(conn, [_row_from_report(report, json_path)])
+
+
+def get(report_id: str) -> Optional[Dict[str, Any]]:
+    ensure()
+    with _connect() as conn:
+        row = conn.execute("SELECT * FROM reports WHERE id = ?", (report_id,)).fetchone()
+    return dict(row) if row else None
+
+
+def list_reports(
+    limit: int = 100,
+    offset: int = 0,
+    area: Optional[str] = None,
+    q: Optional[str] = None,
+    sort: str = "created_at",
+    order: str = "desc",
+) -> Tuple[List[Dict[str, Any]], int]:
+    """Listagem paginada/filtrada. Retorna (itens, total que casa com o filtro)."""
+    ensure()
+    if sort not in SORTABLE:
+        raise ValueError(f"sort inválido: {sort} (use {sorted(SORTABLE)})")
+    direction = "ASC" if (order or "").lower() == "asc" else "DESC"
+
+    where, params = [], []
+    if area:
+        where.append("area = ?")
+        params.append(area)
+    if q:
+        where.append("(title LIKE ? OR case_title LIKE ?)")
+        params += [f"%{q}%", f"%{q}%"]
+    clause = f"WHERE {' AND '.join(where)}" if where else ""
+
+    with _connect() as conn:
+        total = conn.execute(f"SELECT COUNT(*) FROM reports {clause}", params).fetchone()[0]
+        rows = conn.execute(
+            f"SELECT id, title, area, created_at, report_json_path, report_markdown_path "
+            f"FROM reports {clause} ORDER BY {sort} {direction}, id {direction} LIMIT ? OFFSET ?",
+            params + [limit, offset],
+        ).fetchall()
+    return [dict(r) for r in rows], total
+
+
+# ---------------- jobs de QA em lote ----------------
+def save_job(job: Dict[str, Any]):
+    ensure()
+    with _connect() as conn:
+        conn.execute(
+            "INSERT OR REPLACE INTO qa_batch_jobs (job_id, status, created_at, data) VALUES (?, ?, ?, ?)",
+            (job["job_id"], job["status"], job["created_at"], json.dumps(job, ensure_ascii=False, default=str)),
+        )
+
+
+def get_job(job_id: str) -> Optional[Dict[str, Any]]:
+    ensure()
+    with _connect() as conn:
+        row = conn.execute("SELECT data FROM qa_batch_jobs WHERE job_id = ?", (job_id,)).fetchone()
+    return json.loads(row["data"]) if row else None
+
+
+def trim_jobs(keep: int):
+    """Apaga os jobs finalizados mais antigos, deixando no máximo `keep` jobs."""
+    ensure()
+    with _connect() as conn:
+        conn.execute(
+            "DELETE FROM qa_batch_jobs WHERE status != 'running' AND job_id NOT IN "
+            "(SELECT job_id FROM qa_batch_jobs ORDER BY created_at DESC LIMIT ?)",
+            (keep,),
+        )
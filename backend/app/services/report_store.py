@@ -0,0 +1,130 @@
+# app/services/report_store.py
+"""
+Armazenamento dos relatórios de QA.
+
+Cada relatório é gravado UMA vez, de forma atômica (tmp + rename):
+  <id>.md                  markdown
+  <id>.extracted.txt.gz    texto extraído das evidências (gzip)
+  <id>.llm_raw.txt.gz      saída crua do LLM (gzip)
+  <id>.json                registro-resumo compacto; aponta para os blobs acima
+
+O .json é o último a ser escrito: se ele existe, o relatório está completo.
+load_report() só abre os blobs quando pedido (include_blobs=True) e continua
+lendo relatórios antigos, que têm o texto inline no JSON.
+"""
+import gzip
+import json
+import os
+import uuid
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from . import report_catalog
+from ..config import settings
+
+# campo do relatório -> sufixo do blob
+_BLOBS = {
+    "extracted_text": ".extracted.txt.gz",
+    "llm_raw": ".llm_raw.txt.gz",
+}
+
+
+def _reports_dir() -> Path:
+    d = Path(settings.reports_dir)
+    d.mkdir(parents=True, exist_ok=True)
+    return d
+
+
+def _norm(p: Path) -> str:
+    return str(p).replace("\\", "/")
+
+
+def _atomic_write(path: Path, data: bytes):
+    tmp = path.with_name(f".{path.name}.{uuid.uuid4().hex}.tmp")
+    with tmp.open("wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+def _resolve(name_or_path: str) -> Path:
+    p = Path(name_or_path)
+    return p if p.is_absolute() else _reports_dir() / p.name
+
+
+def save_report(report: Dict[str, Any], markdown: str) -> Dict[str, Any]:
+    """
+    Grava markdown, blobs e resumo; registra no catálogo.
+    `report` vem completo (com extracted.text e llm_raw) e é devolvido completo,
+    já com report_markdown_path preenchido.
+    """
+    rid = report["id"]
+    d = _reports_dir()
+
+    md_path = d / f"{rid}.md"
+    _atomic_write(md_path, markdown.encode("utf-8"))
+    report["report_markdown_path"] = _norm(md_path)
+
+    summary = dict(report)
+    extracted = dict(summary.get("extracted") or {})
+    payloads = {
+        "extracted_text": extracted.pop("text", None),
+        "llm_raw": summary.pop("llm_raw", None),
+    }
+    summary["extracted"] = extracted
+
+    blobs: Dict[str, str] = {}
+    for field, payload in payloads.items():
+        if payload is None:
+            continue
+        blob_path = d / f"{rid}{_BLOBS[field]}"
+        _atomic_write(blob_path, gzip.compress(payload.encode("utf-8"), compresslevel=6))
+        blobs[field] = blob_path.name
+    summary["blobs"] = blobs
+
+    json_path = d / f"{rid}.json"
+    _atomic_write(json_path, json.dumps(summary, ensure_ascii=False, separators=(",", ":")).encode("utf-8"))
+
+    report_catalog.upsert(summary, _norm(json_path))
+    return report
+
+
+def _json_path(report_id: str) -> Path:
+    row = report_catalog.get(report_id)
+    if row and row.get("report_json_path"):
+        return _resolve(row["report_json_path"])
+    return _reports_dir() / f"{report_id}.json"
+
+
+def load_blob(report_id: str, field: str, summary: Optional[Dict[str, Any]] = None) -> Optional[str]:
+    """Lê um blob (extracted_text | llm_raw) do relatório, descomprimindo."""
+    name = ((summary or {}).get("blobs") or {}).get(field) or f"{report_id}{_BLOBS[field]}"
+    p = _reports_dir() / name
+    if not p.exists():
+        return None
+    return gzip.decompress(p.read_bytes()).decode("utf-8")
+
+
+def load_report(report_id: str, include_blobs: bool = True) -> Optional[Dict[str, Any]]:
+    """Resumo do relatório; com include_blobs, remonta extracted.text e llm_raw."""
+    jpath = _json_path(report_id)
+    if not jpath.exists():
+        return None
+    data = json.loads(jpath.read_text(encoding="utf-8"))
+    blobs = data.pop("blobs", None)
+    if include_blobs and blobs is not None:
+        data.setdefault("extracted", {})
+        data["extracted"]["text"] = load_blob(report_id, "extracted_text", {"blobs": blobs})
+        data["llm_raw"] = load_blob(report_id, "llm_raw", {"blobs": blobs})
+    elif not include_blobs:
+        # relatórios antigos trazem o conteúdo inline: remove para manter a resposta leve
+        (data.get("extracted") or {}).pop("text", None)
+        data.pop("llm_raw", None)
+    return data
+
+
+def markdown_file(report_id: str) -> Optional[Path]:
+    """Caminho do .md via catálogo (sem abrir o JSON); fallback <reports_dir>/<id>.md."""
+    row = report_catalog.get(report_id)
+    md = row.get("report_markdown_path") if row else None
+    md_file = _resolve(md) if md else _reports_dir() / f"{report_id}.md"
+    return md_file if md_file.exists() else None
@@ -0,0 +1,157 @@
+# app/services/scheduler.py
+"""
+Controle de admissão na frente do LLM.
+
+- no máximo settings.llm_max_concurrency chamadas ao LLM ao mesmo tempo;
+- fila por prioridade: chat (interativo) passa na frente de QA e de lotes;
+- fila limitada (settings.llm_max_queue): acima disso rejeita na hora (429);
+  com a fila cheia, um pedido mais prioritário toma o lugar do último da
+  fila de menor prioridade (que recebe o 429 no lugar dele);
+- cada pedido tem um deadline: se ele vence na fila, ou se a estimativa de
+  espera já passa do deadline na chegada, rejeita com 503 em vez de esperar.
+
+Uso:
+    with llm_slot("chat"):
+        answer = chain.invoke(...)
+"""
+import heapq
+import itertools
+import threading
+import time
+from contextlib import contextmanager
+from typing import Optional, Dict, Any, List
+
+from . import metrics
+from ..config import settings
+
+# menor = mais prioritário
+PRIORITIES = {"chat": 0, "qa": 10, "batch": 20}
+
+
+class Rejected(Exception):
+    """Pedido recusado pelo controle de admissão (429 = fila cheia, 503 = deadline)."""
+
+    def __init__(self, status_code: int, detail: str, retry_after: int = 1):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+        self.retry_after = retry_after
+
+
+class LLMScheduler:
+    def __init__(self, max_concurrency: int, max_queue: int):
+        self.max_concurrency = max(1, max_concurrency)
+        self.max_queue = max(1, max_queue)
+        self._cv = threading.Condition()
+        self._active = 0
+        self._queue: List[list] = []  # heap de [prioridade, seq, concedido (None = despejado)]
+        self._seq = itertools.count()
+        self._service_ewma: Optional[float] = None  # tempo médio de uso do slot (s)
+
+    def _estimate_wait(self, ahead: int) -> Optional[float]:
+        if self._service_ewma is None:
+            return None
+        return (ahead + 1) / self.max_concurrency * self._service_ewma
+
+    def _gauges(self):
+        metrics.set_gauge("llm_inflight", self._active)
+        metrics.set_gauge("llm_queue_depth", len(self._queue))
+
+    def acquire(self, kind: str, deadline: Optional[float] = None) -> float:
+        """Bloqueia até ganhar um slot; devolve o tempo de espera em segundos."""
+        prio = PRIORITIES.get(kind, PRIORITIES["qa"])
+        t0 = time.monotonic()
+        with self._cv:
+            if self._active < self.max_concurrency and not self._queue:
+                self._active += 1
+                self._gauges()
+                return 0.0
+
+            if deadline is not None:
+                ahead = sum(1 for w in self._queue if w[0] <= prio)
+                est = self._estimate_wait(ahead)
+                if est is not None and t0 + est > deadline:
+                    metrics.inc("llm_rejected_total", kind=kind, reason="deadline_estimate")
+                    raise Rejected(503, "LLM sobrecarregado: o pedido não seria atendido dentro do prazo",
+                                   retry_after=max(1, int(est)))
+
+            if len(self._queue) >= self.max_queue:
+                victim = max(self._queue)  # menor prioridade; entre iguais, o que chegou por último
+                if victim[0] <= prio:
+                    metrics.inc("llm_rejected_total", kind=kind, reason="queue_full")
+                    raise Rejected(429, "LLM ocupado: fila cheia, tente novamente em instantes")
+                self._queue.remove(victim)
+                heapq.heapify(self._queue)
+                victim[2] = None
+                self._cv.notify_all()
+
+            waiter = [prio, next(self._seq), False]
+            heapq.heappush(self._queue, waiter)
+            self._gauges()
+            while waiter[2] is False:
+                timeout = None if deadline is None else deadline - time.monotonic()
+                if timeout is not None and timeout <= 0:
+                    self._queue.remove(waiter)
+                    heapq.heapify(self._queue)
+                    self._gauges()
+                    metrics.inc("llm_rejected_total", kind=kind, reason="deadline_expired")
+                    raise Rejected(503, "LLM sobrecarregado: prazo do pedido expirou na fila")
+                self._cv.wait(timeout)
+            if waiter[2] is None:
+                metrics.inc("llm_rejected_total", kind=kind, reason="evicted")
+                raise Rejected(429, "LLM ocupado: fila cheia com pedidos mais prioritários, tente novamente em instantes")
+        return time.monotonic() - t0
+
+    def release(self, service_s: float):
+        with self._cv:
+            if self._service_ewma is None:
+                self._service_ewma = service_s
+            else:
+                self._service_ewma = 0.8 * self._service_ewma + 0.2 * service_s
+            if self._queue:
+                # passa o slot direto para o próximo da fila (active não muda)
+                heapq.heappop(self._queue)[2] = True
+                self._cv.notify_all()
+            else:
+                self._active -= 1
+            self._gauges()
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._cv:
+            return {
+                "max_concurrency": self.max_concurrency,
+                "max_queue": self.max_queue,
+                "inflight": self._active,
+                "queued": len(self._queue),
+                "service_ewma_ms": round(self._service_ewma * 1000, 1) if self._service_ewma else None,
+            }
+
+
+_scheduler = LLMScheduler(settings.llm_max_concurrency, settings.llm_max_queue)
+
+_DEFAULT_DEADLINES = {
+    "chat": settings.llm_chat_deadline_s,
+    "qa": settings.llm_qa_deadline_s,
+    "batch": settings.llm_batch_deadline_s,
+}
+
+
+def get_scheduler() -> LLMScheduler:
+    return _scheduler
+
+
+@contextmanager
+def llm_slot(kind: str = "chat", deadline: Optional[float] = None):
+    """
+    Reserva um slot do LLM para o bloco. deadline é absoluto (time.monotonic());
+    se omitido, usa o prazo padrão do tipo de pedido a partir de agora.
+    """
+    if deadline is None:
+        deadline = time.monotonic() + _DEFAULT_DEADLINES.get(kind, settings.llm_qa_deadline_s)
+    waited = _scheduler.acquire(kind, deadline)
+    metrics.observe("llm_queue_wait_ms", waited * 1000, kind=kind)
+    t = time.monotonic()
+    try:
+        yield
+    finally:
+        _scheduler.release(time.monotonic() - t)
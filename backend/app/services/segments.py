@@ -0,0 +1,319 @@
+# app/services/segments.py
+"""
+Índice segmentado: segmento principal (a geração publicada, ver index_store)
++ segmento delta, pequeno, flat e em memória, para documentos recém-chegados.
+
+Cada lote novo (ex.: /api/upload?reindex=true) vira um arquivo em
+PERSIST_DIR/delta/ com vetores + chunks (gravado de forma atômica). O worker
+que recebeu o upload aplica o lote na hora; os demais o aplicam no próximo
+ciclo do watcher (INDEX_RELOAD_CHECK_S). A busca consulta os dois segmentos e
+junta os resultados pela distância (SegmentedIndex, no lugar de vs.index).
+
+Lotes de remoção (removed_sources, ex.: arquivo apagado ou alterado na pasta,
+ver services/docs_watcher.py) marcam as posições daquelas fontes, no principal
+e no delta, como removidas: a busca as pula até a compactação descartá-las.
+
+Compactação (rag.compact): quando o delta passa de INDEX_DELTA_MAX_VECTORS ou
+o lote mais antigo passa de INDEX_DELTA_MAX_AGE_S, um worker (lock em arquivo)
+junta principal + delta numa geração nova, no formato de INDEX_STORAGE. A
+metadata dessa geração lista os lotes absorvidos (compacted_deltas), que os
+workers deixam de aplicar e que são apagados em seguida.
+"""
+from __future__ import annotations
+
+import os
+import pickle
+import threading
+import time
+import uuid
+from typing import TYPE_CHECKING, Any, Dict, FrozenSet, List, Optional, Set, Tuple
+
+import numpy as np
+
+from . import index_store, metrics, quantization
+from ..config import settings
+
+if TYPE_CHECKING:
+    from langchain_core.documents import Document
+    from langchain_community.vectorstores import FAISS
+
+DELTA_DIR = "delta"
+_LOCK_FILE = ".compact.lock"
+_LOCK_STALE_S = 3600  # lock de um worker que morreu no meio da compactação
+
+
+def delta_dir(persist_dir: Optional[str] = None) -> str:
+    return os.path.join(persist_dir or settings.persist_dir, DELTA_DIR)
+
+
+class SegmentedIndex:
+    """
+    Principal (somente leitura, talvez mmap/comprimido) + delta (IndexFlatL2 em
+    memória). Posições 0..nb-1 são do principal e nb.. do delta, na ordem em que
+    os lotes foram aplicados; index_to_docstore_id do FAISS segue essa numeração.
+    Demais atributos (d, sa_code_size...) vêm do principal.
+
+    Delta e removidas nunca são alterados no lugar (o faiss não aceita add e
+    search concorrentes no mesmo índice): apply_batch monta cópias e troca a
+    referência `view` de uma vez, e a busca lê `view` uma vez só, sem lock.
+    """
+
+    def __init__(self, main):
+        import faiss  # type: ignore
+
+        self.main = main
+        # (delta, posições de fontes removidas, que saem na compactação)
+        self.view: Tuple[Any, FrozenSet[int]] = (faiss.IndexFlatL2(main.d), frozenset())
+        self.applied: Dict[str, float] = {}  # lote -> criado em (epoch)
+        self.lock = threading.Lock()  # serializa quem escreve (apply_batch, compactação)
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.main, name)
+
+    @property
+    def delta(self):
+        return self.view[0]
+
+    @property
+    def removed(self) -> FrozenSet[int]:
+        return self.view[1]
+
+    @property
+    def ntotal(self) -> int:
+        return self.main.ntotal + self.view[0].ntotal
+
+    def search(self, x, k: int):
+        delta, removed = self.view
+        if not removed:
+            return self._search(x, k, delta)
+        # busca a mais para compensar as removidas e as troca por -1 (mesmo formato do faiss)
+        total = self.main.ntotal + delta.ntotal
+        dists, ids = self._search(x, max(k, min(total, k + len(removed))), delta)
+        drop = np.isin(ids, np.fromiter(removed, dtype=np.int64, count=len(removed)))
+        dists = np.where(drop, np.inf, dists)
+        ids = np.where(drop, -1, ids)
+        order = np.argsort(dists, axis=1, kind="stable")[:, :k]
+        return np.take_along_axis(dists, order, axis=1), np.take_along_axis(ids, order, axis=1)
+
+    def _search(self, x, k: int, delta):
+        x = np.asarray(x, dtype=np.float32)
+        nb, nd = self.main.ntotal, delta.ntotal
+        if not nd:
+            return self.main.search(x, k)
+        dm, im = self.main.search(x, min(k, nb)) if nb else (np.empty((len(x), 0), np.float32),
+                                                              np.empty((len(x), 0), np.int64))
+        dd, idd = delta.search(x, min(k, nd))
+        dists = np.concatenate([dm, dd], axis=1)
+        ids = np.concatenate([im, np.where(idd == -1, -1, idd + nb)], axis=1)
+        dists = np.where(ids == -1, np.inf, dists)
+        order = np.argsort(dists, axis=1, kind="stable")[:, :k]
+        dists = np.take_along_axis(dists, order, axis=1)
+        ids = np.take_along_axis(ids, order, axis=1)
+        if ids.shape[1] < k:  # mesmo formato do faiss: completa com -1
+            pad = k - ids.shape[1]
+            dists = np.pad(dists, ((0, 0), (0, pad)), constant_values=np.inf)
+            ids = np.pad(ids, ((0, 0), (0, pad)), constant_values=-1)
+        return dists.astype(np.float32), ids
+
+    def reconstruct(self, i: int) -> np.ndarray:
+        i = int(i)
+        nb = self.main.ntotal
+        return self.main.reconstruct(i) if i < nb else self.view[0].reconstruct(i - nb)
+
+    def oldest(self) -> Optional[float]:
+        return min(self.applied.values()) if self.applied else None
+
+
+def main_index(index):
+    """O índice principal (sem o invólucro de segmentos)."""
+    return index.main if isinstance(index, SegmentedIndex) else index
+
+
+def main_vectors(index, folder: str) -> np.ndarray:
+    """float32 do principal: originais em disco, se comprimido (reconstruct de sq8/pq perde precisão)."""
+    base = main_index(index)
+    if isinstance(base, quantization.RerankIndex):
+        return np.asarray(base.full, dtype=np.float32)
+    path = os.path.join(folder, quantization.FULL_VECTORS_FILE)
+    if os.path.exists(path):
+        full = np.load(path, mmap_mode="r")
+        if full.shape == (base.ntotal, base.d):
+            return np.asarray(full, dtype=np.float32)
+    if not base.ntotal:
+        return np.zeros((0, base.d), np.float32)
+    return base.reconstruct_n(0, base.ntotal)
+
+
+# ---------------- lotes em disco ----------------
+def _batch_info(name: str) -> Optional[Tuple[float, int]]:
+    """(criado em, nº de vetores) pelo nome d-<time_ns>-<n>-<uid>.pkl."""
+    try:
+        _d, ts, n, _uid = name[:-4].split("-")
+        return int(ts) / 1e9, int(n)
+    except ValueError:
+        return None
+
+
+def list_batches(persist_dir: Optional[str] = None) -> List[str]:
+    """Lotes no disco, do mais antigo para o mais novo."""
+    try:
+        names = os.listdir(delta_dir(persist_dir))
+    except OSError:
+        return []
+    return sorted(n for n in names if n.startswith("d-") and n.endswith(".pkl") and _batch_info(n))
+
+
+def write_batch(
+    persist_dir: str,
+    vectors: Optional[np.ndarray],
+    chunks: List[Document],
+    removed_sources: Optional[List[str]] = None,
+) -> Tuple[str, Dict[str, Any]]:
+    """
+    Grava um lote (atômico: tmp + rename). Retorna (nome, conteúdo) para aplicar sem reler.
+    removed_sources: fontes cujos chunks já indexados saem da busca (aplicado antes dos chunks do lote).
+    """
+    folder = delta_dir(persist_dir)
+    os.makedirs(folder, exist_ok=True)
+    name = f"d-{time.time_ns()}-{len(chunks)}-{uuid.uuid4().hex[:8]}.pkl"
+    payload = {
+        "embeddings_model": settings.embeddings_model,
+        "vectors": np.asarray(vectors if vectors is not None else np.zeros((0, 0)), dtype=np.float32),
+        "ids": [c.id or uuid.uuid4().hex for c in chunks],
+        "docs": chunks,
+        "removed_sources": sorted(set(removed_sources or [])),
+    }
+    tmp = os.path.join(folder, f".{name}.tmp")
+    with open(tmp, "wb") as f:
+        pickle.dump(payload, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp, os.path.join(folder, name))
+    return name, payload
+
+
+def remove_batches(persist_dir: str, names: List[str]):
+    for name in names:
+        try:
+            os.remove(os.path.join(delta_dir(persist_dir), name))
+        except OSError:
+            pass
+
+
+def attach(vs: FAISS, persist_dir: str, generation: int) -> SegmentedIndex:
+    """Envolve vs.index com o delta e aplica os lotes que a geração ainda não absorveu."""
+    if not isinstance(vs.index, SegmentedIndex):
+        vs.index = SegmentedIndex(vs.index)
+    sync(vs, persist_dir, generation)
+    return vs.index
+
+
+def sync(vs: FAISS, persist_dir: str, generation: int) -> int:
+    """Aplica lotes novos do disco (de qualquer worker). Retorna quantos vetores entraram."""
+    seg: SegmentedIndex = vs.index
+    compacted = set(index_store.read_meta(persist_dir, generation).get("compacted_deltas") or [])
+    added = 0
+    for name in list_batches(persist_dir):
+        if name in seg.applied:
+            continue
+        if name in compacted:
+            # já está no principal; sobrou de uma compactação interrompida
+            remove_batches(persist_dir, [name])
+            continue
+        added += apply_batch(vs, persist_dir, name)
+    return added
+
+
+def apply_batch(vs: FAISS, persist_dir: str, name: str, payload: Optional[Dict[str, Any]] = None) -> int:
+    seg: SegmentedIndex = vs.index
+    with seg.lock:
+        if name in seg.applied:
+            return 0
+        if payload is None:
+            try:
+                with open(os.path.join(delta_dir(persist_dir), name), "rb") as f:
+                    payload = pickle.load(f)
+            except FileNotFoundError:
+                return 0  # compactado e apagado enquanto isso: virá na geração nova
+        vectors = payload["vectors"]
+        if payload.get("embeddings_model") != settings.embeddings_model or (len(vectors) and vectors.shape[1] != seg.d):
+            print(f"[RAG] lote {name} ignorado: outro modelo de embeddings/dimensão")
+            seg.applied[name] = _batch_info(name)[0]
+            return 0
+        delta, removed = seg.view
+        if payload.get("removed_sources"):
+            removed = removed | _positions_of(vs, removed, set(payload["removed_sources"]))
+        start = seg.main.ntotal + delta.ntotal
+        vs.docstore.add(dict(zip(payload["ids"], payload["docs"])))
+        # mapeamento antes dos vetores: uma busca concorrente nunca vê posição sem documento
+        for j, doc_id in enumerate(payload["ids"]):
+            vs.index_to_docstore_id[start + j] = doc_id
+        if len(vectors):  # lote só de remoção não tem vetores
+            import faiss  # type: ignore
+
+            delta = faiss.clone_index(delta)  # cópia: buscas em andamento seguem no delta antigo
+            delta.add(vectors)
+        seg.view = (delta, frozenset(removed))
+        seg.applied[name] = _batch_info(name)[0]
+        return len(payload["ids"])
+
+
+def _positions_of(vs: FAISS, removed: FrozenSet[int], sources: Set[str]) -> Set[int]:
+    """Posições (até aqui) ainda não removidas cujos chunks vêm dessas fontes."""
+    out: Set[int] = set()
+    for i, doc_id in list(vs.index_to_docstore_id.items()):
+        if i in removed:
+            continue
+        doc = vs.docstore.search(doc_id)
+        if getattr(doc, "metadata", None) and str(doc.metadata.get("source")) in sources:
+            out.add(i)
+    return out
+
+
+def needs_compaction(seg: SegmentedIndex) -> bool:
+    n = seg.delta.ntotal + len(seg.removed)
+    if not n:
+        return False
+    if settings.index_delta_max_vectors > 0 and n >= settings.index_delta_max_vectors:
+        return True
+    oldest = seg.oldest()
+    return settings.index_delta_max_age_s > 0 and oldest is not None and \
+        time.time() - oldest >= settings.index_delta_max_age_s
+
+
+# ---------------- lock entre workers ----------------
+def try_lock(persist_dir: str) -> bool:
+    folder = delta_dir(persist_dir)
+    os.makedirs(folder, exist_ok=True)
+    path = os.path.join(folder, _LOCK_FILE)
+    try:
+        if time.time() - os.path.getmtime(path) > _LOCK_STALE_S:
+            os.remove(path)
+    except OSError:
+        pass
+    try:
+        fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+    except FileExistsError:
+        return False
+    with os.fdopen(fd, "w") as f:
+        f.write(f"{os.getpid()} {time.time()}")
+    return True
+
+
+def unlock(persist_dir: str):
+    try:
+        os.remove(os.path.join(delta_dir(persist_dir), _LOCK_FILE))
+    except OSError:
+        pass
+
+
+def describe(seg) -> Dict[str, Any]:
+    if not isinstance(seg, SegmentedIndex):
+        return {"delta_vectors": 0, "delta_batches": 0, "delta_removed": 0, "delta_oldest_s": None}
+    oldest = seg.oldest()
+    return {"delta_vectors": int(seg.delta.ntotal), "delta_batches": len(seg.applied),
+            "delta_removed": len(seg.removed),
+            "delta_oldest_s": round(time.time() - oldest, 1) if oldest else None}
+
+
+def record(collection: str, seg: SegmentedIndex):
+    metrics.set_gauge("index_delta_vectors", seg.delta.ntotal, collection=collection)
+    metrics.set_gauge("index_delta_removed", len(seg.removed), collection=collection)
@@ -0,0 +1,269 @@
+# app/services/snapshot.py
+"""
+Snapshots portáteis do índice de uma coleção.
+
+Um snapshot é um .tar.gz com:
+    manifest.json       formato, coleção, EMBEDDINGS_MODEL, dimensão, nº de vetores,
+                        formato dos vetores (INDEX_STORAGE), chunk_size/chunk_overlap e
+                        sha256 + tamanho de cada arquivo
+    index.faiss         vetores
+    index.pkl           docstore (chunks + metadata) e mapeamento posição -> id
+    vectors.f32.npy     float32 originais, se o índice for comprimido (ver quantization.py)
+
+Exportar compacta antes os lotes pendentes do delta (segments.py): o que foi
+enviado ou sincronizado desde a última compactação só existe em
+PERSIST_DIR/delta/ e ficaria de fora. Importar confere os checksums e o modelo de embeddings e publica os arquivos
+como uma nova geração (index_store.publish_dir): nada é reprocessado nem
+re-embedado, e os workers trocam de índice como depois de um ingest.
+O index.pkl é um pickle: importe só snapshots de origem confiável.
+"""
+from __future__ import annotations
+
+import hashlib
+import io
+import json
+import os
+import shutil
+import tarfile
+import time
+from typing import Any, Dict, List, Optional
+
+from . import collections_config, index_store, quantization
+from ..config import settings
+
+FORMAT = "bia-index-snapshot/1"
+MANIFEST = "manifest.json"
+_FILES = ("index.faiss", "index.pkl", quantization.FULL_VECTORS_FILE)
+_BLOCK = 1024 * 1024
+_COMPACT_WAIT_S = 60  # espera pela compactação de outro worker antes de desistir do export
+
+
+class SnapshotError(Exception):
+    """Snapshot inválido ou incompatível (vira HTTP 400/409 no router)."""
+
+    def __init__(self, message: str, status_code: int = 400):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def _sha256(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(_BLOCK), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def _pending_batches(persist_dir: str) -> List[str]:
+    """Lotes do delta que a geração publicada ainda não absorveu."""
+    from . import segments
+
+    meta = index_store.read_meta(persist_dir, index_store.current_generation(persist_dir))
+    compacted = set(meta.get("compacted_deltas") or [])
+    return [n for n in segments.list_batches(persist_dir) if n not in compacted]
+
+
+def _lock_compacted(name: str, persist_dir: str):
+    """
+    Compacta o delta da coleção e devolve com o lock de compactação preso e
+    nenhum lote pendente: a geração publicada tem tudo até aqui e nenhuma
+    compactação a troca durante o export. SnapshotError(409) se não conseguir a tempo.
+    """
+    from . import rag, segments
+
+    deadline = time.monotonic() + _COMPACT_WAIT_S
+    while True:
+        if _pending_batches(persist_dir):
+            rag.compact(name)  # não compacta se outro worker já está compactando
+        if segments.try_lock(persist_dir):
+            if not _pending_batches(persist_dir):
+                return
+            segments.unlock(persist_dir)  # chegou lote novo: compacta de novo
+        if time.monotonic() > deadline:
+            raise SnapshotError(f"delta da coleção '{name}' não foi compactado em {_COMPACT_WAIT_S}s; "
+                                "tente de novo", status_code=409)
+        time.sleep(0.2)
+
+
+def export_snapshot(out_path: str, collection: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Grava o snapshot da coleção em out_path (geração publicada, depois de
+    compactar o delta). Retorna o manifest (+ sha256 do arquivo).
+    """
+    from . import segments
+
+    cfg = collections_config.get_collection(collection or collections_config.DEFAULT)
+    persist_dir = cfg["persist_dir"]
+    if not index_store.exists(persist_dir):
+        raise SnapshotError(f"coleção '{cfg['name']}' não tem índice em {persist_dir}", status_code=404)
+    _lock_compacted(cfg["name"], persist_dir)
+    try:
+        return _export(out_path, cfg, persist_dir)
+    finally:
+        segments.unlock(persist_dir)
+
+
+def _export(out_path: str, cfg: Dict[str, Any], persist_dir: str) -> Dict[str, Any]:
+    gen = index_store.current_generation(persist_dir)
+    folder = index_store.index_dir(persist_dir, gen)  # gerações publicadas não mudam mais
+    meta = index_store.read_meta(persist_dir, gen)
+
+    files: Dict[str, Dict[str, Any]] = {}
+    for name in _FILES:
+        path = os.path.join(folder, name)
+        if os.path.exists(path):
+            files[name] = {"sha256": _sha256(path), "bytes": os.path.getsize(path)}
+    manifest = {
+        "format": FORMAT,
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "collection": cfg["name"],
+        "generation": gen,
+        "embeddings_model": meta.get("embeddings_model") or settings.embeddings_model,
+        "embedding_dim": meta.get("embedding_dim"),
+        "vectors": meta.get("vectors"),
+        "storage": meta.get("storage", "flat"),
+        "sources": meta.get("sources"),
+        "built_at": meta.get("built_at"),
+        "chunk_size": cfg["chunk_size"],
+        "chunk_overlap": cfg["chunk_overlap"],
+        "files": files,
+    }
+
+    os.makedirs(os.path.dirname(os.path.abspath(out_path)), exist_ok=True)
+    tmp = f"{out_path}.{os.getpid()}.part"
+    try:
+        with tarfile.open(tmp, "w:gz", compresslevel=6) as tar:
+            # manifest primeiro: o import valida antes de ler os arquivos grandes
+            data = json.dumps(manifest, ensure_ascii=False, indent=2).encode("utf-8")
+            info = tarfile.TarInfo(MANIFEST)
+            info.size, info.mtime = len(data), int(time.time())
+            tar.addfile(info, io.BytesIO(data))
+            for name in files:
+                tar.add(os.path.join(folder, name), arcname=name)
+        os.replace(tmp, out_path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+    return {**manifest, "snapshot_sha256": _sha256(out_path), "snapshot_bytes": os.path.getsize(out_path)}
+
+
+def read_manifest(path: str) -> Dict[str, Any]:
+    try:
+        with tarfile.open(path, "r:*") as tar:
+            f = tar.extractfile(MANIFEST)
+            if f is None:
+                raise SnapshotError("snapshot sem manifest.json")
+            return json.load(f)
+    except (tarfile.TarError, KeyError, ValueError, OSError) as e:
+        raise SnapshotError(f"snapshot ilegível: {e}")
+
+
+def _check_compatible(manifest: Dict[str, Any], cfg: Dict[str, Any]) -> List[str]:
+    if manifest.get("format") != FORMAT:
+        raise SnapshotError(f"formato desconhecido: {manifest.get('format')!r} (esperado {FORMAT})")
+    if manifest.get("embeddings_model") != settings.embeddings_model:
+        # vetores de outro modelo não são comparáveis com as perguntas embedadas aqui
+        raise SnapshotError(
+            f"snapshot gerado com EMBEDDINGS_MODEL={manifest.get('embeddings_model')!r}, "
+            f"mas este ambiente usa {settings.embeddings_model!r}",
+            status_code=409,
+        )
+    files = manifest.get("files") or {}
+    for name in ("index.faiss", "index.pkl"):
+        if name not in files:
+            raise SnapshotError(f"snapshot sem {name}")
+    unknown = [n for n in files if n not in _FILES]
+    if unknown:
+        raise SnapshotError(f"arquivos inesperados no manifest: {unknown}")
+    warnings = []
+    for key in ("chunk_size", "chunk_overlap"):
+        if manifest.get(key) is not None and manifest.get(key) != cfg[key]:
+            warnings.append(f"{key} do snapshot ({manifest[key]}) difere da coleção ({cfg[key]}); "
+                            "vale até o próximo rebuild")
+    return warnings
+
+
+def import_snapshot(path: str, collection: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Valida e publica o snapshot como nova geração da coleção (default: a do manifest).
+    SnapshotError se estiver corrompido ou for incompatível.
+    """
+    manifest = read_manifest(path)
+    name = collection or manifest.get("collection") or collections_config.DEFAULT
+    try:
+        cfg = collections_config.get_collection(name)
+    except KeyError as e:
+        raise SnapshotError(str(e.args[0]), status_code=404)
+    warnings = _check_compatible(manifest, cfg)
+
+    t = time.perf_counter()
+    tmp_dir = index_store.new_tmp_dir(cfg["persist_dir"])
+    try:
+        expected = manifest["files"]
+        with tarfile.open(path, "r:*") as tar:
+            for member in tar:
+                # só os nomes conhecidos, direto na pasta (nada de caminhos vindos do tar)
+                if member.name not in expected or not member.isfile():
+                    continue
+                src = tar.extractfile(member)
+                dst = os.path.join(tmp_dir, member.name)
+                with open(dst, "wb") as out:
+                    shutil.copyfileobj(src, out, _BLOCK)
+        for fname, info in expected.items():
+            dst = os.path.join(tmp_dir, fname)
+            if not os.path.exists(dst):
+                raise SnapshotError(f"{fname} listado no manifest mas ausente do snapshot")
+            if _sha256(dst) != info.get("sha256"):
+                raise SnapshotError(f"checksum de {fname} não confere (snapshot corrompido)")
+        meta = {
+            "embeddings_model": manifest["embeddings_model"],
+            "embedding_dim": manifest.get("embedding_dim"),
+            "vectors": manifest.get("vectors"),
+            "storage": manifest.get("storage", "flat"),
+            "sources": manifest.get("sources"),
+            "built_at": manifest.get("built_at"),
+            "imported_from": {"collection": manifest.get("collection"), "generation": manifest.get("generation"),
+                              "created_at": manifest.get("created_at")},
+        }
+        gen = index_store.publish_dir(tmp_dir, cfg["persist_dir"], meta)
+    except BaseException:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+    return {
+        "collection": cfg["name"],
+        "generation": gen,
+        "vectors": manifest.get("vectors"),
+        "embeddings_model": manifest["embeddings_model"],
+        "import_ms": round((time.perf_counter() - t) * 1000, 1),
+        "warnings": warnings,
+    }
+
+
+def bootstrap(source: str, collection: Optional[str] = None) -> Optional[Dict[str, Any]]:
+    """
+    Réplica nova: se a coleção ainda não tem índice, importa o snapshot de
+    `source` (caminho local ou URL https). None se já havia índice.
+    O docstore é um pickle: a origem tem de ser confiável, e URL só por https
+    (sem TLS, quem estiver no caminho troca o arquivo, e os checksums vêm junto).
+    """
+    cfg = collections_config.get_collection(collection or collections_config.DEFAULT)
+    if index_store.exists(cfg["persist_dir"]):
+        return None
+    if source.startswith("http://"):
+        raise SnapshotError("INDEX_SNAPSHOT por URL só com https://")
+    if not source.startswith("https://"):
+        return import_snapshot(source, cfg["name"])
+
+    import httpx
+
+    tmp = os.path.join(index_store.new_tmp_dir(cfg["persist_dir"]), "snapshot.tar.gz")
+    try:
+        with httpx.stream("GET", source, follow_redirects=True, timeout=60) as r:
+            r.raise_for_status()
+            with open(tmp, "wb") as out:
+                for block in r.iter_bytes(_BLOCK):
+                    out.write(block)
+        return import_snapshot(tmp, cfg["name"])
+    finally:
+        shutil.rmtree(os.path.dirname(tmp), ignore_errors=True)
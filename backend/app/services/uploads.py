@@ -0,0 +1,180 @@
+# app/services/uploads.py
+"""
+Gravação de uploads em streaming.
+
+O conteúdo é copiado em blocos de tamanho fixo para um arquivo temporário no
+diretório de destino (nunca inteiro em memória), com SHA-256 calculado no
+caminho e limites por arquivo e por requisição. No fim, rename atômico.
+
+Nome final: mantém o nome original se estiver livre. Se já existir um arquivo
+com o mesmo nome e o MESMO conteúdo, nada é regravado (deduplicated=True); se o
+conteúdo for diferente, grava como <nome>_<hash[:12]><ext>. O nome é tomado com
+hard link (só cria se não existe), então dois uploads simultâneos com o mesmo
+nome, mesmo em workers diferentes, não se sobrescrevem.
+
+RequestSizeLimit (middleware) recusa multipart com Content-Length acima de
+UPLOAD_MAX_REQUEST_MB antes de o form ser lido.
+"""
+import hashlib
+import os
+import uuid
+from pathlib import Path
+from typing import BinaryIO, Dict, Any, Optional, Tuple
+
+from fastapi.responses import JSONResponse
+
+from ..config import settings
+
+CHUNK_SIZE = settings.upload_chunk_kb * 1024
+MB = 1024 * 1024
+
+# cache (path, mtime, size) -> sha256 dos arquivos já existentes no destino
+_hash_cache: Dict[Tuple[str, float, int], str] = {}
+
+
+class UploadTooLarge(Exception):
+    """Arquivo ou requisição acima do limite configurado (vira HTTP 413)."""
+
+
+class RequestBudget:
+    """Soma de bytes aceitos numa mesma requisição (todos os arquivos)."""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.used = 0
+
+    def take(self, n: int):
+        self.used += n
+        if self.max_bytes and self.used > self.max_bytes:
+            raise UploadTooLarge(
+                f"requisição excede o limite de {self.max_bytes // MB} MB"
+            )
+
+
+def default_budget() -> RequestBudget:
+    return RequestBudget(settings.upload_max_request_mb * MB)
+
+
+class RequestSizeLimit:
+    """
+    ASGI: 413 para multipart com Content-Length acima de UPLOAD_MAX_REQUEST_MB,
+    antes de o FastAPI ler o form (que já grava cada arquivo em disco). Sem
+    Content-Length (chunked), o limite por requisição de save_stream segue valendo.
+    Só nas rotas de upload/evidência (PATHS): o import de snapshot do admin
+    também é multipart e não tem limite de tamanho.
+    """
+
+    PATHS = ("/api/upload", "/api/qa/")
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        limit = settings.upload_max_request_mb * MB
+        if scope["type"] == "http" and limit and scope["path"].startswith(self.PATHS):
+            headers = dict(scope["headers"])
+            if headers.get(b"content-type", b"").startswith(b"multipart/form-data"):
+                try:
+                    declared = int(headers.get(b"content-length") or 0)
+                except ValueError:
+                    declared = 0
+                if declared > limit:
+                    response = JSONResponse(
+                        status_code=413, content={"detail": f"requisição excede o limite de {limit // MB} MB"}
+                    )
+                    await response(scope, receive, send)
+                    return
+        await self.app(scope, receive, send)
+
+
+def _claim(tmp: Path, dst: Path) -> bool:
+    """Publica tmp como dst só se dst ainda não existe (atômico, vale entre processos)."""
+    try:
+        os.link(tmp, dst)
+        return True
+    except FileExistsError:
+        return False
+    except OSError:
+        # filesystem sem hard link: O_EXCL reserva o nome e o rename troca o conteúdo
+        try:
+            os.close(os.open(dst, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+        except FileExistsError:
+            return False
+        os.replace(tmp, dst)
+        return True
+
+
+def file_sha256(path: Path) -> str:
+    st = path.stat()
+    key = (str(path), st.st_mtime, st.st_size)
+    cached = _hash_cache.get(key)
+    if cached:
+        return cached
+    h = hashlib.sha256()
+    with path.open("rb") as f:
+        for block in iter(lambda: f.read(CHUNK_SIZE), b""):
+            h.update(block)
+    digest = h.hexdigest()
+    _hash_cache[key] = digest
+    return digest
+
+
+def save_stream(
+    src: BinaryIO,
+    dest_dir: Path,
+    filename: str,
+    budget: Optional[RequestBudget] = None,
+    max_file_bytes: Optional[int] = None,
+) -> Dict[str, Any]:
+    """
+    Copia `src` para dest_dir/filename em blocos. Bloqueante: nas rotas async,
+    chame via run_in_threadpool.
+    Retorna {path, sha256, size, deduplicated}.
+    """
+    if max_file_bytes is None:
+        max_file_bytes = settings.upload_max_file_mb * MB
+    dest_dir.mkdir(parents=True, exist_ok=True)
+    tmp = dest_dir / f".{filename}.{uuid.uuid4().hex}.part"
+
+    h = hashlib.sha256()
+    size = 0
+    try:
+        with tmp.open("wb") as out:
+            while True:
+                block = src.read(CHUNK_SIZE)
+                if not block:
+                    break
+                size += len(block)
+                if max_file_bytes and size > max_file_bytes:
+                    raise UploadTooLarge(
+                        f"{filename}: excede o limite de {max_file_bytes // MB} MB por arquivo"
+                    )
+                if budget is not None:
+                    budget.take(len(block))
+                h.update(block)
+                out.write(block)
+    except BaseException:
+        tmp.unlink(missing_ok=True)
+        raise
+
+    digest = h.hexdigest()
+    base = dest_dir / filename
+    candidates = [base, dest_dir / f"{base.stem}_{digest[:12]}{base.suffix}"]
+    try:
+        while True:
+            dst = candidates.pop(0) if candidates else dest_dir / f"{base.stem}_{uuid.uuid4().hex[:12]}{base.suffix}"
+            if _claim(tmp, dst):
+                deduplicated = False
+                break
+            if file_sha256(dst) == digest:
+                deduplicated = True  # mesmo conteúdo já salvo
+                break
+    finally:
+        tmp.unlink(missing_ok=True)
+
+    return {
+        "path": str(dst).replace("\\", "/"),
+        "sha256": digest,
+        "size": size,
+        "deduplicated": deduplicated,
+    }
@@ -0,0 +1,180 @@
+# app/services/warmup.py
+"""
+Warm-up da API.
+
+Os módulos de serviço não importam langchain_community, faiss, o cliente do
+LLM nem o modelo de embeddings no topo do arquivo — a API sobe (e responde
+/health) sem pagar esse custo. Logo depois da subida, start() roda em
+segundo plano, em paralelo, os passos de WARMUP_STEPS:
+
+  imports     dependências pesadas (faiss, langchain, cliente do LLM)
+  prompts     compila os PromptTemplate
+  embeddings  carrega o modelo e faz a primeira inferência (registra a dimensão)
+  index       FAISS.load_local (ou importa INDEX_SNAPSHOT / constrói, se não houver índice)
+  llm         GET /models em cada endpoint (abre as conexões keep-alive)
+
+/ready só responde 200 quando todos terminaram com sucesso; cada passo tem
+seu tempo em status()["steps"]. Passo que falha (LLM ou disco fora do ar na
+subida) é tentado de novo com backoff (WARMUP_RETRY_S dobrando até
+WARMUP_RETRY_MAX_S); enquanto isso o status fica "failed", com o erro, as
+tentativas e a próxima em status(). Com WARMUP_ON_STARTUP=false nada roda na
+subida e as dependências são carregadas no primeiro request que precisar.
+"""
+import importlib
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+from . import metrics, prompts_loader
+from ..config import settings
+
+logger = logging.getLogger("chronos.warmup")
+
+# dependências pesadas que todo request de chat/QA acaba usando
+HEAVY_MODULES = [
+    "faiss",
+    "langchain_community.vectorstores",
+    "langchain.text_splitter",
+    "langchain_huggingface",
+    "app.services.llm",  # openai + langchain_openai + httpx
+]
+
+
+def _import_heavy():
+    for name in HEAVY_MODULES:
+        importlib.import_module(name)
+
+
+def _embeddings() -> Dict[str, Any]:
+    from .embedder import get_embeddings, remember_dim
+
+    vec = get_embeddings().embed_query("warm-up")  # primeira inferência (torch) fora do request
+    remember_dim(len(vec))
+    return {"embedding_dim": len(vec)}
+
+
+def _index() -> Dict[str, Any]:
+    from .rag import build_or_load_vectorstore
+
+    imported = None
+    if settings.index_snapshot:
+        # réplica nova sem índice: importa o snapshot em vez de ingerir tudo de novo
+        from .snapshot import bootstrap
+
+        imported = bootstrap(settings.index_snapshot)
+    _vs, meta = build_or_load_vectorstore(rebuild=False)
+    out = {"vectors": meta.get("vectors"), "embedding_dim": meta.get("embedding_dim")}
+    if imported:
+        out["snapshot"] = {"generation": imported["generation"], "import_ms": imported["import_ms"]}
+    return out
+
+
+def _llm() -> Dict[str, Any]:
+    from .llm import get_pool
+
+    results = get_pool().ping()
+    checked = [r for r in results if r["ok"] is not None]
+    if checked and not any(r["ok"] for r in checked):
+        raise RuntimeError(f"nenhum endpoint de LLM respondeu: {[r['endpoint'] for r in checked]}")
+    return {"endpoints": results}
+
+
+def _prompts() -> Dict[str, Any]:
+    return {"prompts": prompts_loader.compile_all()}
+
+
+STEPS: Dict[str, Callable[[], Any]] = {
+    "imports": _import_heavy,
+    "prompts": _prompts,
+    "embeddings": _embeddings,
+    "index": _index,
+    "llm": _llm,
+}
+
+
+def _selected() -> Dict[str, Callable[[], Any]]:
+    names = [n.strip() for n in settings.warmup_steps if n.strip()]
+    unknown = [n for n in names if n not in STEPS]
+    if unknown:
+        logger.warning("[WARMUP] passos desconhecidos ignorados: %s", unknown)
+    return {n: STEPS[n] for n in names if n in STEPS}
+
+
+_lock = threading.Lock()
+_thread: Optional[threading.Thread] = None
+_state: Dict[str, Any] = {"status": "cold", "started_at": None, "duration_ms": None, "next_retry_at": None, "steps": {}}
+
+
+def _run_step(name: str, fn: Callable[[], Any]):
+    step = _state["steps"][name]
+    step["status"] = "running"
+    step["attempts"] = step.get("attempts", 0) + 1
+    t = time.perf_counter()
+    try:
+        detail = fn()
+    except Exception as e:
+        logger.exception("[WARMUP] %s falhou: %s", name, e)
+        step.update(status="error", error=f"{type(e).__name__}: {e}")
+        metrics.inc("warmup_step_errors_total", step=name)
+    else:
+        step["status"] = "ok"
+        step.pop("error", None)
+        if isinstance(detail, dict):
+            step.update(detail)
+    step["ms"] = round((time.perf_counter() - t) * 1000, 1)
+    metrics.observe("warmup_step_ms", step["ms"], step=name)
+    logger.info("[WARMUP] %s: %s em %.0f ms", name, step["status"], step["ms"])
+
+
+def _run(steps: Dict[str, Callable[[], Any]]):
+    t0 = time.perf_counter()
+    pending = steps
+    delay = settings.warmup_retry_s
+    while True:
+        if pending:
+            with ThreadPoolExecutor(max_workers=len(pending), thread_name_prefix="warmup") as pool:
+                for name, fn in pending.items():
+                    pool.submit(_run_step, name, fn)
+        failed = [n for n, s in _state["steps"].items() if s["status"] != "ok"]
+        _state["status"] = "failed" if failed else "ready"
+        _state["duration_ms"] = round((time.perf_counter() - t0) * 1000, 1)
+        if not failed or delay <= 0:
+            _state["next_retry_at"] = None
+            logger.info("[WARMUP] %s em %.0f ms%s", _state["status"], _state["duration_ms"],
+                        f" (falharam: {failed})" if failed else "")
+            return
+        # só os que falharam; /ready segue 503 (com o erro visível) até todos passarem
+        _state["next_retry_at"] = round(time.time() + delay, 1)
+        logger.warning("[WARMUP] falharam: %s; nova tentativa em %.0f s", failed, delay)
+        time.sleep(delay)
+        pending = {n: steps[n] for n in failed}
+        delay = min(delay * 2, max(settings.warmup_retry_max_s, settings.warmup_retry_s))
+
+
+def start(background: bool = True):
+    """Dispara o warm-up (uma vez por processo)."""
+    global _thread
+    with _lock:
+        if _thread is not None:
+            return
+        steps = _selected()
+        _state.update(
+            status="warming",
+            started_at=time.time(),
+            steps={n: {"status": "pending"} for n in steps},
+        )
+        _thread = threading.Thread(target=_run, args=(steps,), name="warmup", daemon=True)
+        _thread.start()
+    if not background:
+        _thread.join()
+
+
+def status() -> Dict[str, Any]:
+    return {**_state, "steps": {n: dict(s) for n, s in _state["steps"].items()}}
+
+
+def is_ready() -> bool:
+    # sem warm-up na subida, o processo está pronto assim que sobe
+    return _state["status"] == "ready" or (not settings.warmup_on_startup and _thread is None)
@@ -0,0 +1,22 @@
+# Configuração do gunicorn para rodar a API com vários workers:
+#
+#     pip install gunicorn
+#     WORKERS=4 gunicorn -c gunicorn.conf.py app.main:app
+#
+# (equivalente sem gunicorn: uvicorn app.main:app --workers 4)
+#
+# Cada worker carrega o índice do PERSIST_DIR (mapeado em memória com
+# INDEX_MMAP=true) e recarrega sozinho quando outro worker publica uma geração
+# nova (ver app/services/index_store.py). Limites como LLM_MAX_CONCURRENCY
+# valem por worker.
+import multiprocessing
+import os
+
+bind = os.getenv("BIND", "0.0.0.0:8000")
+workers = int(os.getenv("WORKERS", str(min(4, multiprocessing.cpu_count()))))
+worker_class = "uvicorn.workers.UvicornWorker"
+timeout = int(os.getenv("WORKER_TIMEOUT", "300"))  # QA e rebuilds podem demorar
+graceful_timeout = 30
+# sem preload: faiss/torch não lidam bem com fork depois de inicializados, e a
+# app sobe rápido (o warm-up roda em cada worker, em segundo plano)
+preload_app = False
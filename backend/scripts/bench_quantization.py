@@ -0,0 +1,136 @@
+"""
+Recall x memória dos formatos de índice (INDEX_STORAGE) no nosso corpus.
+
+Lê os vetores do índice publicado em PERSIST_DIR (ou de --persist-dir), usa a
+busca exata float32 como verdade e mede, para flat/fp16/sq8/pq (com e sem
+re-ranking exato): recall@k, MB residentes do índice e latência média por busca.
+
+    python scripts/bench_quantization.py
+    python scripts/bench_quantization.py --queries perguntas.txt --k 4 --rerank-factors 2,4,8
+    python scripts/bench_quantization.py --synthetic 50000 --dim 384   # sem índice/modelo
+
+Sem --queries, as consultas são vetores do próprio corpus com ruído (não
+precisa do modelo de embeddings). Rode a partir de backend/. Saída em JSON.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.config import settings  # noqa: E402
+from app.services import index_store, quantization  # noqa: E402
+
+
+def _corpus(args) -> np.ndarray:
+    if args.synthetic:
+        rng = np.random.default_rng(0)
+        # clusters, para parecer mais com embeddings de texto do que ruído uniforme
+        centers = rng.normal(size=(max(1, args.synthetic // 200), args.dim))
+        x = centers[rng.integers(0, len(centers), args.synthetic)] + 0.3 * rng.normal(size=(args.synthetic, args.dim))
+        return x.astype(np.float32)
+
+    import faiss  # type: ignore
+
+    folder = index_store.index_dir(args.persist_dir)
+    full = os.path.join(folder, quantization.FULL_VECTORS_FILE)
+    if os.path.exists(full):
+        return np.load(full).astype(np.float32)
+    path = os.path.join(folder, "index.faiss")
+    if not os.path.exists(path):
+        raise SystemExit(f"nenhum índice em {folder} (rode um ingest ou use --synthetic)")
+    index = faiss.read_index(path)
+    if quantization.storage_of(index) != "flat":
+        print("aviso: índice comprimido sem vectors.f32.npy; a 'verdade' já é aproximada", file=sys.stderr)
+    return index.reconstruct_n(0, index.ntotal)
+
+
+def _queries(args, corpus: np.ndarray) -> np.ndarray:
+    if args.queries:
+        from app.services.embedder import get_embeddings
+
+        with open(args.queries, "r", encoding="utf-8") as f:
+            texts = [line.strip() for line in f if line.strip()]
+        return np.array(get_embeddings().embed_documents(texts), dtype=np.float32)
+    rng = np.random.default_rng(1)
+    picks = corpus[rng.integers(0, len(corpus), args.n_queries)]
+    return (picks + args.noise * corpus.std() * rng.normal(size=picks.shape)).astype(np.float32)
+
+
+def _recall(found: np.ndarray, truth: np.ndarray) -> float:
+    hits = sum(len(set(f[f != -1]) & set(t)) for f, t in zip(found, truth))
+    return hits / truth.size
+
+
+def _measure(index, queries: np.ndarray, truth: np.ndarray, k: int) -> dict:
+    t = time.perf_counter()
+    _d, ids = index.search(queries, k)
+    ms = (time.perf_counter() - t) * 1000 / len(queries)
+    return {"recall_at_k": round(_recall(ids, truth), 4), "search_ms": round(ms, 3)}
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--persist-dir", default=settings.persist_dir)
+    ap.add_argument("--synthetic", type=int, default=0, help="N vetores sintéticos em vez do índice")
+    ap.add_argument("--dim", type=int, default=384, help="dimensão dos vetores sintéticos")
+    ap.add_argument("--queries", help="arquivo com uma pergunta por linha (usa o modelo de embeddings)")
+    ap.add_argument("--n-queries", type=int, default=200)
+    ap.add_argument("--noise", type=float, default=0.05)
+    ap.add_argument("--k", type=int, default=4)
+    ap.add_argument("--storages", default="flat,fp16,sq8,pq")
+    ap.add_argument("--pq-m", default="", help="valores de INDEX_PQ_M a testar, ex.: 16,32,48")
+    ap.add_argument("--rerank-factors", default="4", help="fatores de re-ranking a testar (0 = sem)")
+    args = ap.parse_args()
+
+    import faiss  # type: ignore
+
+    corpus = _corpus(args)
+    queries = _queries(args, corpus)
+    k = min(args.k, len(corpus))
+    flat = faiss.IndexFlatL2(corpus.shape[1])
+    flat.add(corpus)
+    _d, truth = flat.search(queries, k)
+
+    factors = [int(f) for f in args.rerank_factors.split(",") if f.strip()]
+    variants = []
+    for storage in [s.strip() for s in args.storages.split(",") if s.strip()]:
+        ms = [int(m) for m in args.pq_m.split(",") if m.strip()] if storage == "pq" and args.pq_m else [None]
+        for m in ms:
+            variants.append((storage, m))
+
+    results = []
+    for storage, m in variants:
+        if m is not None:
+            settings.index_pq_m = m
+        t = time.perf_counter()
+        index = quantization.compress(flat, storage)
+        build_s = time.perf_counter() - t
+        info = quantization.describe(index)
+        row = {
+            "storage": info["storage"],  # pq cai para sq8 em corpus muito pequeno
+            "pq_m": m if info["storage"] == "pq" else None,
+            "vectors": info["vectors"],
+            "bytes_per_vector": info["bytes_per_vector"],
+            "index_mb": info["index_mb"],
+            "float32_mb": info["float32_mb"],
+            "build_s": round(build_s, 2),
+            **_measure(index, queries, truth, k),
+        }
+        if info["storage"] != "flat":
+            row["rerank"] = {
+                str(f): _measure(quantization.RerankIndex(index, corpus, f), queries, truth, k)
+                for f in factors if f > 0
+            }
+        results.append(row)
+
+    print(json.dumps({"k": k, "queries": len(queries), "dim": int(corpus.shape[1]), "results": results},
+                     indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
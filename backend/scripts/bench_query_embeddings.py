@@ -0,0 +1,119 @@
+"""
+Vazão e latência do embedding de perguntas sob concorrência: sem batching
+(um forward por pergunta, como antes) x micro-batching x micro-batching + cache.
+
+    python scripts/bench_query_embeddings.py --concurrency 32 --queries 2000
+    python scripts/bench_query_embeddings.py --window-ms 2,5 --repeat 0.3
+    python scripts/bench_query_embeddings.py --simulate      # sem o modelo (custo sintético)
+
+Com --simulate, o "modelo" custa --sim-overhead-ms por chamada + --sim-item-ms
+por texto (sleep, que solta o GIL como o forward do torch). Os valores padrão
+imitam o MiniLM em CPU. Sem --simulate, usa EMBEDDINGS_MODEL de verdade.
+Rode a partir de backend/. Saída em JSON.
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.config import settings  # noqa: E402
+from app.services import metrics  # noqa: E402
+from app.services.query_embedder import QueryBatcher  # noqa: E402
+
+
+class _SimulatedModel:
+    def __init__(self, overhead_ms: float, item_ms: float, dim: int = 384):
+        self.overhead_s = overhead_ms / 1000
+        self.item_s = item_ms / 1000
+        self.dim = dim
+        self._lock = threading.Lock()  # um forward por vez, como um modelo em CPU com todos os cores
+
+    def embed_documents(self, texts):
+        with self._lock:
+            time.sleep(self.overhead_s + self.item_s * len(texts))
+        return [[float(len(t))] * self.dim for t in texts]
+
+
+def _questions(n: int, repeat: float) -> list:
+    rng = random.Random(0)
+    hot = [f"como funciona o processo {i} de cobrança recorrente?" for i in range(20)]
+    return [rng.choice(hot) if rng.random() < repeat else f"pergunta única número {i} sobre faturas"
+            for i in range(n)]
+
+
+def _pct(vals: list, q: float) -> float:
+    vals = sorted(vals)
+    return round(vals[min(len(vals) - 1, int(q * (len(vals) - 1)))], 2) if vals else 0.0
+
+
+def _run(name: str, batcher: QueryBatcher, questions: list, concurrency: int) -> dict:
+    lat: list = []
+
+    def _one(q: str):
+        t = time.perf_counter()
+        batcher.embed(q)
+        lat.append((time.perf_counter() - t) * 1000)
+
+    before = metrics.snapshot()["histograms"].get("query_embed_batch_size", {"count": 0, "sum": 0})
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(_one, questions))
+    elapsed = time.perf_counter() - t0
+    after = metrics.snapshot()["histograms"].get("query_embed_batch_size", {"count": 0, "sum": 0})
+    batches = after["count"] - before["count"]
+    return {
+        "scenario": name,
+        "qps": round(len(questions) / elapsed, 1),
+        "p50_ms": _pct(lat, 0.50),
+        "p95_ms": _pct(lat, 0.95),
+        "p99_ms": _pct(lat, 0.99),
+        "model_calls": batches if batcher.window_s else None,
+        "avg_batch": round((after["sum"] - before["sum"]) / batches, 1) if batches else None,
+        "elapsed_s": round(elapsed, 2),
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--queries", type=int, default=1000)
+    ap.add_argument("--concurrency", type=int, default=32)
+    ap.add_argument("--repeat", type=float, default=0.2, help="fração de perguntas repetidas (cache)")
+    ap.add_argument("--window-ms", default=str(settings.query_embed_window_ms or 3))
+    ap.add_argument("--max-batch", type=int, default=settings.query_embed_max_batch)
+    ap.add_argument("--simulate", action="store_true")
+    ap.add_argument("--sim-overhead-ms", type=float, default=8.0)
+    ap.add_argument("--sim-item-ms", type=float, default=0.4)
+    args = ap.parse_args()
+
+    if args.simulate:
+        model = _SimulatedModel(args.sim_overhead_ms, args.sim_item_ms)
+    else:
+        from langchain_huggingface import HuggingFaceEmbeddings
+
+        model = HuggingFaceEmbeddings(model_name=settings.embeddings_model)
+        model.embed_documents(["warm-up"])
+    questions = _questions(args.queries, args.repeat)
+
+    results = [_run("sem batching", QueryBatcher(model.embed_documents, 0, 1, 0), questions, args.concurrency)]
+    for w in [float(x) for x in args.window_ms.split(",") if x.strip()]:
+        results.append(_run(f"batching {w}ms", QueryBatcher(model.embed_documents, w, args.max_batch, 0),
+                            questions, args.concurrency))
+        results.append(_run(f"batching {w}ms + cache",
+                            QueryBatcher(model.embed_documents, w, args.max_batch, settings.query_embed_cache_size),
+                            questions, args.concurrency))
+    base = results[0]["qps"]
+    for r in results:
+        r["speedup"] = round(r["qps"] / base, 2) if base else None
+
+    print(json.dumps({"queries": args.queries, "concurrency": args.concurrency, "repeat": args.repeat,
+                      "simulated": args.simulate, "results": results}, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""
+Mede o cold start da API (import de app.main + subida até o primeiro /health)
+em processos novos, e falha se passar do limite ou se alguma dependência
+pesada voltar a ser importada na subida.
+
+    python scripts/bench_startup.py                 # 5 rodadas, relatório em JSON
+    python scripts/bench_startup.py --runs 10 --max-ms 1500
+
+Rode a partir de backend/. O warm-up em segundo plano é desligado nas rodadas
+(WARMUP_ON_STARTUP=false): o que se mede é o caminho até a API aceitar tráfego.
+Sai com código 1 em regressão (útil no CI).
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+# não podem estar carregados depois de importar app.main e subir a app
+HEAVY_MODULES = [
+    "faiss",
+    "langchain_community",
+    "langchain_core",
+    "langchain_openai",
+    "langchain_huggingface",
+    "openai",
+    "sentence_transformers",
+    "torch",
+    "notion_client",
+    "googleapiclient",
+    "pdfplumber",
+    "pytesseract",
+]
+
+_CHILD = r"""
+import json, sys, time
+t0 = time.perf_counter()
+import app.main
+t_import = time.perf_counter()
+from fastapi.testclient import TestClient
+with TestClient(app.main.app) as client:
+    t_started = time.perf_counter()
+    r = client.get("/health")
+    t_health = time.perf_counter()
+heavy = [m for m in json.loads(sys.argv[1]) if m in sys.modules]
+print(json.dumps({
+    "import_ms": (t_import - t0) * 1000,
+    "startup_ms": (t_started - t0) * 1000,
+    "first_health_ms": (t_health - t0) * 1000,
+    "health_status": r.status_code,
+    "heavy_loaded": heavy,
+}))
+"""
+
+
+def run_once(python: str) -> dict:
+    env = dict(os.environ, WARMUP_ON_STARTUP="false")
+    out = subprocess.run(
+        [python, "-c", _CHILD, json.dumps(HEAVY_MODULES)],
+        capture_output=True, text=True, env=env, check=True,
+    )
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--runs", type=int, default=5)
+    ap.add_argument("--max-ms", type=float, default=2000.0, help="limite para a mediana de first_health_ms")
+    ap.add_argument("--python", default=sys.executable)
+    args = ap.parse_args()
+
+    runs = [run_once(args.python) for _ in range(max(1, args.runs))]
+    report = {"runs": len(runs)}
+    for key in ("import_ms", "startup_ms", "first_health_ms"):
+        vals = [r[key] for r in runs]
+        report[key] = {"median": round(statistics.median(vals), 1), "max": round(max(vals), 1)}
+    heavy = sorted({m for r in runs for m in r["heavy_loaded"]})
+    report["heavy_loaded"] = heavy
+    report["max_ms"] = args.max_ms
+
+    problems = []
+    if report["first_health_ms"]["median"] > args.max_ms:
+        problems.append(f"first_health_ms mediana {report['first_health_ms']['median']} > {args.max_ms}")
+    if heavy:
+        problems.append(f"dependências pesadas importadas na subida: {heavy}")
+    if any(r["health_status"] != 200 for r in runs):
+        problems.append("/health não respondeu 200")
+    report["ok"] = not problems
+    report["problems"] = problems
+
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+    sys.exit(0 if not problems else 1)
+
+
+if __name__ == "__main__":
+    main()
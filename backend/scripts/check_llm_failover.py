@@ -0,0 +1,193 @@
+"""
+Regressão do balanceamento / circuit breaker de app/services/llm.py.
+
+Sobe dois stubs OpenAI-compatíveis (scripts/stub_llm_server.py): um sempre
+falha, o outro responde normalmente. Com o EndpointPool apontado para os dois,
+confere:
+
+- 429: o endpoint ruim respondendo 429 tem failover, mas o circuito não abre;
+- fechado -> aberto: com 500, toda chamada responde (failover para o endpoint
+  bom) e o circuito do ruim abre depois de LLM_CIRCUIT_FAILURES erros;
+- aberto: nenhum tráfego vai para o endpoint ruim (invoke e ainvoke);
+- meio aberto: passado o cooldown, uma rajada de chamadas simultâneas manda
+  UMA única chamada de teste para ele e, falhando de novo, o circuito reabre;
+- meio aberto -> fechado: com o stub recuperado, a próxima chamada de teste
+  dá certo e o circuito fecha.
+
+Sai com código 1 se algo falhar.
+
+    python scripts/check_llm_failover.py
+
+Rode a partir de backend/ (não usa índice nem embeddings).
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+FAILURES = 2
+COOLDOWN_S = 0.5
+BURST = 8
+BAD_LATENCY_MS = 150  # o teste do meio aberto continua em andamento enquanto a rajada chega
+ANSWER = "ok do stub"
+
+
+def _check(name: str, ok: bool, results: list, detail=None):
+    results.append({"check": name, "ok": bool(ok), **({"detail": detail} if detail is not None else {})})
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _counter(name: str, **labels) -> float:
+    from app.services import metrics
+
+    key = name + "{" + ",".join(f'{k}="{v}"' for k, v in sorted(labels.items())) + "}"
+    return metrics.snapshot()["counters"].get(key, 0)
+
+
+def _state(pool, url: str) -> dict:
+    return next(e for e in pool.snapshot() if e["endpoint"] == url)
+
+
+def _call(llm, errors: list) -> bool:
+    try:
+        return llm.invoke("ping").content == ANSWER
+    except Exception as e:
+        errors.append(repr(e))
+        return False
+
+
+def _until(llm, predicate, limit: int, errors: list) -> tuple:
+    """Chama o LLM até predicate() valer (no máximo limit vezes); devolve (chamadas, todas ok)."""
+    calls, all_ok = 0, True
+    while calls < limit and not predicate():
+        all_ok &= _call(llm, errors)
+        calls += 1
+    return calls, all_ok
+
+
+def _run(bad_srv, bad: str, good: str, results: list):
+    from app.services import llm as llm_mod
+
+    pool = llm_mod.get_pool()
+    llm = llm_mod.get_llm()
+    errors: list = []
+
+    def bad_errors():
+        return _counter("llm_requests_total", endpoint=bad, outcome="error")
+
+    def bad_ok():
+        return _counter("llm_requests_total", endpoint=bad, outcome="ok")
+
+    def opened():
+        return _counter("llm_circuit_open_total", endpoint=bad)
+
+    # 429: servidor de pé, só ocupado — vai para o outro endpoint sem contar como falha
+    bad_srv.fail_status = 429
+    all_ok = all([_call(llm, errors) for _ in range(2 * FAILURES + 2)])
+    limited = _counter("llm_requests_total", endpoint=bad, outcome="rate_limited")
+    _check("429: failover sem abrir o circuito",
+           all_ok and limited >= FAILURES and bad_errors() == 0 and _state(pool, bad)["circuit"] == "closed",
+           results, {"rate_limited": limited, "endpoint": _state(pool, bad), "errors": errors[-3:]})
+    bad_srv.fail_status = 500
+
+    # fechado -> aberto
+    calls, all_ok = _until(llm, lambda: _state(pool, bad)["circuit"] == "open", 4 * FAILURES, errors)
+    _check("fechado->aberto: chamadas respondem via failover", all_ok, results, {"calls": calls, "errors": errors[-3:]})
+    _check("fechado->aberto: circuito abre após LLM_CIRCUIT_FAILURES erros",
+           _state(pool, bad)["circuit"] == "open" and bad_errors() == FAILURES and opened() == 1,
+           results, {"errors": bad_errors(), "opened": opened(), "endpoint": _state(pool, bad)})
+
+    # aberto: tudo vai para o endpoint bom
+    errs, good_before = bad_errors(), _counter("llm_requests_total", endpoint=good, outcome="ok")
+    sync_ok = all([_call(llm, errors) for _ in range(5)])
+    try:
+        async_ok = all(m.content == ANSWER for m in asyncio.run(_ainvoke_many(llm, 5)))
+    except Exception as e:
+        async_ok = False
+        errors.append(repr(e))
+    good_after = _counter("llm_requests_total", endpoint=good, outcome="ok")
+    _check("aberto: sem tráfego no endpoint ruim",
+           sync_ok and async_ok and bad_errors() == errs and good_after - good_before == 10,
+           results, {"sync_ok": sync_ok, "async_ok": async_ok, "good_calls": good_after - good_before})
+
+    # meio aberto, ainda falhando: uma rajada, uma única chamada de teste, e reabre
+    time.sleep(COOLDOWN_S + 0.1)
+    _check("meio aberto: passado o cooldown", _state(pool, bad)["circuit"] == "half_open", results, _state(pool, bad))
+    oks: list = []
+    start = threading.Barrier(BURST)
+
+    def _burst():
+        start.wait()
+        oks.append(_call(llm, errors))
+
+    threads = [threading.Thread(target=_burst) for _ in range(BURST)]
+    for th in threads:
+        th.start()
+    for th in threads:
+        th.join()
+    _check("meio aberto: rajada simultânea manda uma só chamada de teste e reabre",
+           all(oks) and bad_errors() == errs + 1 and opened() == 2 and _state(pool, bad)["circuit"] == "open",
+           results, {"burst": BURST, "ok": sum(oks), "probes": bad_errors() - errs, "opened": opened()})
+
+    # meio aberto -> fechado
+    bad_srv.fail_rate = 0.0
+    time.sleep(COOLDOWN_S + 0.1)
+    calls, all_ok = _until(llm, lambda: bad_ok() > 0, 4, errors)
+    state = _state(pool, bad)
+    _check("meio aberto->fechado: chamada de teste passa e circuito fecha",
+           all_ok and bad_ok() > 0 and state["circuit"] == "closed" and state["failures"] == 0,
+           results, {"calls": calls, "endpoint": state})
+    errs = bad_errors()
+    all_ok = all([_call(llm, errors) for _ in range(6)])
+    _check("fechado: tráfego volta a ser dividido", all_ok and bad_ok() >= 3 and bad_errors() == errs,
+           results, {"bad_ok": bad_ok()})
+
+
+async def _ainvoke_many(llm, n: int):
+    # sequencial: o pool reparte por requisições em andamento, e o que se mede aqui é o circuito
+    return [await llm.ainvoke("ping") for _ in range(n)]
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.parse_args()
+
+    from scripts.stub_llm_server import serve
+
+    bad_port, good_port = _free_port(), _free_port()
+    bad_srv = serve(bad_port, latency_ms=BAD_LATENCY_MS, fail_rate=1.0, answer=ANSWER)
+    good_srv = serve(good_port, latency_ms=5, answer=ANSWER)
+    bad, good = f"http://127.0.0.1:{bad_port}/v1", f"http://127.0.0.1:{good_port}/v1"
+    # settings é lido na importação: o ambiente precisa estar pronto antes
+    os.environ.update(
+        OPENAI_BASE_URLS=f"{bad},{good}", OPENAI_API_KEY="stub", LLM_TIMEOUT_S="5",
+        LLM_MAX_ATTEMPTS="2", LLM_CIRCUIT_FAILURES=str(FAILURES), LLM_CIRCUIT_COOLDOWN_S=str(COOLDOWN_S),
+        LLM_HEALTH_INTERVAL_S="0",  # o health check fecharia o circuito sozinho (o /models do stub responde 200)
+    )
+    results: list = []
+    try:
+        _run(bad_srv, bad, good, results)
+    except Exception as e:
+        _check("execução", False, results, repr(e))
+    finally:
+        bad_srv.shutdown()
+        good_srv.shutdown()
+
+    ok = all(r["ok"] for r in results)
+    print(json.dumps({"ok": ok, "checks": results}, indent=2, ensure_ascii=False, default=str))
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""
+Regressão da recuperação com índice sem candidatos (vazio ou com tudo removido
+por lotes de remoção do delta, ver app/services/segments.py).
+
+Constrói um índice num PERSIST_DIR/DOCS_DIR temporários, remove todas as fontes
+com rag.sync_files([], fontes) e confere, nos modos adaptive e fixed:
+adaptive_retrieve e batch_retrieve devolvem listas vazias, /api/chat responde
+200 com RETRIEVAL_NOT_FOUND_ANSWER (adaptive) e /api/chat/batch não quebra.
+Repete com um índice vazio (pasta sem arquivos). Sai com código 1 se algo falhar.
+
+    python scripts/check_retrieval_empty.py
+
+Rode a partir de backend/ (usa o modelo de embeddings configurado; o LLM não é chamado).
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def _check(name: str, ok: bool, results: list, detail=None):
+    results.append({"check": name, "ok": bool(ok), **({"detail": detail} if detail is not None else {})})
+
+
+def _run(collection_dir: str, remove_all: bool, results: list, prefix: str):
+    from fastapi.testclient import TestClient
+    from app.config import settings
+    from app.main import app
+    from app.services import rag
+
+    vs, _meta = rag.build_or_load_vectorstore(rebuild=True)
+    if remove_all:
+        sources = sorted(rag.indexed_sources())
+        rag.sync_files([], sources)
+        _check(f"{prefix}: fontes removidas", not rag.indexed_sources(), results, len(sources))
+    question = "Qual é o prazo de reembolso dos planos anuais?"
+    try:
+        docs, info = rag.adaptive_retrieve(vs, question)
+        _check(f"{prefix}: adaptive_retrieve vazio", docs == [] and info["k"] == 0, results, info)
+    except Exception as e:
+        _check(f"{prefix}: adaptive_retrieve vazio", False, results, repr(e))
+    for adaptive in (True, False):
+        try:
+            out, _n = rag.batch_retrieve(vs, [question, "outra pergunta"], k=4, adaptive=adaptive)
+            _check(f"{prefix}: batch_retrieve adaptive={adaptive}", out == [[], []], results)
+        except Exception as e:
+            _check(f"{prefix}: batch_retrieve adaptive={adaptive}", False, results, repr(e))
+
+    client = TestClient(app, raise_server_exceptions=False)  # 500 vira check falho, não traceback
+    r = client.post("/api/chat", json={"message": question, "retrieval": "adaptive"})
+    body = r.json() if r.status_code == 200 else r.text
+    _check(f"{prefix}: /api/chat adaptive", r.status_code == 200 and body["answer"] == settings.retrieval_not_found_answer,
+           results, body if r.status_code != 200 else body.get("retrieval"))
+    if settings.retrieval_mode == "adaptive":
+        r = client.post("/api/chat/batch", json={"questions": [question]})
+        last = r.text.strip().splitlines()[-1] if r.status_code == 200 else r.text
+        _check(f"{prefix}: /api/chat/batch", r.status_code == 200 and '"summary"' in last, results, None)
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.parse_args()
+
+    tmp = tempfile.mkdtemp(prefix="bia-retrieval-")
+    docs_dir = os.path.join(tmp, "docs")
+    os.makedirs(docs_dir)
+    with open(os.path.join(docs_dir, "reembolso.md"), "w", encoding="utf-8") as f:
+        f.write("Reembolso: planos anuais têm prazo de sete dias úteis para estorno.\n")
+    with open(os.path.join(docs_dir, "glossario.txt"), "w", encoding="utf-8") as f:
+        f.write("MRR: receita recorrente mensal. LTV: valor do cliente ao longo do tempo.\n")
+    os.environ.update(
+        PERSIST_DIR=os.path.join(tmp, "vs"), DOCS_DIR=docs_dir, UPLOAD_DIR=os.path.join(tmp, "uploads"),
+        REPORTS_DIR=os.path.join(tmp, "reports"), WARMUP_ON_STARTUP="false", DOCS_WATCH="false",
+        INDEX_RELOAD_CHECK_S="0", RETRIEVAL_MODE="adaptive",
+    )
+    stdout = sys.stdout
+    sys.stdout = sys.stderr  # prints da app não misturam com o JSON
+    results: list = []
+    try:
+        # a coleção default só lê DOCS_DIR num build sem conectores; telemetria fora de app/data
+        from app.services import collections_config, state
+
+        state.STATE_DIR = os.path.join(tmp, "state")
+        state.STATE_PATH = os.path.join(state.STATE_DIR, "stats.json")
+        collections_config.CONFIG_PATH = os.path.join(tmp, "collections.json")
+        with open(collections_config.CONFIG_PATH, "w", encoding="utf-8") as f:
+            json.dump({"default": {"connectors": []}}, f)
+        _run(docs_dir, remove_all=True, results=results, prefix="tudo removido")
+        for name in os.listdir(docs_dir):
+            os.remove(os.path.join(docs_dir, name))
+        _run(docs_dir, remove_all=False, results=results, prefix="índice vazio")
+    finally:
+        sys.stdout = stdout
+        shutil.rmtree(tmp, ignore_errors=True)
+
+    ok = all(r["ok"] for r in results)
+    print(json.dumps({"ok": ok, "checks": results}, indent=2, ensure_ascii=False, default=str))
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
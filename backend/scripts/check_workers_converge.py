@@ -0,0 +1,125 @@
+"""
+Verifica que todos os workers convergem para o índice novo depois de um ingest.
+
+Sobe `uvicorn app.main:app --workers N` num PERSIST_DIR temporário, espera
+todos os workers aparecerem em /api/admin/index com o índice carregado,
+dispara POST /api/ingest {"rebuild": true} (cai em UM worker) e mede quanto
+tempo leva até todos reportarem a geração nova. Sai com código 1 se algum
+worker não convergir dentro de --timeout.
+
+    python scripts/check_workers_converge.py --workers 3
+
+Rode a partir de backend/ (usa o modelo de embeddings configurado; o LLM não
+é chamado).
+"""
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+
+def _get(url: str) -> dict:
+    # conexão nova a cada chamada: o kernel distribui entre os workers
+    with urllib.request.urlopen(url, timeout=10) as r:
+        return json.loads(r.read())
+
+
+def _post(url: str, payload: dict, timeout: float) -> dict:
+    req = urllib.request.Request(url, data=json.dumps(payload).encode(), method="POST",
+                                 headers={"Content-Type": "application/json"})
+    with urllib.request.urlopen(req, timeout=timeout) as r:
+        return json.loads(r.read())
+
+
+def _wait(predicate, timeout: float, interval: float = 0.05):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        value = predicate()
+        if value:
+            return value
+        time.sleep(interval)
+    return None
+
+
+def _ready(base: str) -> bool:
+    try:
+        with urllib.request.urlopen(f"{base}/ready", timeout=2) as r:
+            return r.status == 200
+    except Exception:
+        return False
+
+
+def _workers_at(base: str, n: int, min_gen: int, seen: dict) -> bool:
+    """Amostra /api/admin/index até ver N pids; True se todos estão em >= min_gen."""
+    try:
+        info = _get(f"{base}/api/admin/index")
+    except Exception:
+        return False
+    seen[info["pid"]] = info
+    return len(seen) >= n and all(i["loaded"] and i["generation"] >= min_gen for i in seen.values())
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--workers", type=int, default=3)
+    ap.add_argument("--port", type=int, default=8765)
+    ap.add_argument("--timeout", type=float, default=60.0, help="segundos para convergir")
+    ap.add_argument("--python", default=sys.executable)
+    args = ap.parse_args()
+
+    base = f"http://127.0.0.1:{args.port}"
+    persist_dir = tempfile.mkdtemp(prefix="bia-vs-")
+    env = dict(
+        os.environ,
+        PERSIST_DIR=persist_dir,
+        WARMUP_STEPS="imports,prompts,embeddings,index",  # sem ping no LLM
+        INDEX_RELOAD_CHECK_S="0.2",
+    )
+    result = {"workers": args.workers, "persist_dir": persist_dir}
+    proc = None
+    try:
+        # índice inicial construído uma vez, antes de subir os workers
+        subprocess.run(
+            [args.python, "-c", "from app.services.rag import build_or_load_vectorstore as b; b()"],
+            env=env, check=True, stdout=subprocess.DEVNULL,
+        )
+        proc = subprocess.Popen(
+            [args.python, "-m", "uvicorn", "app.main:app", "--port", str(args.port),
+             "--workers", str(args.workers), "--log-level", "warning"],
+            env=env, stdout=subprocess.DEVNULL,
+        )
+        if not _wait(lambda: _ready(base), timeout=args.timeout):
+            raise SystemExit("API não ficou pronta")
+
+        seen: dict = {}
+        if not _wait(lambda: _workers_at(base, args.workers, 1, seen), timeout=args.timeout):
+            raise SystemExit(f"só {len(seen)} de {args.workers} workers responderam com o índice carregado")
+        result["generation_before"] = max(i["generation"] for i in seen.values())
+
+        t0 = time.monotonic()
+        _post(f"{base}/api/ingest", {"rebuild": True}, timeout=args.timeout)
+        target = _get(f"{base}/api/admin/index")["published_generation"]
+        result["generation_after"] = target
+
+        seen = {}
+        ok = _wait(lambda: _workers_at(base, args.workers, target, seen), timeout=args.timeout)
+        result["converge_s"] = round(time.monotonic() - t0, 2)
+        result["per_worker"] = {pid: i["generation"] for pid, i in seen.items()}
+        result["ok"] = bool(ok)
+    finally:
+        if proc is not None:
+            proc.terminate()
+            proc.wait(timeout=30)
+        shutil.rmtree(persist_dir, ignore_errors=True)
+
+    print(json.dumps(result, indent=2))
+    sys.exit(0 if result.get("ok") else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,278 @@
+"""
+Teste de carga do backend com relatório de SLO (JSON).
+
+Sobe o stub OpenAI-compatível (scripts/stub_llm_server.py) com a latência
+pedida, sobe a API no mesmo processo (uvicorn numa thread, ouvindo em
+localhost) apontada para o stub e dispara requests em malha aberta: chegadas
+Poisson (ou uniformes) a cada taxa de --rates, por --stage-s segundos cada,
+sem esperar as respostas (como usuários de verdade). Por estágio: vazão,
+percentis de latência por endpoint, taxa de erro e códigos HTTP (429/503 =
+recusado pelo scheduler do LLM). A latência conta a partir da chegada
+agendada, não de quando a thread começa: com mais de --max-inflight pedidos em
+aberto, a espera no próprio cliente entra no p95 (sem omissão coordenada).
+
+Saturação: o primeiro estágio que estoura o SLO (p95 > --slo-p95-ms, erro >
+--slo-error-rate ou fila que leva mais que --slo-p95-ms para esvaziar depois
+que as chegadas param: drain_s). max_sustainable_rps é a maior taxa antes dele. Com --min-rps, sai com código 1 se max_sustainable_rps
+ficar abaixo (para pegar regressão de capacidade no CI).
+
+    python scripts/loadtest.py --rates 1,2,4,8 --stage-s 20 --llm-latency-ms 800
+    python scripts/loadtest.py --mix chat=0.7,qa=0.3 --questions perguntas.txt --out carga.json
+    python scripts/loadtest.py --url http://127.0.0.1:8000   # instância já rodando (LLM dela)
+
+Rode a partir de backend/ (usa o índice e o modelo de embeddings configurados).
+"""
+import argparse
+import json
+import os
+import random
+import socket
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+DEFAULT_QUESTIONS = [
+    "Qual é a política de férias?",
+    "Como funciona a régua de dunning?",
+    "Quais são os SLAs de suporte?",
+    "Quais eventos o webhook de pagamentos envia?",
+    "Como reduzir o churn no cancelamento?",
+    "O que diz a LGPD sobre dados mínimos?",
+    "Como é o fluxo do smart checkout?",
+    "Quais os KPIs do checkout?",
+]
+QA_EVIDENCE = b"2026-01-10 12:00:01 ERROR pix timeout apos 30s no gateway; retry 3/3 falhou\n"
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _pct(vals: List[float], q: float) -> Optional[float]:
+    if not vals:
+        return None
+    vals = sorted(vals)
+    return round(vals[min(len(vals) - 1, int(round(q * (len(vals) - 1))))], 1)
+
+
+def _summary(lat: List[float]) -> Dict[str, Optional[float]]:
+    return {"p50_ms": _pct(lat, 0.50), "p90_ms": _pct(lat, 0.90), "p95_ms": _pct(lat, 0.95),
+            "p99_ms": _pct(lat, 0.99), "max_ms": round(max(lat), 1) if lat else None}
+
+
+def _parse_mix(spec: str) -> Dict[str, float]:
+    mix = {}
+    for part in spec.split(","):
+        name, _, weight = part.partition("=")
+        if name.strip() not in ("chat", "qa"):
+            raise SystemExit(f"--mix: endpoint desconhecido {name!r} (use chat, qa)")
+        mix[name.strip()] = float(weight or 1)
+    return mix
+
+
+def _start_local_api(args) -> str:
+    """Stub do LLM + API (uvicorn em thread) neste processo. Devolve a URL base."""
+    from scripts.stub_llm_server import serve
+
+    stub_port = _free_port()
+    serve(stub_port, args.llm_latency_ms, args.llm_jitter_ms, args.llm_fail_rate)
+    # settings é lido na importação do app: o ambiente precisa estar pronto antes
+    os.environ["OPENAI_BASE_URLS"] = f"http://127.0.0.1:{stub_port}/v1"
+    os.environ.setdefault("OPENAI_API_KEY", "stub")
+    os.environ.setdefault("WARMUP_STEPS", "imports,prompts,embeddings,index,llm")
+    # os relatórios e uploads do /api/qa/analyze da carga não vão para app/data
+    scratch = tempfile.mkdtemp(prefix="loadtest-")
+    os.environ.setdefault("UPLOAD_DIR", os.path.join(scratch, "uploads"))
+    os.environ.setdefault("REPORTS_DIR", os.path.join(scratch, "reports"))
+
+    import uvicorn
+
+    port = _free_port()
+    server = uvicorn.Server(uvicorn.Config("app.main:app", host="127.0.0.1", port=port,
+                                           log_level="warning", access_log=False))
+    threading.Thread(target=server.run, name="loadtest-api", daemon=True).start()
+    return f"http://127.0.0.1:{port}"
+
+
+def _wait_ready(client, base: str, timeout: float):
+    deadline = time.monotonic() + timeout
+    last = None
+    while time.monotonic() < deadline:
+        try:
+            r = client.get(f"{base}/ready", timeout=5)
+            if r.status_code == 200:
+                return
+            last = r.json()
+        except Exception as e:  # ainda subindo
+            last = str(e)
+        time.sleep(0.2)
+    raise SystemExit(f"API não ficou pronta em {timeout}s: {last}")
+
+
+def _request(client, base: str, kind: str, question: str, timeout: float):
+    if kind == "chat":
+        return client.post(f"{base}/api/chat", json={"question": question, "top_k": 4}, timeout=timeout)
+    return client.post(
+        f"{base}/api/qa/analyze",
+        data={"case_title": f"carga: {question[:40]}", "area": "pix"},
+        files={"files": ("log.txt", QA_EVIDENCE, "text/plain")},
+        timeout=timeout,
+    )
+
+
+def _stage(client, base: str, rate: float, args, mix: Dict[str, float], questions: List[str]) -> dict:
+    rng = random.Random(int(rate * 1000))
+    kinds, weights = list(mix), list(mix.values())
+    results: List[tuple] = []
+    lock = threading.Lock()
+
+    def _one(kind: str, question: str, arrival: float):
+        try:
+            status = _request(client, base, kind, question, args.timeout).status_code
+        except Exception as e:
+            status = type(e).__name__
+        with lock:
+            results.append((kind, status, (time.perf_counter() - arrival) * 1000))
+
+    pool = ThreadPoolExecutor(max_workers=args.max_inflight, thread_name_prefix="load")
+    t0 = time.perf_counter()
+    sent = 0
+    next_at = 0.0
+    while next_at < args.stage_s:
+        delay = t0 + next_at - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        pool.submit(_one, rng.choices(kinds, weights)[0], rng.choice(questions), t0 + next_at)
+        sent += 1
+        next_at += rng.expovariate(rate) if args.arrival == "poisson" else 1 / rate
+    pool.shutdown(wait=True)  # espera os atrasados (contam na latência, não na vazão do estágio)
+    elapsed = time.perf_counter() - t0
+
+    ok_lat = [ms for _k, st, ms in results if st == 200]
+    codes: Dict[str, int] = {}
+    for _k, st, _ms in results:
+        codes[str(st)] = codes.get(str(st), 0) + 1
+    errors = len(results) - len(ok_lat)
+    stage = {
+        "offered_rps": rate,
+        "sent": sent,
+        "sent_rps": round(sent / args.stage_s, 2),
+        "ok": len(ok_lat),
+        "errors": errors,
+        "error_rate": round(errors / sent, 4) if sent else 0.0,
+        "throughput_rps": round(len(ok_lat) / elapsed, 2),
+        "elapsed_s": round(elapsed, 2),
+        "drain_s": round(max(0.0, elapsed - args.stage_s), 2),
+        "status_codes": codes,
+        "latency": _summary(ok_lat),
+        "by_endpoint": {
+            kind: {"sent": sum(1 for k, _s, _m in results if k == kind),
+                   **_summary([ms for k, st, ms in results if k == kind and st == 200])}
+            for kind in kinds
+        },
+    }
+    p95 = stage["latency"]["p95_ms"]
+    breaches = []
+    if p95 is None or p95 > args.slo_p95_ms:
+        breaches.append("p95")
+    if stage["error_rate"] > args.slo_error_rate:
+        breaches.append("error_rate")
+    if stage["drain_s"] * 1000 > args.slo_p95_ms:
+        breaches.append("drain")  # chegou mais do que o servidor dá conta: a fila só cresceu
+    stage["slo_ok"] = not breaches
+    stage["slo_breaches"] = breaches
+    return stage
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--url", help="instância já rodando (não sobe API nem stub)")
+    ap.add_argument("--rates", default="1,2,4,8", help="req/s de cada estágio")
+    ap.add_argument("--stage-s", type=float, default=15)
+    ap.add_argument("--arrival", choices=["poisson", "uniform"], default="poisson")
+    ap.add_argument("--mix", default="chat=1", help="ex.: chat=0.8,qa=0.2")
+    ap.add_argument("--questions", help="arquivo com uma pergunta por linha")
+    ap.add_argument("--llm-latency-ms", type=float, default=500)
+    ap.add_argument("--llm-jitter-ms", type=float, default=100)
+    ap.add_argument("--llm-fail-rate", type=float, default=0.0)
+    ap.add_argument("--slo-p95-ms", type=float, default=5000)
+    ap.add_argument("--slo-error-rate", type=float, default=0.01)
+    ap.add_argument("--stop-after-saturation", type=int, default=1,
+                    help="estágios a rodar depois do primeiro que estoura o SLO")
+    ap.add_argument("--timeout", type=float, default=120)
+    ap.add_argument("--max-inflight", type=int, default=256)
+    ap.add_argument("--min-rps", type=float, help="falha (código 1) se max_sustainable_rps ficar abaixo")
+    ap.add_argument("--out", help="grava o JSON também neste arquivo")
+    args = ap.parse_args()
+
+    import httpx
+
+    mix = _parse_mix(args.mix)
+    questions = DEFAULT_QUESTIONS
+    if args.questions:
+        with open(args.questions, "r", encoding="utf-8") as f:
+            questions = [line.strip() for line in f if line.strip()]
+    rates = [float(r) for r in args.rates.split(",") if r.strip()]
+
+    report_out = sys.stdout
+    if not args.url:
+        sys.stdout = sys.stderr  # logs do app (print) não misturam com o JSON
+    base = args.url.rstrip("/") if args.url else _start_local_api(args)
+    limits = httpx.Limits(max_connections=args.max_inflight, max_keepalive_connections=args.max_inflight)
+    with httpx.Client(limits=limits) as client:
+        _wait_ready(client, base, timeout=300)
+        stages = []
+        over = None
+        for rate in rates:
+            stage = _stage(client, base, rate, args, mix, questions)
+            stages.append(stage)
+            print(f"[loadtest] {rate:g} req/s: {stage['throughput_rps']} ok/s, p95={stage['latency']['p95_ms']} ms, "
+                  f"erro={stage['error_rate']:.1%} {'OK' if stage['slo_ok'] else 'SLO: ' + ','.join(stage['slo_breaches'])}",
+                  file=sys.stderr)
+            if not stage["slo_ok"] and over is None:
+                over = len(stages) - 1
+            if over is not None and len(stages) - 1 - over >= args.stop_after_saturation:
+                break
+        server_metrics = None
+        try:
+            server_metrics = client.get(f"{base}/api/admin/metrics", timeout=10).json()
+        except Exception:
+            pass
+
+    sustained = [s["offered_rps"] for s in stages[: over if over is not None else len(stages)] if s["slo_ok"]]
+    report = {
+        "target": base if args.url else "in-process",
+        "config": {
+            "rates": rates, "stage_s": args.stage_s, "arrival": args.arrival, "mix": mix,
+            "llm_latency_ms": None if args.url else args.llm_latency_ms,
+            "llm_fail_rate": None if args.url else args.llm_fail_rate,
+            "slo": {"p95_ms": args.slo_p95_ms, "error_rate": args.slo_error_rate},
+        },
+        "stages": stages,
+        "max_sustainable_rps": max(sustained) if sustained else 0.0,
+        "saturated_at_rps": stages[over]["offered_rps"] if over is not None else None,
+        "server": {
+            "scheduler": (server_metrics or {}).get("scheduler"),
+            "llm_queue_wait_ms": {k: v for k, v in (server_metrics or {}).get("histograms", {}).items()
+                                  if k.startswith("llm_queue_wait_ms")},
+        },
+    }
+    out = json.dumps(report, indent=2, ensure_ascii=False)
+    print(out, file=report_out)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(out + "\n")
+    if args.min_rps is not None and report["max_sustainable_rps"] < args.min_rps:
+        print(f"[loadtest] capacidade {report['max_sustainable_rps']} req/s < --min-rps {args.min_rps}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,44 @@
+"""
+Snapshots do índice sem passar pela API (ver app/services/snapshot.py).
+
+    python scripts/snapshot.py export snap.tar.gz [--collection default]
+    python scripts/snapshot.py import snap.tar.gz [--collection default]
+    python scripts/snapshot.py inspect snap.tar.gz
+
+export grava a geração publicada em PERSIST_DIR; import valida checksums e
+EMBEDDINGS_MODEL e publica como nova geração (workers rodando trocam sozinhos).
+Para uma réplica nova subir direto de um snapshot: INDEX_SNAPSHOT=<caminho ou URL>.
+Rode a partir de backend/. Saída em JSON; código 1 se o snapshot for recusado.
+"""
+import argparse
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services import snapshot  # noqa: E402
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("action", choices=["export", "import", "inspect"])
+    ap.add_argument("path")
+    ap.add_argument("--collection", default=None)
+    args = ap.parse_args()
+
+    try:
+        if args.action == "export":
+            out = snapshot.export_snapshot(args.path, args.collection)
+        elif args.action == "import":
+            out = snapshot.import_snapshot(args.path, args.collection)
+        else:
+            out = snapshot.read_manifest(args.path)
+    except (snapshot.SnapshotError, KeyError) as e:
+        print(json.dumps({"ok": False, "error": str(e)}, ensure_ascii=False))
+        sys.exit(1)
+    print(json.dumps(out, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""
+Servidor OpenAI-compatível de mentira, para testar o backend sem LLM real.
+
+Responde GET /v1/models e POST /v1/chat/completions com uma resposta fixa,
+depois de uma latência configurável. Pode simular falhas (HTTP 500, ou outro
+status com --fail-status, ex.: 429).
+
+    python scripts/stub_llm_server.py --port 9001 --latency-ms 300
+    python scripts/stub_llm_server.py --port 9002 --latency-ms 300 --fail-rate 0.2
+
+Depois aponte o backend para eles:
+    OPENAI_BASE_URLS=http://127.0.0.1:9001/v1,http://127.0.0.1:9002/v1
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def make_handler(latency_ms: float, jitter_ms: float, answer: str):
+    counter = {"n": 0}
+    lock = threading.Lock()
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"  # keep-alive
+
+        def log_message(self, *args):
+            pass
+
+        def _send(self, status: int, body: dict):
+            data = json.dumps(body).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            if self.path.rstrip("/").endswith("/models"):
+                self._send(200, {"object": "list", "data": [{"id": "stub", "object": "model"}]})
+            else:
+                self._send(404, {"error": {"message": "not found"}})
+
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length") or 0)
+            payload = json.loads(self.rfile.read(length) or b"{}")
+            if not self.path.rstrip("/").endswith("/chat/completions"):
+                self._send(404, {"error": {"message": "not found"}})
+                return
+
+            delay = max(0.0, latency_ms + random.uniform(-jitter_ms, jitter_ms)) / 1000
+            time.sleep(delay)
+            if random.random() < self.server.fail_rate:
+                self._send(self.server.fail_status, {"error": {"message": "stub failure", "type": "server_error"}})
+                return
+
+            with lock:
+                counter["n"] += 1
+                n = counter["n"]
+            self._send(200, {
+                "id": f"chatcmpl-stub-{n}",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": payload.get("model", "stub"),
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": answer},
+                    "finish_reason": "stop",
+                }],
+                "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+            })
+
+    return Handler
+
+
+def serve(port: int, latency_ms: float = 200, jitter_ms: float = 0, fail_rate: float = 0.0,
+          answer: str = "Resposta do servidor stub.", host: str = "127.0.0.1",
+          fail_status: int = 500) -> ThreadingHTTPServer:
+    """
+    Sobe o servidor numa thread e devolve a instância (use .shutdown() para parar).
+    server.fail_rate / server.fail_status podem ser trocados com o servidor no ar
+    (ex.: derrubar e recuperar um endpoint).
+    """
+    server = ThreadingHTTPServer((host, port), make_handler(latency_ms, jitter_ms, answer))
+    server.fail_rate = fail_rate
+    server.fail_status = fail_status
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=9001)
+    ap.add_argument("--latency-ms", type=float, default=200)
+    ap.add_argument("--jitter-ms", type=float, default=0)
+    ap.add_argument("--fail-rate", type=float, default=0.0)
+    ap.add_argument("--fail-status", type=int, default=500)
+    ap.add_argument("--answer", default="Resposta do servidor stub.")
+    args = ap.parse_args()
+    srv = serve(args.port, args.latency_ms, args.jitter_ms, args.fail_rate, args.answer, args.host, args.fail_status)
+    print(f"[stub-llm] ouvindo em http://{args.host}:{args.port}/v1 (latência {args.latency_ms} ms)")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        srv.shutdown()